@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Inverted-Index BM25
+Corpus-wide lexical retriever: term -> posting arrays of (row, tf) sorted
+by row, document lengths in NumPy arrays, and MaxScore-pruned top-k.
+
+On-disk layout (one directory, every array memory-mappable):
+  header.json     version, k1, b, sizes, avgdl, corpus_fingerprint
+  terms.u64       sorted 64-bit term hashes; a term's id is its position
+  offsets.i64     posting offsets per term (num_terms + 1)
+  post_docs.i32   posting rows, ascending within each term
+  post_tfs.i32    posting term frequencies
+  term_max.f32    per-term upper bound on a row's contribution
+  doc_lengths.f32 tokens per row
+  ids.bin/ids.off UTF-8 chunk ids and int64 offsets (num_docs + 1)
+  id_hashes.u64   sorted 64-bit chunk id hashes
+  id_rows.i32     row of each entry in id_hashes
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+from array import array
+from collections import Counter
+from typing import Callable, List, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.ingest_manifest import corpus_fingerprint, recorded_fingerprint
+
+INDEX_VERSION = 1
+# BM25 parameters (rank_bm25 defaults)
+K1 = 1.5
+B = 0.75
+PAGE_SIZE = 5000
+
+TOKEN_PATTERN = re.compile(r'\b\w+\b')
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenize text for BM25 indexing"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _sorted_hashes(values: List[str], what: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(sorted uint64 hashes, original positions); refuses collisions"""
+    hashes = np.fromiter((hash64(v) for v in values), dtype=np.uint64, count=len(values))
+    order = np.argsort(hashes, kind='stable')
+    hashes = hashes[order]
+    if len(hashes) > 1 and (hashes[1:] == hashes[:-1]).any():
+        raise ValueError(f"64-bit hash collision among {what}")
+    return hashes, order
+
+
+def _map(path: str, name: str, dtype, shape=None):
+    file_path = os.path.join(path, name)
+    if os.path.getsize(file_path) == 0:
+        return np.zeros(shape or (0,), dtype=dtype)
+    return np.memmap(file_path, dtype=dtype, mode='r', shape=shape)
+
+
+def read_corpus(collection, page_size: int = PAGE_SIZE,
+                with_metadata: bool = False) -> Tuple[List[str], List[str], List[Dict]]:
+    """Every (id, document[, metadata]) of a Chroma (or LocalCollection) collection"""
+    ids: List[str] = []
+    documents: List[str] = []
+    metadatas: List[Dict] = []
+    include = ["documents", "metadatas"] if with_metadata else ["documents"]
+    for offset in range(0, collection.count(), page_size):
+        page = collection.get(limit=page_size, offset=offset, include=include)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        if with_metadata:
+            metadatas.extend(page["metadatas"])
+    return ids, documents, metadatas
+
+
+def collection_fingerprint(collection, manifest_path: Optional[str] = None) -> Optional[str]:
+    """
+    Fingerprint recorded by whoever wrote the collection, without reading it:
+    the vector store header for a LocalCollection, or the ingest manifest
+    for Chroma (trusted only if its chunk count matches the collection).
+    Returns None when nothing trustworthy was recorded.
+    """
+    metadata = getattr(collection, "metadata", None) or {}
+    if metadata.get("corpus_fingerprint"):
+        return metadata["corpus_fingerprint"]
+    if manifest_path:
+        recorded = recorded_fingerprint(manifest_path)
+        if recorded and recorded[1] == collection.count():
+            return recorded[0]
+    return None
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a compact inverted index.
+
+    Postings for term t live in post_docs/post_tfs[offsets[t]:offsets[t + 1]],
+    sorted by row, so a term can either be scored in full or probed for a
+    set of candidate rows with searchsorted. IDF is the non-negative
+    log(1 + (N - df + 0.5) / (df + 0.5)), which MaxScore's bounds require.
+    Vocabulary and chunk ids are looked up through sorted 64-bit hashes, so
+    a loaded index needs no Python dicts.
+    """
+
+    # Files backing each array: name -> (file, dtype)
+    FILES = {
+        "terms": ("terms.u64", np.uint64),
+        "offsets": ("offsets.i64", np.int64),
+        "post_docs": ("post_docs.i32", np.int32),
+        "post_tfs": ("post_tfs.i32", np.int32),
+        "term_max": ("term_max.f32", np.float32),
+        "doc_lengths": ("doc_lengths.f32", np.float32),
+        "ids_bin": ("ids.bin", np.uint8),
+        "ids_off": ("ids.off", np.int64),
+        "id_hashes": ("id_hashes.u64", np.uint64),
+        "id_rows": ("id_rows.i32", np.int32)
+    }
+
+    def __init__(self, arrays: Dict[str, np.ndarray], k1: float = K1, b: float = B,
+                 fingerprint: Optional[str] = None, path: Optional[str] = None):
+        self.arrays = arrays
+        self.term_hashes = arrays["terms"]
+        self.offsets = arrays["offsets"]
+        self.post_docs = arrays["post_docs"]
+        self.post_tfs = arrays["post_tfs"]
+        self.doc_lengths = arrays["doc_lengths"]
+        self._id_blob = arrays["ids_bin"]
+        self._id_offsets = arrays["ids_off"]
+        self._id_hashes = arrays["id_hashes"]
+        self._id_rows = arrays["id_rows"]
+        self.k1 = k1
+        self.b = b
+        self.fingerprint = fingerprint
+        self.path = path
+        self.num_docs = len(self.doc_lengths)
+        self.avgdl = float(self.doc_lengths.mean()) if self.num_docs else 0.0
+
+        df = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log1p((self.num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Per-row length normalisation k1 * (1 - b + b * dl / avgdl)
+        self._norm = (k1 * (1 - b + b * self.doc_lengths / max(self.avgdl, 1e-9))).astype(np.float32)
+        if arrays.get("term_max") is None:
+            arrays["term_max"] = self._term_upper_bounds()
+        self.term_max = arrays["term_max"]
+
+    @classmethod
+    def build(cls, ids: Iterable[str], documents: Iterable[str], k1: float = K1, b: float = B,
+              fingerprint: Optional[str] = None) -> "BM25Index":
+        """
+        Build from aligned ids and document texts in a single pass.
+        The fingerprint defaults to that of the indexed texts.
+        """
+        vocab: Dict[str, int] = {}
+        terms, docs, tfs, lengths = array('i'), array('i'), array('i'), array('i')
+        id_list: List[str] = []
+        text_list: List[str] = []
+        for row, (chunk_id, text) in enumerate(zip(ids, documents)):
+            id_list.append(chunk_id)
+            text_list.append(text or "")
+            counts = Counter(tokenize(text or ""))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                terms.append(vocab.setdefault(term, len(vocab)))
+                docs.append(row)
+                tfs.append(tf)
+
+        # Renumber terms by hash order so a term's id is its position in terms.u64
+        term_hashes, order = _sorted_hashes(list(vocab), "terms")
+        renumber = np.empty(len(vocab), dtype=np.int32)
+        renumber[order] = np.arange(len(vocab), dtype=np.int32)
+        terms_np = renumber[np.asarray(terms, dtype=np.int32)]
+        # Stable sort keeps rows ascending inside each posting list
+        posting_order = np.argsort(terms_np, kind='stable')
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(terms_np, minlength=len(vocab)))
+
+        id_raw = [i.encode('utf-8') for i in id_list]
+        id_offsets = np.zeros(len(id_raw) + 1, dtype=np.int64)
+        id_offsets[1:] = np.cumsum([len(r) for r in id_raw])
+        id_hashes, id_rows = _sorted_hashes(id_list, "chunk ids")
+
+        arrays = {
+            "terms": term_hashes,
+            "offsets": offsets,
+            "post_docs": np.asarray(docs, dtype=np.int32)[posting_order],
+            "post_tfs": np.asarray(tfs, dtype=np.int32)[posting_order],
+            "term_max": None,
+            "doc_lengths": np.asarray(lengths, dtype=np.float32),
+            "ids_bin": np.frombuffer(b"".join(id_raw), dtype=np.uint8),
+            "ids_off": id_offsets,
+            "id_hashes": id_hashes,
+            "id_rows": id_rows.astype(np.int32)
+        }
+        return cls(arrays, k1, b, fingerprint or corpus_fingerprint(id_list, text_list))
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = PAGE_SIZE) -> "BM25Index":
+        """Build from every document of a Chroma (or LocalCollection) collection"""
+        ids, documents, _ = read_corpus(collection, page_size)
+        return cls.build(ids, documents)
+
+    def save(self, path: str, extra_header: Optional[Dict] = None) -> Dict:
+        """Write the columnar files to a staging directory and swap it in atomically"""
+        path = path.rstrip(os.sep)
+        tmp = path + ".tmp"
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+        os.makedirs(tmp)
+        for name, (file_name, dtype) in self.FILES.items():
+            np.ascontiguousarray(self.arrays[name], dtype=dtype).tofile(os.path.join(tmp, file_name))
+
+        header = {
+            "version": INDEX_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "num_docs": self.num_docs,
+            "num_terms": len(self.term_hashes),
+            "num_postings": int(len(self.post_docs)),
+            "avgdl": self.avgdl,
+            "corpus_fingerprint": self.fingerprint
+        }
+        header.update(extra_header or {})
+        with open(os.path.join(tmp, "header.json"), 'w') as f:
+            json.dump(header, f, indent=2)
+
+        if os.path.exists(path):
+            old = path + ".old"
+            if os.path.exists(old):
+                shutil.rmtree(old)
+            os.replace(path, old)
+            os.replace(tmp, path)
+            shutil.rmtree(old)
+        else:
+            os.replace(tmp, path)
+        self.path = path
+        return header
+
+    @staticmethod
+    def read_header(path: str) -> Dict:
+        with open(os.path.join(path, "header.json"), 'r') as f:
+            header = json.load(f)
+        if header.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported BM25 index version {header.get('version')}")
+        return header
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Memory-map an index written by save(); only the header is parsed"""
+        header = cls.read_header(path)
+        num_docs, num_terms, num_postings = header["num_docs"], header["num_terms"], header["num_postings"]
+        shapes = {
+            "terms": (num_terms,), "offsets": (num_terms + 1,), "term_max": (num_terms,),
+            "post_docs": (num_postings,), "post_tfs": (num_postings,),
+            "doc_lengths": (num_docs,), "ids_off": (num_docs + 1,), "id_hashes": (num_docs,),
+            "id_rows": (num_docs,), "ids_bin": None
+        }
+        arrays = {name: _map(path, file_name, dtype, shapes[name])
+                  for name, (file_name, dtype) in cls.FILES.items()}
+        return cls(arrays, header["k1"], header["b"], header.get("corpus_fingerprint"), path)
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.post_docs[start:end], self.post_tfs[start:end]
+
+    def _impact(self, term_id: int, rows: np.ndarray, tfs: np.ndarray) -> np.ndarray:
+        tfs = tfs.astype(np.float32)
+        return self.idf[term_id] * tfs * (self.k1 + 1) / (tfs + self._norm[rows])
+
+    def _term_upper_bounds(self) -> np.ndarray:
+        """Largest contribution any row can get from each term"""
+        if not len(self.post_docs):
+            return np.zeros(len(self.idf), dtype=np.float32)
+        term_of_posting = np.repeat(np.arange(len(self.idf), dtype=np.int32), np.diff(self.offsets))
+        tfs = self.post_tfs.astype(np.float32)
+        impacts = self.idf[term_of_posting] * tfs * (self.k1 + 1) / (tfs + self._norm[self.post_docs])
+        bounds = np.zeros(len(self.idf), dtype=np.float32)
+        np.maximum.at(bounds, term_of_posting, impacts)
+        return bounds
+
+    @staticmethod
+    def _find(sorted_hashes: np.ndarray, value: str) -> int:
+        """Position of value's hash in a sorted hash array, or -1"""
+        if not len(sorted_hashes):
+            return -1
+        h = np.uint64(hash64(value))
+        pos = int(np.searchsorted(sorted_hashes, h))
+        return pos if pos < len(sorted_hashes) and sorted_hashes[pos] == h else -1
+
+    def query_terms(self, query: str) -> List[int]:
+        """Distinct in-vocabulary term ids of a query"""
+        found = {self._find(self.term_hashes, t) for t in set(tokenize(query))}
+        found.discard(-1)
+        return sorted(found)
+
+    def id_at(self, row: int) -> str:
+        start, end = self._id_offsets[row], self._id_offsets[row + 1]
+        return bytes(self._id_blob[start:end]).decode('utf-8')
+
+    def row_of(self, chunk_id: str) -> Optional[int]:
+        pos = self._find(self._id_hashes, chunk_id)
+        if pos < 0:
+            return None
+        row = int(self._id_rows[pos])
+        return row if self.id_at(row) == chunk_id else None
+
+    def _probe(self, term_id: int, rows: np.ndarray) -> np.ndarray:
+        """BM25 contribution of one term for a sorted array of rows"""
+        post_docs, post_tfs = self._postings(term_id)
+        out = np.zeros(len(rows), dtype=np.float32)
+        if not len(post_docs) or not len(rows):
+            return out
+        pos = np.minimum(np.searchsorted(post_docs, rows), len(post_docs) - 1)
+        hit = post_docs[pos] == rows
+        out[hit] = self._impact(term_id, rows[hit], post_tfs[pos[hit]])
+        return out
+
+    def score_rows(self, query: str, rows) -> np.ndarray:
+        """Exact BM25 scores for arbitrary rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(rows, kind='stable')
+        sorted_rows = rows[order]
+        scores = np.zeros(len(rows), dtype=np.float32)
+        for term_id in self.query_terms(query):
+            scores += self._probe(term_id, sorted_rows)
+        out = np.empty_like(scores)
+        out[order] = scores
+        return out
+
+    def top_k(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        MaxScore top-k. Terms are visited by decreasing upper bound and
+        their full posting lists are merged until the bounds of the
+        remaining terms can no longer lift an unseen row past the current
+        k-th score. From then on only surviving candidates are probed,
+        and candidates that cannot reach the threshold are dropped.
+        Returns (rows, scores) sorted by descending score.
+        """
+        terms = self.query_terms(query)
+        if not terms or k <= 0 or not self.num_docs:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        terms.sort(key=lambda t: self.term_max[t], reverse=True)
+        bounds = self.term_max[terms]
+        # remaining[i] = best possible score from terms after i
+        remaining = np.concatenate([np.cumsum(bounds[::-1])[::-1][1:], [0.0]]).astype(np.float32)
+
+        acc = np.zeros(self.num_docs, dtype=np.float32)
+        candidates = np.zeros(0, dtype=np.int64)
+        theta = 0.0
+        expanding = True
+        for i, term_id in enumerate(terms):
+            if expanding:
+                post_docs, post_tfs = self._postings(term_id)
+                acc[post_docs] += self._impact(term_id, post_docs, post_tfs)
+                # Impacts are strictly positive, so touched rows are the non-zero ones
+                candidates = np.flatnonzero(acc)
+            else:
+                acc[candidates] += self._probe(term_id, candidates)
+
+            if len(candidates) >= k:
+                theta = float(np.partition(acc[candidates], len(candidates) - k)[len(candidates) - k])
+            if expanding and theta > 0 and remaining[i] < theta:
+                expanding = False
+            if not expanding:
+                candidates = candidates[acc[candidates] + remaining[i] >= theta]
+
+        scores = acc[candidates]
+        if len(candidates) > k:
+            keep = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[keep], scores[keep]
+        order = np.argsort(-scores, kind='stable')
+        return candidates[order], scores[order]
+
+    def top_k_exhaustive(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Unpruned top-k, for checking top_k"""
+        acc = np.zeros(self.num_docs, dtype=np.float32)
+        for term_id in self.query_terms(query):
+            post_docs, post_tfs = self._postings(term_id)
+            acc[post_docs] += self._impact(term_id, post_docs, post_tfs)
+        rows = np.flatnonzero(acc)
+        rows = rows[np.argsort(-acc[rows], kind='stable')][:k]
+        return rows, acc[rows]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "documents": self.num_docs,
+            "terms": len(self.term_hashes),
+            "postings": int(len(self.post_docs)),
+            "avgdl": round(self.avgdl, 1),
+            "fingerprint": self.fingerprint
+        }
+
+
+def load_or_build(collection, path: str, manifest_path: Optional[str] = None, verbose: bool = True,
+                  text_fn: Optional[Callable[[str, Dict], str]] = None) -> BM25Index:
+    """
+    Open the on-disk index at `path` if it was built from the collection's
+    current content, otherwise rebuild it. Staleness is decided by the
+    content fingerprint: the recorded one when available, else one computed
+    from the collection itself (which then also feeds the rebuild).
+    `text_fn(document, metadata)` indexes derived text (e.g. headers)
+    instead of the documents; the index is still keyed by the corpus.
+    """
+    # Progress goes to stderr: callers such as hybrid_query --batch-file write data to stdout
+    log = (lambda *args: print(*args, file=sys.stderr)) if verbose else (lambda *args: None)
+    expected = collection_fingerprint(collection, manifest_path)
+    corpus = None
+    if expected is None:
+        corpus = read_corpus(collection, with_metadata=text_fn is not None)
+        expected = corpus_fingerprint(corpus[0], corpus[1])
+
+    try:
+        if BM25Index.read_header(path).get("corpus_fingerprint") == expected:
+            start = time.time()
+            index = BM25Index.load(path)
+            log(f"Loaded BM25 index from {path} ({(time.time() - start) * 1000:.1f}ms)")
+            return index
+        log("BM25 index is stale, rebuilding...")
+    except (OSError, ValueError, KeyError):
+        log("Building BM25 index...")
+
+    start = time.time()
+    ids, documents, metadatas = corpus or read_corpus(collection, with_metadata=text_fn is not None)
+    if text_fn is not None:
+        documents = [text_fn(doc, meta or {}) for doc, meta in zip(documents, metadatas)]
+    index = BM25Index.build(ids, documents, fingerprint=expected)
+    index.save(path, {"collection": collection.name})
+    log(f"Built BM25 index in {time.time() - start:.1f}s "
+        f"({index.num_docs} documents, {len(index.term_hashes)} terms)")
+    return index
+
+
+def benchmark(index: BM25Index, queries: List[str], k: int = 100) -> Dict[str, float]:
+    """Mean latency of pruned vs exhaustive top-k, and whether results agree"""
+    timings = {"maxscore_ms": 0.0, "exhaustive_ms": 0.0}
+    agree = 0
+    for query in queries:
+        start = time.perf_counter()
+        _, pruned = index.top_k(query, k)
+        timings["maxscore_ms"] += (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        _, exhaustive = index.top_k_exhaustive(query, k)
+        timings["exhaustive_ms"] += (time.perf_counter() - start) * 1000
+        agree += int(np.allclose(np.sort(pruned), np.sort(exhaustive), rtol=1e-5))
+    n = max(len(queries), 1)
+    return {
+        "maxscore_ms": round(timings["maxscore_ms"] / n, 3),
+        "exhaustive_ms": round(timings["exhaustive_ms"] / n, 3),
+        "agreement": agree / n
+    }
+
+
+def main():
+    import argparse
+    from scripts.search_backend import open_collection, VECTOR_STORE_PATH
+
+    parser = argparse.ArgumentParser(description="Build/load the on-disk BM25 index and benchmark MaxScore top-k")
+    parser.add_argument("queries", nargs="*", default=["create ecs instance", "obs bucket policy",
+                                                        "configure vpc subnet", "rds backup restore"],
+                        help="Benchmark queries")
+    parser.add_argument("--index", default="/home/rag_cache/bm25_cache/huawei_docs", help="Index directory")
+    parser.add_argument("--backend", choices=["chroma", "exact"], default="chroma", help="Corpus source")
+    parser.add_argument("--vector-store", default=VECTOR_STORE_PATH, help="Vector store directory")
+    parser.add_argument("--manifest", default="/home/rag_cache/ingest_manifest_huawei_docs.json",
+                        help="Ingest manifest holding the recorded corpus fingerprint")
+    parser.add_argument("--top-k", type=int, default=100, help="k for top-k")
+    args = parser.parse_args()
+
+    collection = open_collection(args.backend, vector_store_path=args.vector_store)
+    index = load_or_build(collection, args.index, args.manifest)
+    print(index.stats())
+    print(benchmark(index, args.queries, k=args.top_k))
+
+
+if __name__ == "__main__":
+    main()
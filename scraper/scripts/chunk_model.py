@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Chunk Model
+Compact chunk representation shared by fast_ingest, sequential_ingest and
+fast_rag_ingest. `Chunk` is a __slots__ record for code that handles one
+chunk at a time; `ChunkBatch` stores many chunks as columns: plain lists
+for ids and text, interned service / page_id / url strings, headers as
+one flat list of interned strings plus an offset array, and int arrays
+for position, token count and header level. Per chunk this costs a few
+list slots and array entries instead of an object, its __dict__, a
+headers list and a metadata dict.
+
+`chunk_model.py` measures the per-chunk overhead of each representation
+on a sample of the corpus.
+
+Standard library only: chunking workers import it.
+"""
+
+import os
+import sys
+import glob
+import json
+import random
+import argparse
+import tracemalloc
+from array import array
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+intern = sys.intern
+
+# ChunkBatch columns as shared-memory columns (see shared_columns.py)
+CHUNK_SCHEMA = {
+    "id": "str", "content": "str", "service": "str", "page_id": "str", "url": "str",
+    "headers": "json", "position": "int", "token_count": "int", "level": "int"
+}
+
+
+class Chunk:
+    """One chunk; service / page_id / url / header strings are interned"""
+    __slots__ = ("id", "content", "service", "page_id", "headers", "url", "position", "token_count", "level")
+
+    def __init__(self, id: str, content: str, service: str = "", page_id: str = "",
+                 headers: Sequence[str] = (), url: str = "", position: int = 0, token_count: int = 0,
+                 level: int = 0):
+        self.id = id
+        self.content = content
+        self.service = intern(service)
+        self.page_id = intern(page_id)
+        self.headers = tuple(intern(h) for h in headers)
+        self.url = intern(url)
+        self.position = position
+        self.token_count = token_count
+        self.level = level
+
+    def _fields(self) -> Tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Chunk) and self._fields() == other._fields()
+
+    def __repr__(self) -> str:
+        return f"Chunk(id={self.id!r}, page_id={self.page_id!r}, position={self.position}, " \
+               f"token_count={self.token_count})"
+
+
+class ChunkBatch:
+    """
+    Columnar list of chunks. Supports len(), iteration / indexing (Chunk
+    records) and slicing (a new ChunkBatch), so it can stand in for the
+    list of chunk objects the ingesters used to pass around.
+    """
+    __slots__ = ("ids", "contents", "services", "page_ids", "urls", "header_values", "header_offsets",
+                 "positions", "token_counts", "levels")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.contents: List[str] = []
+        self.services: List[str] = []
+        self.page_ids: List[str] = []
+        self.urls: List[str] = []
+        self.header_values: List[str] = []  # Every chunk's headers, back to back
+        self.header_offsets = array('I', [0])  # Chunk i's headers: header_values[offsets[i]:offsets[i + 1]]
+        self.positions = array('i')
+        self.token_counts = array('i')
+        self.levels = array('i')
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, id: str, content: str, service: str = "", page_id: str = "", headers: Iterable[str] = (),
+               url: str = "", position: int = 0, token_count: int = 0, level: int = 0):
+        self.ids.append(id)
+        self.contents.append(content)
+        self.services.append(intern(service))
+        self.page_ids.append(intern(page_id))
+        self.urls.append(intern(url))
+        self.header_values.extend(intern(h) for h in headers)
+        self.header_offsets.append(len(self.header_values))
+        self.positions.append(position)
+        self.token_counts.append(token_count)
+        self.levels.append(level)
+
+    def add(self, chunk: Chunk):
+        self.append(chunk.id, chunk.content, chunk.service, chunk.page_id, chunk.headers, chunk.url,
+                    chunk.position, chunk.token_count, chunk.level)
+
+    def extend(self, other: Union["ChunkBatch", Iterable[Chunk]]):
+        if not isinstance(other, ChunkBatch):
+            for chunk in other:
+                self.add(chunk)
+            return
+        base = len(self.header_values)
+        self.ids.extend(other.ids)
+        self.contents.extend(other.contents)
+        self.services.extend(other.services)
+        self.page_ids.extend(other.page_ids)
+        self.urls.extend(other.urls)
+        self.header_values.extend(other.header_values)
+        self.header_offsets.extend(base + offset for offset in other.header_offsets[1:])
+        self.positions.extend(other.positions)
+        self.token_counts.extend(other.token_counts)
+        self.levels.extend(other.levels)
+
+    def headers(self, i: int) -> Tuple[str, ...]:
+        return tuple(self.header_values[self.header_offsets[i]:self.header_offsets[i + 1]])
+
+    def _slice(self, start: int, stop: int) -> "ChunkBatch":
+        batch = ChunkBatch()
+        batch.ids = self.ids[start:stop]
+        batch.contents = self.contents[start:stop]
+        batch.services = self.services[start:stop]
+        batch.page_ids = self.page_ids[start:stop]
+        batch.urls = self.urls[start:stop]
+        offsets = self.header_offsets[start:stop + 1]
+        batch.header_values = self.header_values[offsets[0]:offsets[-1]]
+        batch.header_offsets = array('I', (offset - offsets[0] for offset in offsets))
+        batch.positions = self.positions[start:stop]
+        batch.token_counts = self.token_counts[start:stop]
+        batch.levels = self.levels[start:stop]
+        return batch
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError("ChunkBatch slices must be contiguous")
+            return self._slice(start, max(start, stop))
+        if key < 0:
+            key += len(self)
+        return Chunk(self.ids[key], self.contents[key], self.services[key], self.page_ids[key],
+                     self.headers(key), self.urls[key], self.positions[key], self.token_counts[key],
+                     self.levels[key])
+
+    def __iter__(self) -> Iterator[Chunk]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def chroma_metadatas(self) -> List[Dict[str, Any]]:
+        """Collection metadata of fast_ingest / sequential_ingest chunks"""
+        return [{
+            "service": self.services[i],
+            "page_id": self.page_ids[i],
+            "headers": json.dumps(list(self.headers(i))),
+            "url": self.urls[i],
+            "position": self.positions[i],
+            "token_count": self.token_counts[i]
+        } for i in range(len(self))]
+
+    def to_columns(self) -> Dict[str, List[Any]]:
+        """Columns keyed by CHUNK_SCHEMA, for shared_columns.pack"""
+        return {
+            "id": self.ids, "content": self.contents, "service": self.services, "page_id": self.page_ids,
+            "url": self.urls, "headers": [list(self.headers(i)) for i in range(len(self))],
+            "position": self.positions.tolist(), "token_count": self.token_counts.tolist(),
+            "level": self.levels.tolist()
+        }
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, List[Any]]) -> "ChunkBatch":
+        batch = cls()
+        batch.ids = columns["id"]
+        batch.contents = columns["content"]
+        batch.services = [intern(s) for s in columns["service"]]
+        batch.page_ids = [intern(s) for s in columns["page_id"]]
+        batch.urls = [intern(s) for s in columns["url"]]
+        for headers in columns["headers"]:
+            batch.header_values.extend(intern(h) for h in headers)
+            batch.header_offsets.append(len(batch.header_values))
+        batch.positions = array('i', columns["position"])
+        batch.token_counts = array('i', columns["token_count"])
+        batch.levels = array('i', columns["level"])
+        return batch
+
+
+@dataclass
+class _DataclassChunk:
+    """The per-chunk dataclass the ingesters used before, kept for the measurement only"""
+    id: str
+    content: str
+    service: str
+    page_id: str
+    headers: List[str]
+    url: str
+    position: int
+    token_count: int
+
+
+def measure(batch: ChunkBatch) -> Dict[str, float]:
+    """
+    Bytes allocated per chunk by each representation of the same chunks.
+    Ids, text and header strings already exist, so only the per-chunk
+    overhead is counted.
+    """
+    def allocated(build) -> float:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del kept
+        return size / max(len(batch), 1)
+
+    rows = [(batch.ids[i], batch.contents[i], batch.services[i], batch.page_ids[i], batch.urls[i],
+             batch.positions[i], batch.token_counts[i]) for i in range(len(batch))]
+    headers = [batch.headers(i) for i in range(len(batch))]
+    return {
+        "dataclass": allocated(lambda: [_DataclassChunk(r[0], r[1], r[2], r[3], list(h), r[4], r[5], r[6])
+                                        for r, h in zip(rows, headers)]),
+        "dict": allocated(lambda: [{"id": r[0], "content": r[1], "service": r[2], "page_id": r[3],
+                                    "headers": json.dumps(list(h)), "url": r[4], "position": r[5],
+                                    "token_count": r[6]} for r, h in zip(rows, headers)]),
+        "slots": allocated(lambda: [Chunk(r[0], r[1], r[2], r[3], h, r[4], r[5], r[6])
+                                    for r, h in zip(rows, headers)]),
+        "columnar": allocated(lambda: _rebuild(batch))
+    }
+
+
+def _rebuild(batch: ChunkBatch) -> ChunkBatch:
+    copy = ChunkBatch()
+    copy.extend(batch)
+    return copy
+
+
+def main():
+    from scripts.fast_chunker import DOCS_PATH, chunk_document
+
+    parser = argparse.ArgumentParser(description="Measure per-chunk memory of the chunk representations")
+    parser.add_argument("--docs", default=DOCS_PATH, help="Markdown corpus to sample")
+    parser.add_argument("--files", type=int, default=2000, help="Number of files to chunk")
+    args = parser.parse_args()
+
+    files = glob.glob(os.path.join(args.docs, "**", "*.md"), recursive=True)
+    random.Random(0).shuffle(files)
+    batch = ChunkBatch()
+    for path in files[:args.files]:
+        try:
+            batch.extend(chunk_document(path))
+        except (OSError, ValueError):
+            continue
+    if not batch:
+        print(f"❌ No chunks found under {args.docs}")
+        sys.exit(1)
+
+    print(f"📦 {len(batch):,} chunks from {min(len(files), args.files):,} files "
+          f"(per-chunk overhead, text and ids excluded)")
+    results = measure(batch)
+    for name, per_chunk in results.items():
+        print(f"   {name:9s} {per_chunk:8.1f} bytes/chunk")
+    print(f"   columnar is {results['dataclass'] / max(results['columnar'], 1e-9):.1f}x smaller than dataclass")
+
+
+if __name__ == "__main__":
+    main()
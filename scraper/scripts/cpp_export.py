@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Export to rag-cpp-server format
+Streams chunks and embeddings into the documents.json(.gz) and
+embeddings.bin(.gz) files read by rag-cpp-server/src/main.cpp
+
+embeddings.bin layout (little-endian):
+  u32 count, then per document: u32 dim, dim x f32
+"""
+
+import os
+import json
+import gzip
+import shutil
+import struct
+import argparse
+from typing import List, Dict, Any, Iterator, Tuple, Optional
+
+import numpy as np
+
+# Configuration
+CHROMA_DB_PATH = "/home/rag_cache/chroma_db"
+COLLECTION_NAME = "huawei_docs"
+OUTPUT_DIR = "/home/rag_cache"
+SERVICE_CATALOG_PATH = "/home/rag_cache/service-catalog.json"
+PAGE_SIZE = 1000
+
+DOCS_FILE = "documents.json"
+EMBEDDINGS_FILE = "embeddings.bin"
+
+
+def load_service_categories(catalog_path: str = SERVICE_CATALOG_PATH) -> Dict[str, str]:
+    """Map product code -> category code from the scraped service catalog"""
+    if not os.path.exists(catalog_path):
+        return {}
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        catalog = json.load(f)
+    categories = {}
+    for category in catalog.get("categories", []):
+        for product in category.get("products", []):
+            categories[product.get("code", "").lower()] = product.get("category") or category.get("code", "")
+    return categories
+
+
+def chunk_to_cpp_doc(chunk_id: str, text: str, metadata: Optional[Dict[str, Any]],
+                     categories: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Convert a Chroma-style (id, document, metadata) triple into a server Doc"""
+    metadata = metadata or {}
+    headers = metadata.get("headers", [])
+    if isinstance(headers, str):
+        try:
+            headers = json.loads(headers)
+        except ValueError:
+            headers = [headers]
+
+    service = metadata.get("service", "")
+    title = headers[-1] if headers else metadata.get("header") or metadata.get("page_id", "")
+    return {
+        "id": chunk_id,
+        "content": text or "",
+        "source": metadata.get("url") or metadata.get("source", ""),
+        "title": title,
+        "product": service.upper(),
+        "category": (categories or {}).get(service.lower(), "")
+    }
+
+
+class CppCorpusWriter:
+    """
+    Incremental writer for the rag-cpp-server cache files.
+
+    Documents and vectors are appended batch by batch to temporary files, so
+    memory stays bounded by one batch. close() patches the embedding count,
+    validates that document and embedding counts (and file sizes) agree,
+    optionally gzips, and only then moves the files into place.
+    """
+
+    def __init__(self, out_dir: str, compress: bool = False, categories: Optional[Dict[str, str]] = None):
+        self.out_dir = out_dir
+        self.compress = compress
+        self.categories = load_service_categories() if categories is None else categories
+        self.doc_count = 0
+        self.emb_count = 0
+        self.dim: Optional[int] = None
+
+        os.makedirs(out_dir, exist_ok=True)
+        self._docs_tmp = os.path.join(out_dir, DOCS_FILE + ".tmp")
+        self._emb_tmp = os.path.join(out_dir, EMBEDDINGS_FILE + ".tmp")
+        self._docs = open(self._docs_tmp, 'w', encoding='utf-8')
+        self._emb = open(self._emb_tmp, 'w+b')
+        self._docs.write('[')
+        self._emb.write(struct.pack('<I', 0))  # Count is patched on close
+
+    def add(self, docs: List[Dict[str, str]], embeddings):
+        """Append a batch of server docs and their embedding rows"""
+        embeddings = np.asarray(embeddings, dtype='<f4')
+        if embeddings.ndim != 2 or len(docs) != embeddings.shape[0]:
+            raise ValueError(f"Batch mismatch: {len(docs)} docs vs embeddings of shape {embeddings.shape}")
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension changed from {self.dim} to {embeddings.shape[1]}")
+
+        for doc in docs:
+            if self.doc_count:
+                self._docs.write(',')
+            self._docs.write(json.dumps(doc, ensure_ascii=False))
+            self.doc_count += 1
+
+        # Interleave the per-row u32 length prefix with the float payload
+        rows = np.empty((embeddings.shape[0], self.dim + 1), dtype='<f4')
+        rows.view('<u4')[:, 0] = self.dim
+        rows[:, 1:] = embeddings
+        self._emb.write(rows.tobytes())
+        self.emb_count += embeddings.shape[0]
+
+    def add_chunks(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]], embeddings):
+        docs = [chunk_to_cpp_doc(i, t, m, self.categories) for i, t, m in zip(ids, texts, metadatas)]
+        self.add(docs, embeddings)
+
+    def _verify(self):
+        if self.doc_count != self.emb_count:
+            raise ValueError(f"Documents/embeddings count mismatch: {self.doc_count} vs {self.emb_count}")
+        if self.doc_count >= 2 ** 32:
+            raise ValueError("Too many documents for u32 count header")
+        expected = 4 + self.emb_count * (4 + 4 * (self.dim or 0))
+        actual = os.path.getsize(self._emb_tmp)
+        if actual != expected:
+            raise ValueError(f"embeddings.bin size {actual} != expected {expected}")
+
+    def _install(self, tmp_path: str, name: str):
+        final = os.path.join(self.out_dir, name)
+        # The server prefers the .gz variant, so never leave a stale one behind
+        stale = final if self.compress else final + ".gz"
+        if os.path.exists(stale):
+            os.remove(stale)
+        if self.compress:
+            gz_tmp = tmp_path + ".gz"
+            with open(tmp_path, 'rb') as src, gzip.open(gz_tmp, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.remove(tmp_path)
+            os.replace(gz_tmp, final + ".gz")
+        else:
+            os.replace(tmp_path, final)
+
+    def close(self) -> Dict[str, Any]:
+        self._docs.write(']')
+        self._docs.close()
+        self._emb.seek(0)
+        self._emb.write(struct.pack('<I', self.emb_count))
+        self._emb.close()
+
+        self._verify()
+        self._install(self._docs_tmp, DOCS_FILE)
+        self._install(self._emb_tmp, EMBEDDINGS_FILE)
+        return {"documents": self.doc_count, "dim": self.dim, "compressed": self.compress}
+
+    def abort(self):
+        """Discard partially written files"""
+        for handle in (self._docs, self._emb):
+            if not handle.closed:
+                handle.close()
+        for path in (self._docs_tmp, self._emb_tmp):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def iter_collection(collection, page_size: int = PAGE_SIZE) -> Iterator[Tuple[List[str], List[str], List[Dict], Any]]:
+    """Page through a Chroma collection yielding (ids, documents, metadatas, embeddings)"""
+    total = collection.count()
+    for offset in range(0, total, page_size):
+        page = collection.get(
+            limit=page_size,
+            offset=offset,
+            include=["documents", "metadatas", "embeddings"]
+        )
+        if not page["ids"]:
+            break
+        yield page["ids"], page["documents"], page["metadatas"], np.asarray(page["embeddings"], dtype=np.float32)
+
+
+def export_collection(collection, out_dir: str, compress: bool = False,
+                      page_size: int = PAGE_SIZE, show_progress: bool = True) -> Dict[str, Any]:
+    """Stream an existing Chroma collection into the rag-cpp-server files"""
+    writer = CppCorpusWriter(out_dir, compress=compress)
+    try:
+        pages = iter_collection(collection, page_size)
+        if show_progress:
+            from tqdm import tqdm
+            pages = tqdm(pages, total=(collection.count() + page_size - 1) // page_size,
+                         desc="Exporting", unit="page")
+        for ids, texts, metadatas, embeddings in pages:
+            writer.add_chunks(ids, texts, metadatas, embeddings)
+        return writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a Chroma collection to rag-cpp-server files")
+    parser.add_argument("--out", default=OUTPUT_DIR, help="Directory for documents.json / embeddings.bin")
+    parser.add_argument("--gzip", action="store_true", help="Write .gz variants")
+    parser.add_argument("--chroma-path", default=CHROMA_DB_PATH, help="ChromaDB directory")
+    parser.add_argument("--collection", default=COLLECTION_NAME, help="Collection name")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="Rows fetched per page")
+    args = parser.parse_args()
+
+    import chromadb
+
+    print(f"📦 Exporting '{args.collection}' from {args.chroma_path}")
+    client = chromadb.PersistentClient(path=args.chroma_path)
+    collection = client.get_collection(name=args.collection)
+    print(f"   {collection.count():,} chunks")
+
+    result = export_collection(collection, args.out, compress=args.gzip, page_size=args.page_size)
+    print(f"✅ Wrote {result['documents']:,} documents ({result['dim']}-d) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Multi-Process Embedding Pool
+Runs N embedding workers, each owning its own encoder (encoders.py) with
+intra-op threads capped at cores / N, so CPU-only ingestion scales with
+cores instead of leaning on one model's thread pool. Workers write their
+vectors straight into a shared-memory output buffer; only texts and row
+indices cross the process boundary.
+"""
+
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from scripts.encode_scheduler import BASELINE_BATCH_SIZE, TOKEN_BUDGET
+from scripts.encoders import MODEL_NAME, cache_name
+
+# Configuration
+TASKS_PER_WORKER = 2  # Pieces per worker for each encode() call, so a slow piece doesn't idle the rest
+MIN_TASK_TEXTS = 8
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+# Worker process state
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(kind: str, model_name: str, threads: int, token_budget: int, model_path: Optional[str]):
+    # Thread caps must be set before torch / onnxruntime create their pools
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    from scripts.encoders import load_encoder
+    from scripts.encode_scheduler import TokenBudgetScheduler
+
+    if kind == "torch":
+        import torch
+        torch.set_num_threads(threads)
+        encoder = load_encoder(kind, model_name)
+    else:
+        encoder = load_encoder(kind, model_name, model_path=model_path, threads=threads)
+    if token_budget > 0:
+        encoder = TokenBudgetScheduler(encoder, token_budget)
+    _worker["encoder"] = encoder
+    _worker["shm"] = None
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = _worker["shm"]
+    if shm is None or shm.name != name:
+        if shm is not None:
+            shm.close()
+        shm = shared_memory.SharedMemory(name=name)
+        _worker["shm"] = shm
+    return shm
+
+
+def _encode_task(shm_name: str, capacity: int, dim: int, rows: List[int], texts: List[str],
+                 batch_size: int, kwargs: Dict[str, Any]) -> Dict[str, float]:
+    """Encode texts into rows of the shared output buffer; returns this task's stats"""
+    encoder = _worker["encoder"]
+    before = encoder.stats() if hasattr(encoder, "stats") else None
+    start = time.time()
+    embeddings = encoder.encode(texts, batch_size=batch_size, show_progress_bar=False,
+                                convert_to_numpy=True, **kwargs)
+    out = np.ndarray((capacity, dim), dtype=np.float32, buffer=_attach(shm_name).buf)
+    out[rows] = embeddings
+    del out  # Release the buffer view before the next attach can close it
+    stats = {"seconds": time.time() - start}
+    if before is not None:
+        after = encoder.stats()
+        for key in ("tokens", "padded_tokens"):
+            stats[key] = after[key] - before[key]
+    return stats
+
+
+def _dimension() -> int:
+    return _worker["encoder"].get_sentence_embedding_dimension()
+
+
+def _worker_context():
+    """forkserver/spawn: never fork a parent that already runs model or pipeline threads"""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class EmbedWorkerPool:
+    """
+    Encoder-compatible front end (encode / cache_name /
+    get_sentence_embedding_dimension, so EmbeddingCache.encode works) over
+    a pool of embedding processes. Each encode() call is dealt round-robin
+    by text length into workers x TASKS_PER_WORKER pieces, so pieces carry
+    similar work, and reassembled in the shared buffer in input order.
+    """
+
+    def __init__(self, kind: str, model_name: str = MODEL_NAME, workers: int = 2,
+                 threads: Optional[int] = None, token_budget: int = TOKEN_BUDGET,
+                 model_path: Optional[str] = None):
+        self.kind = kind
+        self.model_name = model_name
+        self.cache_name = cache_name(kind, model_name)
+        self.workers = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self.token_budget = token_budget
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=_worker_context(), initializer=_init_worker,
+            initargs=(kind, model_name, self.threads, token_budget, model_path))
+        self.dim = self._executor.submit(_dimension).result()
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._capacity = 0
+        self._lock = threading.Lock()
+        self.texts = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+        self.worker_seconds = 0.0
+        self.seconds = 0.0
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _buffer(self, rows: int) -> shared_memory.SharedMemory:
+        if self._shm is None or rows > self._capacity:
+            self._release()
+            self._capacity = max(rows, 2 * self._capacity, 1024)
+            self._shm = shared_memory.SharedMemory(create=True, size=self._capacity * self.dim * 4)
+        return self._shm
+
+    def _release(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def encode(self, sentences, batch_size: int = BASELINE_BATCH_SIZE, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        with self._lock:  # One call at a time owns the shared buffer
+            start = time.time()
+            shm = self._buffer(len(texts))
+            order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+            pieces = max(1, min(self.workers * TASKS_PER_WORKER, len(texts) // MIN_TASK_TEXTS))
+            futures = []
+            for p in range(pieces):
+                rows = order[p::pieces]
+                futures.append(self._executor.submit(
+                    _encode_task, shm.name, self._capacity, self.dim, rows,
+                    [texts[i] for i in rows], batch_size, kwargs))
+            task_stats = [f.result() for f in futures]
+            out = np.ndarray((self._capacity, self.dim), dtype=np.float32, buffer=shm.buf)
+            embeddings = out[:len(texts)].copy()
+            del out
+
+            self.texts += len(texts)
+            self.tokens += sum(s.get("tokens", 0) for s in task_stats)
+            self.padded_tokens += sum(s.get("padded_tokens", 0) for s in task_stats)
+            self.worker_seconds += sum(s["seconds"] for s in task_stats)
+            self.seconds += time.time() - start
+        return embeddings[0] if single else embeddings
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "threads_per_worker": self.threads,
+                "texts": self.texts,
+                "tokens": self.tokens,
+                "padding_waste": round(1 - self.tokens / self.padded_tokens, 4) if self.padded_tokens else 0.0,
+                "encode_seconds": round(self.seconds, 2),
+                # Busy worker-seconds per wall second: close to `workers` means the pool is kept full
+                "parallelism": round(self.worker_seconds / self.seconds, 2) if self.seconds else 0.0,
+                "tokens_per_second": round(self.tokens / self.seconds, 1) if self.seconds else 0.0,
+                "chunks_per_second": round(self.texts / self.seconds, 1) if self.seconds else 0.0
+            }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (f"{s['workers']} workers x {s['threads_per_worker']} threads, "
+                f"{s['tokens_per_second']:,.0f} tokens/s, {s['chunks_per_second']:,.1f} chunks/s, "
+                f"parallelism {s['parallelism']:.1f}, padding waste {s['padding_waste']:.1%}")
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Persistent Embedding Cache
+Memory-mapped float32 matrix plus a hash -> row index, keyed by model name
+and normalized chunk text, so identical chunks are never embedded twice
+"""
+
+import os
+import json
+import hashlib
+from typing import List, Dict, Optional
+
+import numpy as np
+
+CACHE_VERSION = 1
+KEY_SIZE = 16  # bytes per blake2b digest
+
+
+def normalize_text(text: str) -> str:
+    """Whitespace-insensitive form of a chunk used for cache keys"""
+    return " ".join(text.split())
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    h = hashlib.blake2b(digest_size=KEY_SIZE)
+    h.update(model_name.encode('utf-8'))
+    h.update(b'\0')
+    h.update(normalize_text(text).encode('utf-8'))
+    return h.digest()
+
+
+class EmbeddingCache:
+    """
+    Append-only on-disk embedding cache.
+
+    Layout under `cache_dir` (one set of files per model):
+      <model>.json  header with model name, dimension and version
+      <model>.keys  concatenated 16-byte digests, one per row
+      <model>.f32   row-major float32 matrix, memory-mapped for reads
+
+    Rows are written before keys, so an interrupted run leaves at most a few
+    unreferenced rows that are truncated on the next open. Only one process
+    should write to a cache at a time.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        slug = model_name.replace('/', '__')
+        self.meta_path = os.path.join(cache_dir, f"{slug}.json")
+        self.keys_path = os.path.join(cache_dir, f"{slug}.keys")
+        self.data_path = os.path.join(cache_dir, f"{slug}.f32")
+
+        self.dim: Optional[int] = None
+        self.index: Dict[bytes, int] = {}
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+        self._matrix = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._open()
+
+    def _open(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get("version") != CACHE_VERSION or meta.get("model") != self.model_name:
+            print(f"Embedding cache {self.meta_path} is incompatible, starting fresh")
+            self._reset_files()
+            return
+
+        self.dim = int(meta["dim"])
+        row_bytes = self.dim * 4
+        key_rows = os.path.getsize(self.keys_path) // KEY_SIZE if os.path.exists(self.keys_path) else 0
+        data_rows = os.path.getsize(self.data_path) // row_bytes if os.path.exists(self.data_path) else 0
+        self.rows = min(key_rows, data_rows)
+
+        # Drop any partially written tail
+        if os.path.exists(self.keys_path):
+            os.truncate(self.keys_path, self.rows * KEY_SIZE)
+        if os.path.exists(self.data_path):
+            os.truncate(self.data_path, self.rows * row_bytes)
+
+        if self.rows:
+            with open(self.keys_path, 'rb') as f:
+                raw = f.read()
+            for row in range(self.rows):
+                self.index[raw[row * KEY_SIZE:(row + 1) * KEY_SIZE]] = row
+        self._remap()
+
+    def _reset_files(self):
+        for path in (self.meta_path, self.keys_path, self.data_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _remap(self):
+        if self.rows and self.dim:
+            self._matrix = np.memmap(self.data_path, dtype=np.float32, mode='r', shape=(self.rows, self.dim))
+        else:
+            self._matrix = None
+
+    def _init_dim(self, dim: int):
+        self.dim = dim
+        with open(self.meta_path, 'w') as f:
+            json.dump({"version": CACHE_VERSION, "model": self.model_name, "dim": dim}, f)
+
+    def lookup(self, texts: List[str]):
+        """Return (keys, rows) where rows[i] is the cache row or -1 on a miss"""
+        keys = [cache_key(self.model_name, t) for t in texts]
+        rows = [self.index.get(k, -1) for k in keys]
+        return keys, rows
+
+    def append(self, keys: List[bytes], embeddings: np.ndarray):
+        """Append new rows; keys already present are skipped"""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.dim is None:
+            self._init_dim(embeddings.shape[1])
+
+        new_keys = []
+        new_rows = []
+        for i, key in enumerate(keys):
+            if key not in self.index:
+                self.index[key] = self.rows + len(new_keys)
+                new_keys.append(key)
+                new_rows.append(i)
+        if not new_keys:
+            return
+
+        with open(self.data_path, 'ab') as f:
+            f.write(embeddings[new_rows].tobytes())
+        with open(self.keys_path, 'ab') as f:
+            f.write(b''.join(new_keys))
+        self.rows += len(new_keys)
+        self._remap()
+
+    def encode(self, model, texts: List[str], **encode_kwargs) -> np.ndarray:
+        """
+        Drop-in replacement for model.encode(texts, convert_to_numpy=True).
+        Only texts missing from the cache reach the model.
+        """
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+
+        keys, rows = self.lookup(texts)
+
+        # Deduplicate misses within the batch as well
+        miss_order: Dict[bytes, int] = {}
+        for i, (key, row) in enumerate(zip(keys, rows)):
+            if row < 0 and key not in miss_order:
+                miss_order[key] = i
+
+        self.misses += sum(1 for r in rows if r < 0)
+        self.hits += sum(1 for r in rows if r >= 0)
+
+        if miss_order:
+            encode_kwargs.setdefault("show_progress_bar", False)
+            encode_kwargs["convert_to_numpy"] = True
+            miss_texts = [texts[i] for i in miss_order.values()]
+            fresh = np.asarray(model.encode(miss_texts, **encode_kwargs), dtype=np.float32)
+            self.append(list(miss_order.keys()), fresh)
+
+        row_ids = np.fromiter((self.index[k] for k in keys), dtype=np.int64, count=len(keys))
+        return np.asarray(self._matrix[row_ids], dtype=np.float32)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "rows": self.rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Token-Budget Encode Scheduler
+Wraps an encoder (encoders.py) so each encode() call is split into batches
+by tokenized length instead of a fixed count: texts are sorted longest
+first and a batch grows until batch size x its longest member would exceed
+a padded-token budget. Short chunks therefore run in large batches and long
+ones in small batches with little padding; outputs come back in input
+order, and each text's vector is the one the model gives it in any batch.
+"""
+
+import time
+import threading
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+# Configuration
+TOKEN_BUDGET = 16384  # Padded tokens per forward pass (e.g. 64 x 256 or 512 x 32)
+MAX_BATCH_SIZE = 512
+BASELINE_BATCH_SIZE = 32  # sentence-transformers' default, what callers that don't pass batch_size got
+
+
+def plan_batches(lengths: Sequence[int], token_budget: int = TOKEN_BUDGET,
+                 max_batch_size: int = MAX_BATCH_SIZE) -> List[List[int]]:
+    """Index batches, longest texts first, each with len(batch) * longest <= token_budget"""
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    for i in order:
+        # The first member is the longest, so it sets the padded width
+        if batch and ((len(batch) + 1) * lengths[batch[0]] > token_budget or len(batch) >= max_batch_size):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def padded_tokens(lengths: Sequence[int], batches: List[List[int]]) -> int:
+    return sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+
+
+def fixed_batches(texts: Sequence[str], batch_size: int) -> List[List[int]]:
+    """What the encoders do with a fixed batch_size: character-length sorted, batch_size at a time"""
+    order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+class TokenBudgetScheduler:
+    """
+    Drop-in encoder (model.encode / EmbeddingCache.encode both work with it)
+    that schedules batches by token budget and keeps throughput stats.
+    """
+
+    def __init__(self, encoder, token_budget: int = TOKEN_BUDGET, max_batch_size: int = MAX_BATCH_SIZE):
+        self.encoder = encoder
+        self.cache_name = encoder.cache_name
+        self.model_name = encoder.model_name
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.texts = 0
+        self.batches = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+        self.baseline_padded_tokens = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.encoder.get_sentence_embedding_dimension()
+
+    def encode(self, sentences, batch_size: int = BASELINE_BATCH_SIZE, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        """
+        model.encode() signature; batch_size is ignored for scheduling and
+        only used to report the padding a fixed batch size would have cost
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        start = time.time()
+        lengths = self.encoder.token_lengths(texts)
+        batches = plan_batches(lengths, self.token_budget, self.max_batch_size)
+        embeddings = None
+        for batch in batches:
+            vectors = np.asarray(self.encoder.encode([texts[i] for i in batch], batch_size=len(batch),
+                                                     show_progress_bar=False, convert_to_numpy=True, **kwargs))
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=vectors.dtype)
+            embeddings[batch] = vectors
+        elapsed = time.time() - start
+
+        with self._lock:
+            self.texts += len(texts)
+            self.batches += len(batches)
+            self.tokens += sum(lengths)
+            self.padded_tokens += padded_tokens(lengths, batches)
+            self.baseline_padded_tokens += padded_tokens(lengths, fixed_batches(texts, batch_size))
+            self.seconds += elapsed
+        return embeddings[0] if single else embeddings
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            def waste(padded: int) -> float:
+                return round(1 - self.tokens / padded, 4) if padded else 0.0
+
+            return {
+                "texts": self.texts,
+                "batches": self.batches,
+                "mean_batch_size": round(self.texts / self.batches, 1) if self.batches else 0.0,
+                "tokens": self.tokens,
+                "padded_tokens": self.padded_tokens,
+                "padding_waste": waste(self.padded_tokens),
+                "fixed_batch_padding_waste": waste(self.baseline_padded_tokens),
+                "encode_seconds": round(self.seconds, 2),
+                "tokens_per_second": round(self.tokens / self.seconds, 1) if self.seconds else 0.0,
+                "chunks_per_second": round(self.texts / self.seconds, 1) if self.seconds else 0.0
+            }
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (f"{s['tokens_per_second']:,.0f} tokens/s, {s['chunks_per_second']:,.1f} chunks/s, "
+                f"padding waste {s['padding_waste']:.1%} (fixed batches: {s['fixed_batch_padding_waste']:.1%}), "
+                f"{s['batches']:,} batches of {s['mean_batch_size']} on average")
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Embedding Encoders
+Pluggable sentence encoders behind the SentenceTransformer `encode` call the
+ingesters and query tools already make:
+
+  torch      sentence-transformers (PyTorch), the reference
+  onnx-int8  ONNX Runtime on the dynamically quantized int8 export of the
+             same model (the one the Node route loads), CPU only
+
+`encoders.py parity` checks that the int8 vectors agree with the PyTorch
+ones; `encoders.py benchmark` measures chunks/sec per backend.
+"""
+
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configuration
+MODEL_NAME = "all-MiniLM-L6-v2"
+ENCODERS = ("torch", "onnx-int8")
+DEFAULT_ENCODER = os.environ.get("RAG_ENCODER", "torch")
+ONNX_MODEL_DIR = os.environ.get("RAG_ONNX_MODEL_DIR", "/home/rag_cache/onnx_models")
+ONNX_REPOS = {"all-MiniLM-L6-v2": "Xenova/all-MiniLM-L6-v2"}  # Same export as app/api/search-rag
+ONNX_FILE = "onnx/model_quantized.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+MAX_SEQ_LENGTH = 256  # sentence-transformers' max_seq_length for MiniLM; longer chunks are truncated
+ENCODE_BATCH_SIZE = 32
+PARITY_MIN_COSINE = 0.97  # Worst single text allowed
+PARITY_MEAN_COSINE = 0.99
+PARITY_SAMPLES = 500
+BENCHMARK_CHUNKS = 2000
+
+
+def cache_name(kind: str, model_name: str = MODEL_NAME) -> str:
+    """
+    Model id for embedding caches and ingest manifests. The int8 vectors
+    differ slightly from the PyTorch ones, so they are never mixed.
+    """
+    return model_name if kind == "torch" else f"{model_name}:{kind}"
+
+
+class Encoder(ABC):
+    """SentenceTransformer-compatible encode() over some inference backend"""
+    kind = ""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.cache_name = cache_name(self.kind, model_name)
+        self.dim = 0
+
+    @abstractmethod
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = ENCODE_BATCH_SIZE,
+               show_progress_bar: bool = False, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        """Embedding matrix (one row per sentence), as SentenceTransformer.encode returns it"""
+
+    @abstractmethod
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        """Model input length of each text (special tokens included, after truncation)"""
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def embed_fn(self) -> Callable[[List[str]], np.ndarray]:
+        """Plain texts -> matrix function, e.g. for LocalCollection or QueryEmbeddingCache"""
+        return lambda texts: self.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+
+
+class TorchEncoder(Encoder):
+    """sentence-transformers on whatever device it picks (the previous behaviour)"""
+    kind = "torch"
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        super().__init__(model_name)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, sentences, batch_size: int = ENCODE_BATCH_SIZE, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        return self.model.encode(sentences, batch_size=batch_size, show_progress_bar=show_progress_bar,
+                                 convert_to_numpy=convert_to_numpy, **kwargs)
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        encoded = self.model.tokenizer(texts, truncation=True, max_length=self.model.max_seq_length,
+                                       return_attention_mask=False, return_token_type_ids=False)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+
+def fetch_onnx_model(model_name: str = MODEL_NAME, model_dir: str = ONNX_MODEL_DIR) -> str:
+    """Directory holding the int8 ONNX model and tokenizer, downloaded on first use"""
+    target = os.path.join(model_dir, model_name)
+    if all(os.path.exists(os.path.join(target, f)) for f in (ONNX_FILE, TOKENIZER_FILE)):
+        return target
+    if model_name not in ONNX_REPOS:
+        raise ValueError(f"No ONNX export known for {model_name}; put {ONNX_FILE} and {TOKENIZER_FILE} in {target}")
+    from huggingface_hub import hf_hub_download
+    print(f"Downloading {ONNX_REPOS[model_name]} ({ONNX_FILE}) to {target}...")
+    for filename in (ONNX_FILE, TOKENIZER_FILE):
+        hf_hub_download(repo_id=ONNX_REPOS[model_name], filename=filename, local_dir=target)
+    return target
+
+
+class OnnxEncoder(Encoder):
+    """
+    int8 MiniLM on ONNX Runtime: tokenizers (Rust) for tokenization, then
+    attention-masked mean pooling and L2 normalization, as the
+    sentence-transformers pipeline for this model does.
+    """
+    kind = "onnx-int8"
+
+    def __init__(self, model_name: str = MODEL_NAME, model_path: Optional[str] = None,
+                 threads: Optional[int] = None):
+        super().__init__(model_name)
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = model_path or fetch_onnx_model(model_name)
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.length_tokenizer = Tokenizer.from_file(os.path.join(model_path, TOKENIZER_FILE))
+        self.length_tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.length_tokenizer.no_padding()
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(model_path, ONNX_FILE), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.dim = int(self.encode(["dimension probe"]).shape[1])
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        return [len(e.ids) for e in self.length_tokenizer.encode_batch(texts)]
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]  # (batch, tokens, dim) last_hidden_state
+
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = ENCODE_BATCH_SIZE, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        # Length-sorted batches pad less; results go back in input order
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings = np.empty((len(texts), 0), dtype=np.float32)
+        starts = range(0, len(texts), batch_size)
+        if show_progress_bar:
+            from tqdm import tqdm
+            starts = tqdm(starts, desc="Batches")
+        for start in starts:
+            batch = order[start:start + batch_size]
+            vectors = self._encode_batch([texts[i] for i in batch])
+            if embeddings.shape[1] == 0:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+        return embeddings[0] if single else embeddings
+
+
+def load_encoder(kind: str = DEFAULT_ENCODER, model_name: str = MODEL_NAME, **kwargs) -> Encoder:
+    if kind == "torch":
+        return TorchEncoder(model_name)
+    if kind == "onnx-int8":
+        return OnnxEncoder(model_name, **kwargs)
+    raise ValueError(f"Unknown encoder '{kind}' (expected one of {', '.join(ENCODERS)})")
+
+
+def lazy_embed_fn(kind: str = DEFAULT_ENCODER, model_name: str = MODEL_NAME) -> Callable[[List[str]], np.ndarray]:
+    """Embed function that loads the encoder on first call (query tools that may never embed)"""
+    state: Dict[str, Encoder] = {}
+
+    def embed(texts: List[str]) -> np.ndarray:
+        if "encoder" not in state:
+            state["encoder"] = load_encoder(kind, model_name)
+        return state["encoder"].encode(texts, show_progress_bar=False, convert_to_numpy=True)
+
+    return embed
+
+
+def sample_chunks(docs_path: str, count: int, seed: int = 0) -> List[str]:
+    """Real chunk texts from a sample of the markdown corpus"""
+    from scripts.fast_chunker import chunk_document
+    files = glob.glob(os.path.join(docs_path, "**", "*.md"), recursive=True)
+    random.Random(seed).shuffle(files)
+    texts: List[str] = []
+    for path in files:
+        try:
+            texts.extend(chunk_document(path).contents)
+        except (OSError, ValueError):
+            continue  # Unreadable page: sample the next one
+        if len(texts) >= count:
+            break
+    return texts[:count]
+
+
+def parity(reference: Encoder, candidate: Encoder, texts: List[str]) -> Dict[str, float]:
+    """Per-text cosine between the two encoders' (normalized) embeddings"""
+    a = reference.encode(texts, convert_to_numpy=True)
+    b = candidate.encode(texts, convert_to_numpy=True)
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    cosines = (a * b).sum(axis=1)
+    return {
+        "texts": len(texts),
+        "min": float(cosines.min()),
+        "mean": float(cosines.mean()),
+        "p01": float(np.percentile(cosines, 1)),
+        "worst": texts[int(cosines.argmin())][:80]
+    }
+
+
+def benchmark(encoder, texts: List[str], batch_size: int) -> Dict[str, Any]:
+    encoder.encode(texts[:batch_size], batch_size=batch_size)  # Warm-up
+    start = time.time()
+    embeddings = encoder.encode(texts, batch_size=batch_size)
+    elapsed = time.time() - start
+    return {"seconds": elapsed, "chunks_per_second": len(texts) / max(elapsed, 1e-9), "embeddings": embeddings}
+
+
+def main():
+    from scripts.fast_chunker import DOCS_PATH
+
+    parser = argparse.ArgumentParser(description="Compare and benchmark embedding encoders")
+    parser.add_argument("command", choices=["parity", "benchmark"],
+                        help="parity: cosine agreement of onnx-int8 with torch; benchmark: chunks/sec per encoder")
+    parser.add_argument("--docs", default=DOCS_PATH, help="Markdown corpus to sample chunks from")
+    parser.add_argument("--samples", type=int, default=None,
+                        help=f"Chunks to encode (default: {PARITY_SAMPLES} for parity, {BENCHMARK_CHUNKS} for benchmark)")
+    parser.add_argument("--encoders", nargs="+", choices=ENCODERS, default=list(ENCODERS),
+                        help="Encoders to benchmark")
+    parser.add_argument("--batch-size", type=int, default=ENCODE_BATCH_SIZE, help="Encode batch size")
+    parser.add_argument("--token-budget", type=int, default=None,
+                        help="Benchmark: also run each encoder under the token-budget scheduler "
+                             "(default: encode_scheduler.TOKEN_BUDGET, 0 to skip)")
+    parser.add_argument("--onnx-model", metavar="DIR", default=None,
+                        help=f"Directory with {ONNX_FILE} and {TOKENIZER_FILE} (default: download to {ONNX_MODEL_DIR})")
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--min-cosine", type=float, default=PARITY_MIN_COSINE, help="Parity: worst text allowed")
+    parser.add_argument("--mean-cosine", type=float, default=PARITY_MEAN_COSINE, help="Parity: mean allowed")
+    args = parser.parse_args()
+
+    default_samples = PARITY_SAMPLES if args.command == "parity" else BENCHMARK_CHUNKS
+    texts = sample_chunks(args.docs, args.samples or default_samples)
+    if not texts:
+        print(f"❌ No chunks found under {args.docs}")
+        sys.exit(1)
+    print(f"📄 {len(texts):,} chunks sampled from {args.docs}")
+
+    def load(kind: str) -> Encoder:
+        if kind == "onnx-int8":
+            return load_encoder(kind, model_path=args.onnx_model, threads=args.threads)
+        return load_encoder(kind)
+
+    if args.command == "parity":
+        stats = parity(load("torch"), load("onnx-int8"), texts)
+        print(f"   cosine(torch, onnx-int8): mean {stats['mean']:.4f}, p01 {stats['p01']:.4f}, min {stats['min']:.4f}")
+        print(f"   worst: {stats['worst']!r}")
+        if stats["min"] < args.min_cosine or stats["mean"] < args.mean_cosine:
+            print(f"❌ Parity failed (need min >= {args.min_cosine}, mean >= {args.mean_cosine})")
+            sys.exit(1)
+        print("✓ Parity OK")
+        return
+
+    from scripts.encode_scheduler import TOKEN_BUDGET, TokenBudgetScheduler
+    token_budget = TOKEN_BUDGET if args.token_budget is None else args.token_budget
+
+    results = {}
+    for kind in args.encoders:
+        print(f"⏱️  {kind}...")
+        encoder = load(kind)
+        results[kind] = benchmark(encoder, texts, args.batch_size)
+        print(f"   {results[kind]['chunks_per_second']:,.1f} chunks/s ({results[kind]['seconds']:.1f}s)")
+        if token_budget > 0:
+            scheduler = TokenBudgetScheduler(encoder, token_budget)
+            scheduled = benchmark(scheduler, texts, args.batch_size)
+            drift = float(np.abs(scheduled["embeddings"] - results[kind]["embeddings"]).max())
+            speedup = scheduled["chunks_per_second"] / results[kind]["chunks_per_second"]
+            print(f"   token budget {token_budget}: {scheduled['chunks_per_second']:,.1f} chunks/s "
+                  f"({speedup:.2f}x, max |diff| {drift:.1e})")
+            print(f"   {scheduler.summary()}")
+    if "torch" in results:
+        for kind, result in results.items():
+            if kind != "torch":
+                speedup = result["chunks_per_second"] / results["torch"]["chunks_per_second"]
+                print(f"   {kind}: {speedup:.2f}x torch")
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,14 @@ Evaluate RAG relevance with hybrid search
 Tests multiple queries and calculates precision
 """
 
-import subprocess
-import re
+import os
+import sys
 from typing import List, Dict
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts import query_client
+
 
 # Test queries with expected services
 TEST_QUERIES = [
@@ -64,25 +68,19 @@ TEST_QUERIES = [
 ]
 
 
-def run_query(query: str, top_k: int = 3) -> List[Dict]:
-    """Run hybrid search and return results"""
-    cmd = ["python3", "scripts/hybrid_query.py", query, "--top-k", str(top_k), "--quiet"]
-    result = subprocess.run(cmd, capture_output=True, text=True, cwd="/home/scraper")
-    output = result.stdout
-    
-    # Parse results
-    results = []
-    pattern = r"Service: (\w+)\s+Section:.*?\nContent:\n(.*?)(?=\n\s*=|$)"
-    matches = re.findall(pattern, output, re.DOTALL)
-    
-    for i, (service, content) in enumerate(matches):
-        results.append({
-            "rank": i + 1,
-            "service": service.lower(),
-            "content": content[:300]  # First 300 chars for review
-        })
-    
-    return results
+def run_queries(queries: List[str], top_k: int = 3) -> List[List[Dict]]:
+    """Run hybrid search for every query in one batch (query server if running, else one local run)"""
+    return [
+        [
+            {
+                "rank": i + 1,
+                "service": result["metadata"].get("service", "unknown").lower(),
+                "content": result["text"][:300]  # First 300 chars for review
+            }
+            for i, result in enumerate(results)
+        ]
+        for results in query_client.search_or_local(queries, top_k=top_k)
+    ]
 
 
 def is_relevant(result: Dict, expected_services) -> bool:
@@ -107,6 +105,8 @@ def evaluate():
     passed_queries = 0
     detailed_results = []
     
+    all_results = run_queries([test["query"] for test in TEST_QUERIES], top_k=3)
+    
     for i, test in enumerate(TEST_QUERIES, 1):
         query = test["query"]
         expected = test["expected_service"]
@@ -116,7 +116,7 @@ def evaluate():
         print(f"  Text: {query}")
         print(f"  Expected: {expected}")
         
-        results = run_query(query, top_k=3)
+        results = all_results[i - 1]
         
         if not results:
             print(f"  Result: ❌ FAIL - No results")
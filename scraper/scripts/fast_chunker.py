@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Fast Ingest Chunker
+Worker-side chunking for fast_ingest.py. Only imports the standard library
+so pool workers start quickly and never load chromadb, torch or numpy.
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import List, Dict, Tuple
+
+from scripts.chunk_model import CHUNK_SCHEMA, Chunk, ChunkBatch
+from scripts.md_splitter import split_document
+from scripts.shared_columns import SharedColumns, pack
+
+# Configuration
+DOCS_PATH = "/home/rag_cache/clean_docs"
+MAX_CHUNK_SIZE = 1000
+MIN_CHUNK_SIZE = 100
+TARGET_CHUNK_SIZE = 500
+BATCH_TARGET_BYTES = 2 * 1024 * 1024  # Markdown bytes per worker task
+MAX_FILES_PER_BATCH = 500
+
+DocumentChunk = Chunk  # Chunk records are __slots__ objects from chunk_model
+
+def generate_chunk_id(file_path: str, content: str, index: int) -> str:
+    """Generate a globally unique chunk ID"""
+    # Create a hash from file path + content hash + index
+    path_hash = hashlib.md5(file_path.encode()).hexdigest()[:8]
+    content_sample = content[:100] if content else ""
+    content_hash = hashlib.md5(content_sample.encode()).hexdigest()[:8]
+    return f"chunk_{path_hash}_{content_hash}_{index}"
+
+def chunk_document(file_path: str) -> ChunkBatch:
+    """Process a single document into chunks; read / parse errors propagate to the caller"""
+    # Read file
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    # Parse metadata
+    relative_path = os.path.relpath(file_path, DOCS_PATH)
+    service = relative_path.split(os.sep)[0]
+    page_id = Path(file_path).stem
+    
+    meta_path = file_path.replace('.md', '.json')
+    metadata = {}
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+    
+    url = metadata.get('url', '')
+    
+    # Split by headers (oversized sections at paragraph breaks)
+    chunks = ChunkBatch()
+    for headers, chunk_content, tokens in split_document(content, MAX_CHUNK_SIZE, MIN_CHUNK_SIZE):
+        chunk_index = len(chunks)
+        chunks.append(
+            id=generate_chunk_id(file_path, chunk_content, chunk_index),
+            content=chunk_content,
+            service=service,
+            page_id=page_id,
+            headers=headers,
+            url=url,
+            position=chunk_index,
+            token_count=tokens
+        )
+    
+    return chunks
+
+def process_batch(args: Tuple[List[str], int]) -> Tuple[SharedColumns, int, List[str], List[Tuple[str, int]]]:
+    """
+    Process a batch of files. Chunks come back packed in shared memory
+    (unpack_batch() reads them in the parent), with each file's chunk count
+    in order so the parent can rebuild the chunk ids per file. Files that
+    failed to chunk are returned by path and have no chunk count.
+    """
+    file_batch, worker_id = args
+    chunks = ChunkBatch()
+    file_counts = []
+    processed = 0
+    failed_files = []
+    
+    for file_path in file_batch:
+        try:
+            file_chunks = chunk_document(file_path)
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+            failed_files.append(file_path)
+            continue
+        chunks.extend(file_chunks)
+        file_counts.append((file_path, len(file_chunks)))
+        processed += 1
+    
+    return pack(chunks.to_columns(), CHUNK_SCHEMA), processed, failed_files, file_counts
+
+def unpack_batch(result) -> Tuple[Tuple[ChunkBatch, int, List[str], Dict[str, List[str]]], float, int]:
+    """
+    Parent side of process_batch: read and free the shared columns.
+    Returns ((chunks, processed, failed_files, file_chunk_ids), worker pack seconds, bytes transferred)
+    """
+    shared, processed, failed, file_counts = result
+    chunks = ChunkBatch.from_columns(shared.load())
+    file_chunk_ids = {}
+    start = 0
+    for file_path, count in file_counts:
+        file_chunk_ids[file_path] = chunks.ids[start:start + count]
+        start += count
+    return (chunks, processed, failed, file_chunk_ids), shared.pack_seconds, shared.nbytes
+
+def discard_batch(result):
+    """Free the shared columns of a process_batch result that will never be unpacked"""
+    result[0].discard()
+
+def make_balanced_batches(files: List[str], num_workers: int = 1,
+                          target_bytes: int = BATCH_TARGET_BYTES,
+                          max_files: int = MAX_FILES_PER_BATCH) -> List[List[str]]:
+    """
+    Group files into batches of roughly equal total size.
+    Chunking cost scales with bytes, not file count, so fixed-count slices
+    leave workers idle behind a batch of unusually large pages. Small runs
+    (e.g. incremental refreshes) shrink the target so every worker gets work.
+    """
+    sizes = []
+    for file_path in files:
+        try:
+            sizes.append(os.path.getsize(file_path))
+        except OSError:
+            sizes.append(0)
+    target_bytes = max(1, min(target_bytes, sum(sizes) // (num_workers * 4)))
+    
+    batches = []
+    current = []
+    current_bytes = 0
+    
+    for file_path, size in zip(files, sizes):
+        current.append(file_path)
+        current_bytes += size
+        if current_bytes >= target_bytes or len(current) >= max_files:
+            batches.append(current)
+            current = []
+            current_bytes = 0
+    
+    if current:
+        batches.append(current)
+    return batches
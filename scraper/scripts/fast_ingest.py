@@ -9,223 +9,104 @@ import sys
 import json
 import glob
 import time
-import re
-import hashlib
-from pathlib import Path
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Tuple, Optional
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+from typing import Dict
+from concurrent.futures import ProcessPoolExecutor
 import multiprocessing
 from tqdm import tqdm
-import chromadb
-from sentence_transformers import SentenceTransformer
-import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Heavy libraries (chromadb, the encoder backends, numpy) are imported inside
+# main(): pool workers re-import this module and must stay lightweight.
+from scripts.fast_chunker import (
+    DOCS_PATH, MAX_CHUNK_SIZE, MIN_CHUNK_SIZE,
+    process_batch, unpack_batch, discard_batch, make_balanced_batches
+)
+from scripts.chunk_model import ChunkBatch
+from scripts.ingest_manifest import IngestManifest, delete_ids
+from scripts.ingest_pipeline import IngestPipeline
+from scripts.md_splitter import SPLITTER_VERSION
+from scripts.shared_columns import ensure_tracker
 
 # Configuration
 CHROMA_DB_PATH = "/home/rag_cache/chroma_db"
-DOCS_PATH = "/home/rag_cache/clean_docs"
 COLLECTION_NAME = "huawei_docs"
 MODEL_NAME = "all-MiniLM-L6-v2"
 BATCH_SIZE = 256  # Process 256 chunks at once
-MAX_CHUNK_SIZE = 1000
-MIN_CHUNK_SIZE = 100
-TARGET_CHUNK_SIZE = 500
 NUM_WORKERS = max(1, multiprocessing.cpu_count() - 1)
+PIPELINE_QUEUE_SIZE = 8  # Chunk batches / embedded slices buffered between stages
+EMBEDDING_CACHE_DIR = "/home/rag_cache/embedding_cache"
+MANIFEST_PATH = os.path.join(os.path.dirname(CHROMA_DB_PATH), f"ingest_manifest_{COLLECTION_NAME}.json")
 
-@dataclass
-class DocumentChunk:
-    id: str
-    content: str
-    service: str
-    page_id: str
-    headers: List[str]
-    url: str
-    position: int
-    token_count: int
-
-def simple_tokenize(text: str) -> List[str]:
-    """Simple tokenization for length estimation"""
-    return text.replace(r'[^\w\s]', ' ').split()
-
-def extract_headers(content: str) -> List[Tuple[int, str, int]]:
-    """Extract markdown headers with their positions"""
-    headers = []
-    pos = 0
-    for line in content.split('\n'):
-        match = re.match(r'^(#{1,6})\s+(.+)$', line)
-        if match:
-            headers.append((len(match.group(1)), match.group(2).strip(), pos))
-        pos += len(line) + 1
-    return headers
-
-def split_by_headers(content: str, headers: List[Tuple[int, str, int]]) -> List[Tuple[List[Tuple[int, str]], str]]:
-    """Split content by headers into sections"""
-    if not headers:
-        return [([], content.strip())]
-    
-    sections = []
-    header_stack = []
-    
-    for i, (level, text, position) in enumerate(headers):
-        # Update header stack
-        while header_stack and header_stack[-1][0] >= level:
-            header_stack.pop()
-        header_stack.append((level, text))
-        
-        # Find content for this section
-        start = content.find(text, position) + len(text)
-        end = headers[i + 1][2] if i + 1 < len(headers) else len(content)
-        section_content = content[start:end].strip()
-        
-        if section_content:
-            header_text = '\n'.join(['#' * h[0] + ' ' + h[1] for h in header_stack])
-            sections.append((header_stack.copy(), header_text + '\n\n' + section_content))
-    
-    return sections if sections else [([], content.strip())]
-
-def split_large_section(headers: List[Tuple[int, str]], content: str, start_pos: int, 
-                       service: str, page_id: str, url: str) -> List[DocumentChunk]:
-    """Split large sections into smaller chunks"""
-    chunks = []
-    paragraphs = re.split(r'\n\n+', content)
-    
-    current_content = ""
-    current_tokens = 0
-    position = start_pos
-    
-    for para in paragraphs:
-        para_tokens = len(simple_tokenize(para))
-        
-        if current_tokens + para_tokens > MAX_CHUNK_SIZE and current_tokens > 0:
-            # Save current chunk - ID will be set by caller
-            chunks.append(DocumentChunk(
-                id="",  # Will be set by caller
-                content=re.sub(r'\n{3,}', '\n\n', re.sub(r'\s+', ' ', current_content)).strip(),
-                service=service,
-                page_id=page_id,
-                headers=[h[1] for h in headers],
-                url=url,
-                position=position,
-                token_count=current_tokens
-            ))
-            current_content = para
-            current_tokens = para_tokens
-            position += 1
-        else:
-            current_content += ('\n\n' if current_content else '') + para
-            current_tokens += para_tokens
-    
-    # Don't forget last chunk
-    if current_tokens >= MIN_CHUNK_SIZE:
-        chunks.append(DocumentChunk(
-            id="",  # Will be set by caller
-            content=re.sub(r'\n{3,}', '\n\n', re.sub(r'\s+', ' ', current_content)).strip(),
-            service=service,
-            page_id=page_id,
-            headers=[h[1] for h in headers],
-            url=url,
-            position=position,
-            token_count=current_tokens
-        ))
-    
-    return chunks
+def worker_context():
+    """
+    Start pool workers from a clean forkserver/spawn process instead of
+    forking a parent that already runs torch and pipeline threads.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["scripts.fast_chunker"])
+        return ctx
+    return multiprocessing.get_context("spawn")
 
-def generate_chunk_id(file_path: str, content: str, index: int) -> str:
-    """Generate a globally unique chunk ID"""
-    # Create a hash from file path + content hash + index
-    path_hash = hashlib.md5(file_path.encode()).hexdigest()[:8]
-    content_sample = content[:100] if content else ""
-    content_hash = hashlib.md5(content_sample.encode()).hexdigest()[:8]
-    return f"chunk_{path_hash}_{content_hash}_{index}"
+def manifest_params(encoder: str = "torch") -> Dict:
+    """Settings that change chunk ids or vectors; a mismatch forces a full rebuild"""
+    from scripts.encoders import cache_name
+    return {
+        "ingester": "fast_ingest",
+        "collection": COLLECTION_NAME,
+        "model": cache_name(encoder, MODEL_NAME),
+        "max_chunk_size": MAX_CHUNK_SIZE,
+        "min_chunk_size": MIN_CHUNK_SIZE,
+        "splitter": SPLITTER_VERSION
+    }
 
-def chunk_document(file_path: str) -> List[DocumentChunk]:
-    """Process a single document into chunks"""
-    try:
-        # Read file
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Parse metadata
-        relative_path = os.path.relpath(file_path, DOCS_PATH)
-        service = relative_path.split(os.sep)[0]
-        page_id = Path(file_path).stem
-        
-        meta_path = file_path.replace('.md', '.json')
-        metadata = {}
-        if os.path.exists(meta_path):
-            with open(meta_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-        
-        url = metadata.get('url', '')
-        
-        # Extract headers and split
-        headers = extract_headers(content)
-        sections = split_by_headers(content, headers)
-        
-        chunks = []
-        chunk_index = 0
-        
-        for header_stack, section_content in sections:
-            tokens = len(simple_tokenize(section_content))
-            
-            if tokens < MIN_CHUNK_SIZE:
-                continue
-            
-            if tokens > MAX_CHUNK_SIZE:
-                # Split large section
-                sub_chunks = split_large_section(header_stack, section_content, chunk_index, service, page_id, url)
-                for chunk in sub_chunks:
-                    chunk.id = generate_chunk_id(file_path, chunk.content, chunk_index)
-                    chunk_index += 1
-                chunks.extend(sub_chunks)
-            else:
-                # Create single chunk
-                header_text = '\n'.join(['#' * h[0] + ' ' + h[1] for h in header_stack])
-                clean_content = re.sub(r'\n{3,}', '\n\n', re.sub(r'\s+', ' ', header_text + '\n\n' + section_content)).strip()
-                
-                chunks.append(DocumentChunk(
-                    id=generate_chunk_id(file_path, clean_content, chunk_index),
-                    content=clean_content,
-                    service=service,
-                    page_id=page_id,
-                    headers=[h[1] for h in header_stack],
-                    url=url,
-                    position=chunk_index,
-                    token_count=tokens
-                ))
-                chunk_index += 1
-        
-        return chunks
-        
-    except Exception as e:
-        print(f"Error processing {file_path}: {e}")
-        return []
+def parse_args():
+    from scripts.encoders import ENCODERS, DEFAULT_ENCODER
+    from scripts.encode_scheduler import TOKEN_BUDGET
+    parser = argparse.ArgumentParser(description="Fast RAG Document Processor")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-ingest files added, changed or removed since the last run")
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="Always run the model instead of reusing cached chunk embeddings")
+    parser.add_argument("--encoder", choices=ENCODERS, default=DEFAULT_ENCODER,
+                        help="Embedding backend (onnx-int8: quantized ONNX Runtime, CPU; see encoders.py)")
+    parser.add_argument("--token-budget", type=int, default=TOKEN_BUDGET,
+                        help="Padded tokens per encode batch; chunks are batched by tokenized length "
+                             "(0: fixed-size batches)")
+    parser.add_argument("--embed-workers", type=int, default=1,
+                        help="Embedding processes, each with its own model and cores/N threads (1: in-process)")
+    parser.add_argument("--export-cpp", metavar="DIR",
+                        help="Also write documents.json / embeddings.bin for rag-cpp-server into DIR")
+    parser.add_argument("--export-gzip", action="store_true",
+                        help="Write the rag-cpp-server files gzipped")
+    parser.add_argument("--vector-store", metavar="DIR",
+                        help="Also write a contiguous memory-mappable vector store into DIR")
+    parser.add_argument("--vector-dtype", choices=["float32", "float16", "int8"], default="float16",
+                        help="Storage dtype for --vector-store (default: float16)")
+    return parser.parse_args()
 
-def process_batch(args: Tuple[List[str], int]) -> Tuple[List[DocumentChunk], int, int]:
-    """Process a batch of files and return chunks"""
-    file_batch, worker_id = args
-    chunks = []
-    processed = 0
-    failed = 0
+def main():
+    args = parse_args()
     
-    for file_path in file_batch:
-        try:
-            file_chunks = chunk_document(file_path)
-            chunks.extend(file_chunks)
-            processed += 1
-        except Exception as e:
-            failed += 1
+    import chromadb
+    from scripts.encoders import load_encoder
+    from scripts.encode_scheduler import TokenBudgetScheduler
+    from scripts.embed_pool import EmbedWorkerPool
+    from scripts.embedding_cache import EmbeddingCache
+    from scripts.cpp_export import CppCorpusWriter, export_collection
+    from scripts.vector_store import VectorStoreWriter, build_from_collection
     
-    return chunks, processed, failed
-
-def main():
     print("=" * 80)
     print("RAG Fast Document Processor")
     print("=" * 80)
-    print(f"Model: {MODEL_NAME}")
-    print(f"Workers: {NUM_WORKERS}")
-    print(f"Batch size: {BATCH_SIZE}")
+    print(f"Model: {MODEL_NAME} ({args.encoder})")
+    print(f"Workers: {NUM_WORKERS} chunking, {args.embed_workers} embedding")
+    print(f"Batch size: {BATCH_SIZE * args.embed_workers}")
     print(f"ChromaDB: {CHROMA_DB_PATH}")
+    print(f"Mode: {'incremental' if args.incremental else 'full rebuild'}")
     print()
     
     # Find all documents
@@ -235,103 +116,183 @@ def main():
     print(f"Found {len(all_files):,} documents")
     print()
     
+    # Initialize ChromaDB
+    print("Initializing ChromaDB...")
+    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    
+    manifest = IngestManifest(MANIFEST_PATH, DOCS_PATH, manifest_params(args.encoder))
+    incremental = args.incremental
+    if incremental and not manifest.load():
+        print("No compatible manifest found, falling back to full rebuild")
+        incremental = False
+    
+    if incremental:
+        collection = client.get_or_create_collection(
+            name=COLLECTION_NAME,
+            metadata={"hnsw:space": "cosine"}
+        )
+        print(f"Collection '{COLLECTION_NAME}' opened ({collection.count():,} vectors)")
+    else:
+        # Create or get collection
+        try:
+            client.delete_collection(COLLECTION_NAME)
+            print("Deleted existing collection")
+        except:
+            pass
+        
+        collection = client.create_collection(
+            name=COLLECTION_NAME,
+            metadata={"hnsw:space": "cosine"}
+        )
+        print(f"Collection '{COLLECTION_NAME}' created")
+        manifest.reset()
+    print()
+    
+    # Work out which files need (re-)processing
+    print("Comparing documents against manifest...")
+    diff = manifest.diff(all_files)
+    summary = diff.summary()
+    print(f"Added: {summary['added']:,}  Changed: {summary['changed']:,}  "
+          f"Removed: {summary['removed']:,}  Unchanged: {summary['unchanged']:,}")
+    
+    stale_ids = manifest.stale_chunk_ids(diff)
+    if stale_ids:
+        print(f"Deleting {len(stale_ids):,} stale chunks...")
+        delete_ids(collection, stale_ids)
+    manifest.forget(diff.removed)
+    print()
+    
     # Group by service for better progress tracking
     service_files = {}
-    for f in all_files:
+    for f in diff.to_process():
         service = os.path.relpath(f, DOCS_PATH).split(os.sep)[0]
         if service not in service_files:
             service_files[service] = []
         service_files[service].append(f)
     
-    print(f"Found {len(service_files)} services")
-    print()
-    
-    # Initialize ChromaDB
-    print("Initializing ChromaDB...")
-    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-    
-    # Create or get collection
-    try:
-        client.delete_collection(COLLECTION_NAME)
-        print("Deleted existing collection")
-    except:
-        pass
-    
-    collection = client.create_collection(
-        name=COLLECTION_NAME,
-        metadata={"hnsw:space": "cosine"}
-    )
-    print(f"Collection '{COLLECTION_NAME}' created")
+    print(f"Found {len(service_files)} services to process")
     print()
     
     # Load embedding model
-    print(f"Loading embedding model: {MODEL_NAME}...")
-    model = SentenceTransformer(MODEL_NAME)
+    print(f"Loading embedding model: {MODEL_NAME} ({args.encoder})...")
+    if args.embed_workers > 1:
+        model = EmbedWorkerPool(args.encoder, MODEL_NAME, args.embed_workers, token_budget=args.token_budget)
+        print(f"Embedding pool: {model.workers} workers x {model.threads} threads")
+    else:
+        model = load_encoder(args.encoder, MODEL_NAME)
+        if args.token_budget > 0:
+            model = TokenBudgetScheduler(model, args.token_budget)
     print("Model loaded!")
+    embedding_cache = None
+    if not args.no_embedding_cache:
+        embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIR, model.cache_name)
+        print(f"Embedding cache: {EMBEDDING_CACHE_DIR} ({embedding_cache.rows:,} cached)")
     print()
     
+    # A full rebuild streams chunks straight into the export files; an
+    # incremental run only sees changed chunks, so it exports from Chroma at the end
+    export_sinks = {}
+    if not incremental:
+        if args.export_cpp:
+            export_sinks["cpp_export"] = CppCorpusWriter(args.export_cpp, compress=args.export_gzip)
+        if args.vector_store:
+            export_sinks["vector_store"] = VectorStoreWriter(args.vector_store, dtype=args.vector_dtype)
+    
     # Process all documents
     start_time = time.time()
-    total_chunks = 0
-    total_processed = 0
-    total_failed = 0
-    all_chunks = []
+    totals = {"chunks": 0, "processed": 0, "failed": 0, "results": 0}
+    
+    def embed_chunks(batch_chunks: ChunkBatch):
+        batch_texts = batch_chunks.contents
+        if embedding_cache:
+            return embedding_cache.encode(model, batch_texts)
+        return model.encode(batch_texts, show_progress_bar=False, convert_to_numpy=True)
+    
+    def write_chunks(batch_chunks: ChunkBatch, embeddings):
+        ids = batch_chunks.ids
+        documents = batch_chunks.contents
+        metadatas = batch_chunks.chroma_metadatas()
+        # Upsert so re-ingested chunks with unchanged ids are replaced
+        collection.upsert(
+            ids=ids,
+            documents=documents,
+            embeddings=embeddings.tolist(),
+            metadatas=metadatas
+        )
+        for sink in export_sinks.values():
+            sink.add_chunks(ids, documents, metadatas, embeddings)
+        totals["chunks"] += len(batch_chunks)
+    
+    # Size-balanced batches across all services, in service order so related
+    # chunks stay close together in the collection
+    ordered_files = [f for _, files in sorted(service_files.items()) for f in files]
+    work_items = [(batch, i) for i, batch in enumerate(make_balanced_batches(ordered_files, NUM_WORKERS))]
+    
+    progress = tqdm(total=len(diff.to_process()), desc="Ingesting", unit="doc")
     
-    print("Processing documents...")
+    def finish_result(result):
+        # Only record files once their chunks are safely in the collection
+        chunks, processed, failed_files, file_chunk_ids = result
+        text_by_id = dict(zip(chunks.ids, chunks.contents))
+        for file_path, chunk_ids in file_chunk_ids.items():
+            manifest.record(file_path, chunk_ids, [text_by_id[i] for i in chunk_ids])
+        # Failed files get no entry, so the next --incremental run retries them
+        manifest.forget([manifest.relpath(p) for p in failed_files])
+        failed = len(failed_files)
+        totals["processed"] += processed
+        totals["failed"] += failed
+        totals["results"] += 1
+        if totals["results"] % 50 == 0:
+            manifest.save()
+        progress.update(processed + failed)
+        progress.set_postfix(chunks=totals["chunks"])
+    
+    print(f"Processing documents ({len(work_items)} batches, chunk -> embed -> write pipelined)...")
+    pipeline = IngestPipeline(
+        embed_fn=embed_chunks,
+        write_fn=write_chunks,
+        on_done=finish_result,
+        unpack_fn=unpack_batch,  # Workers hand chunks back in shared memory
+        discard_fn=discard_batch,  # Frees segments left unread when the run aborts
+        batch_size=BATCH_SIZE * args.embed_workers,  # Enough texts per call to keep every embed worker busy
+        queue_size=PIPELINE_QUEUE_SIZE,
+        max_inflight=NUM_WORKERS * 2
+    )
+    # One long-lived pool for the whole run
+    ensure_tracker()
+    try:
+        with ProcessPoolExecutor(max_workers=NUM_WORKERS, mp_context=worker_context()) as executor:
+            pipeline_stats = pipeline.run(executor, process_batch, work_items)
+    except BaseException:
+        for sink in export_sinks.values():
+            sink.abort()
+        raise
+    finally:
+        if isinstance(model, EmbedWorkerPool):
+            model.close()
+    progress.close()
     print()
     
-    # Process each service
-    for service_idx, (service, files) in enumerate(sorted(service_files.items()), 1):
-        print(f"[{service_idx}/{len(service_files)}] Service: {service} ({len(files)} docs)")
-        
-        # Create batches for parallel processing
-        batches = [files[i:i+100] for i in range(0, len(files), 100)]
-        service_chunks = []
-        
-        # Process batches
-        with ProcessPoolExecutor(max_workers=NUM_WORKERS) as executor:
-            futures = {executor.submit(process_batch, (batch, i)): i for i, batch in enumerate(batches)}
-            
-            for future in tqdm(as_completed(futures), total=len(batches), desc="  Chunking"):
-                chunks, processed, failed = future.result()
-                service_chunks.extend(chunks)
-                total_processed += processed
-                total_failed += failed
-        
-        # Generate embeddings in batches
-        if service_chunks:
-            print(f"  Generating embeddings for {len(service_chunks)} chunks...")
-            
-            texts = [chunk.content for chunk in service_chunks]
-            
-            # Process in batches
-            for i in tqdm(range(0, len(texts), BATCH_SIZE), desc="  Embedding"):
-                batch_texts = texts[i:i+BATCH_SIZE]
-                batch_chunks = service_chunks[i:i+BATCH_SIZE]
-                
-                # Generate embeddings
-                embeddings = model.encode(batch_texts, show_progress_bar=False, convert_to_numpy=True)
-                
-                # Add to ChromaDB
-                collection.add(
-                    ids=[c.id for c in batch_chunks],
-                    documents=[c.content for c in batch_chunks],
-                    embeddings=embeddings.tolist(),
-                    metadatas=[{
-                        "service": c.service,
-                        "page_id": c.page_id,
-                        "headers": json.dumps(c.headers),
-                        "url": c.url,
-                        "position": c.position,
-                        "token_count": c.token_count
-                    } for c in batch_chunks]
-                )
-            
-            total_chunks += len(service_chunks)
-        
-        print(f"  ✓ Service complete: {len(service_chunks)} chunks")
+    exports = {name: sink.close() for name, sink in export_sinks.items()}
+    if args.export_cpp and "cpp_export" not in exports:
+        print(f"Exporting collection to rag-cpp-server files in {args.export_cpp}...")
+        exports["cpp_export"] = export_collection(collection, args.export_cpp, compress=args.export_gzip)
+    if args.vector_store and "vector_store" not in exports:
+        print(f"Building {args.vector_dtype} vector store in {args.vector_store}...")
+        exports["vector_store"] = build_from_collection(collection, args.vector_store, args.vector_dtype)
+    if "cpp_export" in exports:
+        print(f"rag-cpp-server export: {exports['cpp_export']['documents']:,} documents -> {args.export_cpp}")
+    if "vector_store" in exports:
+        print(f"Vector store: {exports['vector_store']['count']:,} x {exports['vector_store']['dim']} "
+              f"{args.vector_dtype} -> {args.vector_store}")
+    if exports:
         print()
     
+    total_chunks = totals["chunks"]
+    total_processed = totals["processed"]
+    total_failed = totals["failed"]
+    
+    manifest.save()
     elapsed = time.time() - start_time
     
     # Print summary
@@ -342,8 +303,20 @@ def main():
     print(f"Documents failed: {total_failed:,}")
     print(f"Total chunks created: {total_chunks:,}")
     print(f"Time elapsed: {elapsed:.1f}s ({elapsed/60:.1f} minutes)")
-    print(f"Docs/sec: {total_processed/elapsed:.1f}")
+    print(f"Docs/sec: {total_processed/elapsed:.1f}" if elapsed > 0 else "N/A")
     print(f"Chunks/doc: {total_chunks/total_processed:.1f}" if total_processed > 0 else "N/A")
+    stage_stats = pipeline_stats.to_dict()["stages"]
+    print("Stage busy time: " + ", ".join(
+        f"{name} {s['busy_seconds']:.1f}s" for name, s in stage_stats.items()
+    ) + f" (bottleneck: {pipeline_stats.bottleneck()})")
+    print(f"Chunk transfer (shared memory): {pipeline_stats.ipc_bytes / 1e6:.1f} MB, "
+          f"pack {pipeline_stats.ipc_pack_seconds:.2f}s in workers, unpack {pipeline_stats.ipc_unpack_seconds:.2f}s")
+    if embedding_cache:
+        cache_stats = embedding_cache.stats()
+        print(f"Embedding cache: {cache_stats['hits']:,} hits, {cache_stats['misses']:,} misses "
+              f"({cache_stats['hit_rate']*100:.1f}% hit rate)")
+    if isinstance(model, (TokenBudgetScheduler, EmbedWorkerPool)):
+        print(f"Encoding: {model.summary()}")
     print()
     
     # Get collection stats
@@ -358,7 +331,14 @@ def main():
         "failed_documents": total_failed,
         "elapsed_seconds": elapsed,
         "docs_per_second": total_processed / elapsed if elapsed > 0 else 0,
-        "collection_size": count
+        "collection_size": count,
+        "mode": "incremental" if incremental else "full",
+        "files": summary,
+        "deleted_chunks": len(stale_ids),
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "encoding": model.stats() if isinstance(model, (TokenBudgetScheduler, EmbedWorkerPool)) else None,
+        "pipeline": pipeline_stats.to_dict(),
+        "exports": exports
     }
     
     os.makedirs(os.path.dirname(CHROMA_DB_PATH), exist_ok=True)
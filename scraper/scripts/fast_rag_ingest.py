@@ -6,31 +6,32 @@ Optimized for speed with multiprocessing and batching
 """
 
 import os
-import re
+import sys
 import json
 import time
 import uuid
+import argparse
+import resource
+from collections import deque
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Tuple, Any, Iterator
 from dataclasses import dataclass, field
 from multiprocessing import Pool, cpu_count
 from functools import partial
 
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-@dataclass
-class Chunk:
-    """Represents a document chunk"""
-    id: str
-    text: str
-    metadata: Dict[str, Any]
-    source_file: str
-    header: str
+from scripts.chunk_model import CHUNK_SCHEMA, ChunkBatch
+from scripts.embedding_cache import EmbeddingCache
+from scripts.encode_scheduler import TOKEN_BUDGET, TokenBudgetScheduler
+from scripts.encoders import DEFAULT_ENCODER, ENCODERS, load_encoder
+from scripts.md_splitter import clean_lines, count_tokens, find_headers
+from scripts.shared_columns import SharedColumns, ensure_tracker, pack
 
 
 @dataclass
@@ -43,6 +44,15 @@ class ProcessingStats:
     failed_files: int = 0
     total_chunks: int = 0
     total_tokens: int = 0
+    embedding_cache_hits: int = 0
+    embedding_cache_misses: int = 0
+    peak_rss_mb: float = 0.0
+    mode: str = "batch"
+    encoder: str = "torch"
+    encoding: Dict = None
+    ipc_pack_seconds: float = 0.0
+    ipc_unpack_seconds: float = 0.0
+    ipc_bytes: int = 0
     errors: List[str] = field(default_factory=list)
     
     def to_dict(self) -> Dict:
@@ -55,10 +65,29 @@ class ProcessingStats:
             "failed_files": self.failed_files,
             "total_chunks": self.total_chunks,
             "total_tokens": self.total_tokens,
+            "embedding_cache_hits": self.embedding_cache_hits,
+            "embedding_cache_misses": self.embedding_cache_misses,
+            "peak_rss_mb": self.peak_rss_mb,
+            "mode": self.mode,
+            "encoder": self.encoder,
+            "chunks_per_second": round(self.total_chunks / max(self.duration(), 1e-9), 1),
+            "encoding": self.encoding,
+            "ipc": {
+                "pack_seconds": round(self.ipc_pack_seconds, 2),
+                "unpack_seconds": round(self.ipc_unpack_seconds, 2),
+                "megabytes": round(self.ipc_bytes / 1e6, 1)
+            },
             "error_count": len(self.errors),
             "errors": self.errors[:10]  # Limit errors in output
         }
     
+    def record_peak_rss(self):
+        """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak /= 1024
+        self.peak_rss_mb = round(max(self.peak_rss_mb, peak / 1024), 1)
+    
     def duration(self) -> float:
         end = self.end_time or time.time()
         return round(end - self.start_time, 2)
@@ -75,75 +104,69 @@ def get_markdown_files(source_dir: str) -> List[Path]:
     return sorted(files)
 
 
-def clean_text(text: str) -> str:
-    """Clean and normalize text"""
-    # Remove excessive whitespace
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    # Remove leading/trailing whitespace from lines
-    lines = [line.strip() for line in text.split('\n')]
-    return '\n'.join(lines)
-
-
-def chunk_by_headers(content: str, file_path: str, min_chunk_size: int = 100) -> List[Chunk]:
+def chunk_by_headers(content: str, file_path: str, min_chunk_size: int = 100) -> ChunkBatch:
     """
-    Split markdown content by headers into chunks
-    Returns list of Chunk objects
+    Split markdown content by headers into chunks.
+    page_id holds the source file, position the section index (-1 for a
+    document without headers) and level the header level.
     """
-    chunks = []
-    
-    # Pattern to match markdown headers (# ## ###)
-    header_pattern = re.compile(r'^(#{1,6}\s+.+)$', re.MULTILINE)
+    chunks = ChunkBatch()
     
-    # Find all headers and their positions
-    headers = list(header_pattern.finditer(content))
+    # Find all headers and their positions in one pass
+    headers = find_headers(content)
     
     if not headers:
         # No headers found, treat entire document as one chunk
-        cleaned = clean_text(content)
+        cleaned = clean_lines(content)
         if len(cleaned) >= min_chunk_size:
-            chunk = Chunk(
+            chunks.append(
                 id=str(uuid.uuid4()),
-                text=cleaned,
-                metadata={
-                    "source": file_path,
-                    "header": "",
-                    "section": "full_document"
-                },
-                source_file=file_path,
-                header=""
+                content=cleaned,
+                page_id=file_path,
+                position=-1,
+                token_count=count_tokens(cleaned)
             )
-            chunks.append(chunk)
         return chunks
     
     # Process each section
-    for i, header_match in enumerate(headers):
-        header = header_match.group(1)
-        header_text = header.lstrip('#').strip()
-        start_pos = header_match.start()
-        end_pos = headers[i + 1].start() if i + 1 < len(headers) else len(content)
+    for i, (level, header_text, start_pos, _) in enumerate(headers):
+        end_pos = headers[i + 1][2] if i + 1 < len(headers) else len(content)
         
         section_content = content[start_pos:end_pos]
-        cleaned = clean_text(section_content)
+        cleaned = clean_lines(section_content)
         
         if len(cleaned) >= min_chunk_size:
-            chunk = Chunk(
+            chunks.append(
                 id=str(uuid.uuid4()),
-                text=cleaned,
-                metadata={
-                    "source": file_path,
-                    "header": header_text,
-                    "section": f"section_{i}",
-                    "level": header.count('#')
-                },
-                source_file=file_path,
-                header=header_text
+                content=cleaned,
+                page_id=file_path,
+                headers=(header_text,),
+                position=i,
+                token_count=count_tokens(cleaned),
+                level=level
             )
-            chunks.append(chunk)
     
     return chunks
 
 
-def process_single_file(file_path: Path, source_dir: str) -> Tuple[List[Chunk], str]:
+def chunk_metadatas(chunks: ChunkBatch) -> List[Dict[str, Any]]:
+    """Collection metadata for chunks from chunk_by_headers"""
+    metadatas = []
+    for i in range(len(chunks)):
+        position = chunks.positions[i]
+        if position < 0:
+            metadatas.append({"source": chunks.page_ids[i], "header": "", "section": "full_document"})
+        else:
+            metadatas.append({
+                "source": chunks.page_ids[i],
+                "header": chunks.headers(i)[0],
+                "section": f"section_{position}",
+                "level": chunks.levels[i]
+            })
+    return metadatas
+
+
+def process_single_file(file_path: Path, source_dir: str) -> Tuple[ChunkBatch, str]:
     """
     Process a single markdown file
     Returns (chunks, error_message)
@@ -158,7 +181,7 @@ def process_single_file(file_path: Path, source_dir: str) -> Tuple[List[Chunk],
         
         # Skip very short or empty files
         if len(content.strip()) < 50:
-            return [], None
+            return ChunkBatch(), None
         
         # Chunk by headers
         chunks = chunk_by_headers(content, rel_path)
@@ -166,12 +189,12 @@ def process_single_file(file_path: Path, source_dir: str) -> Tuple[List[Chunk],
         return chunks, None
         
     except Exception as e:
-        return [], f"Error processing {file_path}: {str(e)}"
+        return ChunkBatch(), f"Error processing {file_path}: {str(e)}"
 
 
-def process_files_batch(file_batch: List[Path], source_dir: str) -> Tuple[List[Chunk], List[str]]:
-    """Process a batch of files and return all chunks and errors"""
-    all_chunks = []
+def process_files_batch(file_batch: List[Path], source_dir: str) -> Tuple[SharedColumns, List[str]]:
+    """Process a batch of files; chunks come back packed in shared memory (see unpack_chunks)"""
+    all_chunks = ChunkBatch()
     errors = []
     
     for file_path in file_batch:
@@ -180,7 +203,18 @@ def process_files_batch(file_batch: List[Path], source_dir: str) -> Tuple[List[C
         if error:
             errors.append(error)
     
-    return all_chunks, errors
+    return pack(all_chunks.to_columns(), CHUNK_SCHEMA), errors
+
+
+def unpack_chunks(result: Tuple[SharedColumns, List[str]], stats: ProcessingStats) -> Tuple[ChunkBatch, List[str]]:
+    """Parent side of process_files_batch: read and free the shared columns, recording IPC cost"""
+    shared, errors = result
+    start = time.time()
+    chunks = ChunkBatch.from_columns(shared.load())
+    stats.ipc_unpack_seconds += time.time() - start
+    stats.ipc_pack_seconds += shared.pack_seconds
+    stats.ipc_bytes += shared.nbytes
+    return chunks, errors
 
 
 def batch_generator(items: List[Any], batch_size: int):
@@ -189,11 +223,119 @@ def batch_generator(items: List[Any], batch_size: int):
         yield items[i:i + batch_size]
 
 
+def bounded_imap(pool, func, items: List[Any], window: int) -> Iterator[Tuple[Any, Any]]:
+    """
+    Ordered pool.imap with at most `window` tasks in flight.
+    Plain imap dispatches every task up front and buffers results without
+    limit when the consumer is slower than the workers.
+    """
+    pending = deque()
+    items_iter = iter(items)
+    for item in items_iter:
+        pending.append((item, pool.apply_async(func, (item,))))
+        if len(pending) >= window:
+            break
+    while pending:
+        item, result = pending.popleft()
+        next_item = next(items_iter, None)
+        if next_item is not None:
+            pending.append((next_item, pool.apply_async(func, (next_item,))))
+        yield item, result.get()
+
+
+def stream_chunk_batches(
+    pool,
+    file_batches: List[List[Path]],
+    source_dir: str,
+    batch_size: int,
+    stats: ProcessingStats,
+    window: int
+) -> Iterator[ChunkBatch]:
+    """Yield chunk batches of `batch_size` as file batches finish chunking"""
+    process_func = partial(process_files_batch, source_dir=source_dir)
+    buffer = ChunkBatch()
+    
+    for file_batch, result in bounded_imap(pool, process_func, file_batches, window):
+        chunks, errors = unpack_chunks(result, stats)
+        stats.errors.extend(errors)
+        stats.processed_files += len(file_batch) - len(errors)
+        stats.failed_files += len(errors)
+        buffer.extend(chunks)
+        while len(buffer) >= batch_size:
+            yield buffer[:batch_size]
+            buffer = buffer[batch_size:]
+    
+    if buffer:
+        yield buffer
+
+
+def stream_ingest(
+    md_files: List[Path],
+    source_dir: str,
+    model,
+    embedding_cache: EmbeddingCache,
+    collection,
+    stats: ProcessingStats,
+    batch_size_files: int,
+    batch_size_chunks: int,
+    workers: int
+):
+    """
+    Chunk -> embed -> insert one chunk batch at a time.
+    Memory is bounded by the in-flight window instead of the corpus size.
+    """
+    file_batches = list(batch_generator(md_files, batch_size_files))
+    
+    ensure_tracker()  # Shared with the forked workers, so their segments are freed by our unlink
+    with Pool(processes=workers) as pool:
+        chunk_batches = stream_chunk_batches(
+            pool, file_batches, source_dir, batch_size_chunks, stats, window=workers * 2
+        )
+        progress = tqdm(chunk_batches, desc="   Streaming", unit="batch")
+        for batch in progress:
+            texts = batch.contents
+            embeddings = embedding_cache.encode(
+                model,
+                texts,
+                batch_size=256,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+            collection.add(
+                ids=batch.ids,
+                documents=texts,
+                embeddings=embeddings.tolist(),
+                metadatas=chunk_metadatas(batch)
+            )
+            stats.total_chunks += len(batch)
+            stats.total_tokens += sum(batch.token_counts)
+            stats.record_peak_rss()
+            progress.set_postfix(files=stats.processed_files, chunks=stats.total_chunks, rss_mb=stats.peak_rss_mb)
+    
+    stats.embedding_cache_hits = embedding_cache.hits
+    stats.embedding_cache_misses = embedding_cache.misses
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fast RAG Ingestion Script")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream file batches through chunking, embedding and insertion with constant memory")
+    parser.add_argument("--encoder", choices=ENCODERS, default=DEFAULT_ENCODER,
+                        help="Embedding backend (onnx-int8: quantized ONNX Runtime, CPU; see encoders.py)")
+    parser.add_argument("--token-budget", type=int, default=TOKEN_BUDGET,
+                        help="Padded tokens per encode batch; chunks are batched by tokenized length "
+                             "(0: fixed batches of 256)")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+    
     # Configuration
     SOURCE_DIR = "/home/rag_cache/clean_docs"
     CHROMA_DIR = "/home/rag_cache/chroma_db"
     STATS_FILE = "/home/rag_cache/ingestion_stats.json"
+    EMBEDDING_CACHE_DIR = "/home/rag_cache/embedding_cache"
     
     BATCH_SIZE_FILES = 100  # Process files in batches
     BATCH_SIZE_CHUNKS = 512  # Embed and insert in batches
@@ -204,10 +346,12 @@ def main():
     print(f"   Target: {CHROMA_DIR}")
     print(f"   Workers: {CHUNKING_WORKERS}")
     print(f"   Batch sizes: {BATCH_SIZE_FILES} files, {BATCH_SIZE_CHUNKS} chunks")
+    print(f"   Mode: {'streaming' if args.stream else 'batch'}")
+    print(f"   Encoder: {args.encoder}")
     print()
     
     # Initialize stats
-    stats = ProcessingStats()
+    stats = ProcessingStats(mode="stream" if args.stream else "batch", encoder=args.encoder)
     
     # Step 1: Get all markdown files
     print("📁 Scanning for markdown files...")
@@ -247,90 +391,106 @@ def main():
         )
     
     # Step 3: Initialize embedding model
-    print("\n🤖 Loading sentence-transformers model...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    print(f"\n🤖 Loading embedding model ({args.encoder})...")
+    model = load_encoder(args.encoder, 'all-MiniLM-L6-v2')
+    if args.token_budget > 0:
+        model = TokenBudgetScheduler(model, args.token_budget)
     print(f"   Model loaded: all-MiniLM-L6-v2")
     print(f"   Embedding dimension: {model.get_sentence_embedding_dimension()}")
+    embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIR, model.cache_name)
+    print(f"   Embedding cache: {embedding_cache.rows:,} cached vectors")
+    
+    if args.stream:
+        print(f"\n🌊 Streaming files through chunk -> embed -> insert with {CHUNKING_WORKERS} workers...")
+        stream_ingest(
+            md_files, SOURCE_DIR, model, embedding_cache, collection, stats,
+            BATCH_SIZE_FILES, BATCH_SIZE_CHUNKS, CHUNKING_WORKERS
+        )
+        print(f"   ✓ Inserted {stats.total_chunks:,} chunks from {stats.processed_files:,} files "
+              f"({embedding_cache.hits:,} embeddings from cache)")
+    else:
+        # Step 4: Process files with multiprocessing
+        print(f"\n📄 Processing files with {CHUNKING_WORKERS} workers...")
+        all_chunks = ChunkBatch()
+    
+        # Split files into batches for parallel processing
+        file_batches = list(batch_generator(md_files, BATCH_SIZE_FILES))
+    
+        # Use multiprocessing for chunking
+        process_func = partial(process_files_batch, source_dir=SOURCE_DIR)
+    
+        ensure_tracker()
+        with Pool(processes=CHUNKING_WORKERS) as pool:
+            results = tqdm(
+                bounded_imap(pool, process_func, file_batches, window=CHUNKING_WORKERS * 2),
+                total=len(file_batches),
+                desc="   Chunking",
+                unit="batch"
+            )
+            # Unpack as results arrive: only the in-flight window's segments live in shared memory
+            for file_batch, result in results:
+                chunks, errors = unpack_chunks(result, stats)
+                all_chunks.extend(chunks)
+                stats.errors.extend(errors)
+                stats.processed_files += len(file_batch) - len(errors)
+                stats.failed_files += len(errors)
+    
+        stats.total_chunks = len(all_chunks)
+        stats.total_tokens = sum(all_chunks.token_counts)
+    
+        print(f"   ✓ Created {stats.total_chunks:,} chunks from {stats.total_files:,} files")
+        if stats.errors:
+            print(f"   ⚠️  Encountered {len(stats.errors)} errors")
+    
+        # Step 5: Generate embeddings in batches
+        print(f"\n🔢 Generating embeddings in batches of {BATCH_SIZE_CHUNKS}...")
+    
+        chunk_batches = list(batch_generator(all_chunks, BATCH_SIZE_CHUNKS))
+        all_embeddings = []
+    
+        for batch in tqdm(chunk_batches, desc="   Embedding", unit="batch"):
+            texts = batch.contents
+            embeddings = embedding_cache.encode(
+                model,
+                texts,
+                batch_size=256,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+            all_embeddings.extend(embeddings)
     
-    # Step 4: Process files with multiprocessing
-    print(f"\n📄 Processing files with {CHUNKING_WORKERS} workers...")
-    all_chunks = []
-    
-    # Split files into batches for parallel processing
-    file_batches = list(batch_generator(md_files, BATCH_SIZE_FILES))
-    
-    # Use multiprocessing for chunking
-    process_func = partial(process_files_batch, source_dir=SOURCE_DIR)
-    
-    with Pool(processes=CHUNKING_WORKERS) as pool:
-        results = list(tqdm(
-            pool.imap(process_func, file_batches),
-            total=len(file_batches),
-            desc="   Chunking",
-            unit="batch"
-        ))
-    
-    # Collect results
-    for chunks, errors in results:
-        all_chunks.extend(chunks)
-        stats.errors.extend(errors)
-        if not errors:
-            stats.processed_files += len(chunks)  # Approximate
-    
-    stats.total_chunks = len(all_chunks)
-    stats.total_tokens = sum(len(chunk.text.split()) for chunk in all_chunks)
-    
-    print(f"   ✓ Created {stats.total_chunks:,} chunks from {stats.total_files:,} files")
-    if stats.errors:
-        print(f"   ⚠️  Encountered {len(stats.errors)} errors")
-    
-    # Step 5: Generate embeddings in batches
-    print(f"\n🔢 Generating embeddings in batches of {BATCH_SIZE_CHUNKS}...")
+        stats.embedding_cache_hits = embedding_cache.hits
+        stats.embedding_cache_misses = embedding_cache.misses
+        print(f"   ✓ Generated {len(all_embeddings):,} embeddings "
+              f"({embedding_cache.hits:,} from cache)")
     
-    chunk_batches = list(batch_generator(all_chunks, BATCH_SIZE_CHUNKS))
-    all_embeddings = []
+        # Step 6: Insert into ChromaDB in batches
+        print(f"\n💿 Inserting into ChromaDB in batches of {BATCH_SIZE_CHUNKS}...")
     
-    for batch in tqdm(chunk_batches, desc="   Embedding", unit="batch"):
-        texts = [chunk.text for chunk in batch]
-        embeddings = model.encode(
-            texts,
-            batch_size=256,
-            show_progress_bar=False,
-            convert_to_numpy=True
-        )
-        all_embeddings.extend(embeddings)
-    
-    print(f"   ✓ Generated {len(all_embeddings):,} embeddings")
-    
-    # Step 6: Insert into ChromaDB in batches
-    print(f"\n💿 Inserting into ChromaDB in batches of {BATCH_SIZE_CHUNKS}...")
-    
-    for i, batch in enumerate(tqdm(
-        batch_generator(list(zip(all_chunks, all_embeddings)), BATCH_SIZE_CHUNKS),
-        total=len(chunk_batches),
-        desc="   Inserting",
-        unit="batch"
-    )):
-        ids = [chunk.id for chunk, _ in batch]
-        texts = [chunk.text for chunk, _ in batch]
-        embeddings = [emb.tolist() for _, emb in batch]
-        metadatas = [chunk.metadata for chunk, _ in batch]
+        for i, batch in enumerate(tqdm(chunk_batches, desc="   Inserting", unit="batch")):
+            start = i * BATCH_SIZE_CHUNKS
+            embeddings = [emb.tolist() for emb in all_embeddings[start:start + BATCH_SIZE_CHUNKS]]
         
-        collection.add(
-            ids=ids,
-            documents=texts,
-            embeddings=embeddings,
-            metadatas=metadatas
-        )
+            collection.add(
+                ids=batch.ids,
+                documents=batch.contents,
+                embeddings=embeddings,
+                metadatas=chunk_metadatas(batch)
+            )
     
     # Step 7: Final stats
     stats.end_time = time.time()
+    stats.record_peak_rss()
     final_count = collection.count()
     
     print(f"\n✅ Ingestion complete!")
     print(f"   Total documents in DB: {final_count:,}")
     print(f"   Duration: {stats.duration():.1f} seconds")
     print(f"   Throughput: {final_count / stats.duration():.1f} chunks/sec")
+    if isinstance(model, TokenBudgetScheduler):
+        stats.encoding = model.stats()
+        print(f"   Encoding: {model.summary()}")
+    print(f"   Peak RSS: {stats.peak_rss_mb:,.1f} MB")
     
     # Save stats
     stats.save(STATS_FILE)
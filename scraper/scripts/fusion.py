@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Hybrid Retrieval Fusion
+Runs independent retrievers concurrently and fuses their candidate lists
+with reciprocal-rank fusion, z-score normalisation or a weighted linear sum
+"""
+
+import math
+import time
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+RRF_K = 60  # Rank offset from Cormack et al.; dampens the head of each list
+RETRIEVER_THREADS = 8
+FUSION_METHODS = ("linear", "rrf", "zscore")
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+@dataclass
+class RetrieverResult:
+    """Ranked candidates from one retriever; documents/metadatas are optional payloads"""
+    name: str
+    scores: Dict[str, float] = field(default_factory=dict)  # id -> score, higher is better
+    documents: Dict[str, str] = field(default_factory=dict)
+    metadatas: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    def ranks(self) -> Dict[str, int]:
+        """1-based rank of each id by descending score"""
+        ordered = sorted(self.scores, key=lambda i: self.scores[i], reverse=True)
+        return {doc_id: rank for rank, doc_id in enumerate(ordered, 1)}
+
+
+def retriever_pool() -> ThreadPoolExecutor:
+    """Shared pool, so concurrent callers (e.g. the query server) don't spawn threads per query"""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=RETRIEVER_THREADS, thread_name_prefix="retriever")
+    return _pool
+
+
+def run_retrievers(retrievers: Dict[str, Callable[[], Any]],
+                   timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """Run every retriever concurrently; wall seconds per retriever go into `timings`"""
+    def timed(name, fn):
+        start = time.perf_counter()
+        result = fn()
+        if timings is not None:
+            timings[f"{name}_seconds"] = time.perf_counter() - start
+        return result
+
+    futures = {name: retriever_pool().submit(timed, name, fn) for name, fn in retrievers.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
+def fuse_linear(results: Dict[str, RetrieverResult], weights: Dict[str, float]) -> Dict[str, float]:
+    """
+    Weighted sum of raw scores. A candidate missing from a list gets that
+    list's lowest score, an upper bound on what it would have scored there.
+    """
+    candidates = {doc_id for result in results.values() for doc_id in result.scores}
+    fused = dict.fromkeys(candidates, 0.0)
+    for name, result in results.items():
+        if not result.scores:
+            continue
+        floor = min(result.scores.values())
+        weight = weights.get(name, 1.0)
+        for doc_id in candidates:
+            fused[doc_id] += weight * result.scores.get(doc_id, floor)
+    return fused
+
+
+def fuse_rrf(results: Dict[str, RetrieverResult], weights: Dict[str, float], k: int = RRF_K) -> Dict[str, float]:
+    """Weighted reciprocal-rank fusion: sum of w / (k + rank); absent ids contribute nothing"""
+    fused: Dict[str, float] = {}
+    for name, result in results.items():
+        weight = weights.get(name, 1.0)
+        for doc_id, rank in result.ranks().items():
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return fused
+
+
+def fuse_zscore(results: Dict[str, RetrieverResult], weights: Dict[str, float]) -> Dict[str, float]:
+    """
+    Weighted sum of per-retriever z-scores, so retrievers on different
+    scales (cosine vs. BM25) are comparable. Absent ids take the list's
+    lowest z-score.
+    """
+    candidates = {doc_id for result in results.values() for doc_id in result.scores}
+    fused = dict.fromkeys(candidates, 0.0)
+    for name, result in results.items():
+        values = list(result.scores.values())
+        if not values:
+            continue
+        mean = sum(values) / len(values)
+        std = math.sqrt(sum((v - mean) ** 2 for v in values) / len(values)) or 1.0
+        z = {doc_id: (score - mean) / std for doc_id, score in result.scores.items()}
+        floor = min(z.values())
+        weight = weights.get(name, 1.0)
+        for doc_id in candidates:
+            fused[doc_id] += weight * z.get(doc_id, floor)
+    return fused
+
+
+def fuse(results: Dict[str, RetrieverResult], weights: Dict[str, float], method: str = "linear") -> Dict[str, float]:
+    if method == "linear":
+        return fuse_linear(results, weights)
+    if method == "rrf":
+        return fuse_rrf(results, weights)
+    if method == "zscore":
+        return fuse_zscore(results, weights)
+    raise ValueError(f"Unknown fusion method {method!r}, expected one of {FUSION_METHODS}")
@@ -6,17 +6,22 @@ Uses caching and efficient keyword matching for improved relevance
 
 import sys
 import os
+import json
 import time
 import argparse
-import chromadb
-from typing import List, Dict, Any, Tuple
-import re
-import pickle
-import hashlib
+from typing import List, Dict, Any, Optional, Tuple
+import threading
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from scripts import thesaurus as thesaurus
+from scripts import query_client
+from scripts.bm25_index import BM25Index, load_or_build, tokenize
+from scripts.fusion import FUSION_METHODS, RetrieverResult, fuse, run_retrievers
+from scripts.query_cache import get_cache
+from scripts.result_cache import ResultCache, copy_results
+from scripts.encoders import DEFAULT_ENCODER, ENCODERS, cache_name, lazy_embed_fn
+from scripts.search_backend import open_collection, VECTOR_STORE_PATH, MODEL_NAME
 
 
 # Configuration
@@ -25,123 +30,192 @@ COLLECTION_NAME = "huawei_docs"
 TOP_K_DEFAULT = 5
 VECTOR_WEIGHT = 0.7
 BM25_WEIGHT = 0.3
+HEADER_WEIGHT = 0.0  # Header/title retriever is off unless weighted
+FUSION_DEFAULT = "linear"  # Weighted sum tuned against evaluate_hybrid.py
+BATCH_QUERIES = 256  # Queries per hybrid_search_batch call in --batch-file mode
+VERSION_CHECK_SECONDS = 1.0  # How often the result cache re-checks the corpus version
 
 # Cache for BM25 index
 BM25_CACHE_DIR = "/home/rag_cache/bm25_cache"
+MANIFEST_PATH = os.path.join(os.path.dirname(CHROMA_DB_PATH), f"ingest_manifest_{COLLECTION_NAME}.json")
 os.makedirs(BM25_CACHE_DIR, exist_ok=True)
+_quiet = False  # Set by --quiet: no BM25 load/build messages
 
 
-def tokenize(text: str) -> List[str]:
-    """Tokenize text for BM25 indexing"""
-    text = text.lower()
-    tokens = re.findall(r'\b\w+\b', text)
-    return tokens
+def set_quiet(quiet: bool):
+    global _quiet
+    _quiet = quiet
 
 
-def build_bm25_index(documents: List[str]):
-    """Build BM25 index (lazy import to save startup time)"""
-    from rank_bm25 import BM25Okapi
-    
-    tokenized_docs = [tokenize(doc) for doc in documents]
-    bm25 = BM25Okapi(tokenized_docs)
-    return bm25
+def load_or_build_bm25_index(collection) -> BM25Index:
+    """
+    Memory-map the on-disk BM25 index, rebuilding it only when the
+    collection's content fingerprint no longer matches
+    """
+    return load_or_build(collection, os.path.join(BM25_CACHE_DIR, collection.name), MANIFEST_PATH,
+                         verbose=not _quiet)
+
+
+def header_text(document: str, metadata: Dict[str, Any]) -> str:
+    """Section headers of a chunk (the text indexed by the header retriever)"""
+    headers = metadata.get("headers", [])
+    if isinstance(headers, str):
+        try:
+            headers = json.loads(headers)
+        except ValueError:
+            headers = [headers]
+    if not isinstance(headers, list):
+        headers = [str(headers)]
+    return " ".join([str(h) for h in headers] + [str(metadata.get("header", ""))])
+
+
+def load_or_build_header_index(collection) -> BM25Index:
+    """BM25 index over chunk headers, keyed by the same corpus fingerprint"""
+    return load_or_build(collection, os.path.join(BM25_CACHE_DIR, f"{collection.name}_headers"),
+                         MANIFEST_PATH, verbose=not _quiet, text_fn=header_text)
+
+
+_bm25_indexes: Dict[str, BM25Index] = {}
+_bm25_lock = threading.Lock()  # Guards the two dicts only; never held while an index loads
+_bm25_build_locks: Dict[str, threading.Lock] = {}
 
 
-def load_or_build_bm25_index(collection) -> Tuple[Any, List[str], List[Dict]]:
+def get_bm25_index(collection, kind: str = "content") -> BM25Index:
     """
-    Load cached BM25 index or build new one
-    Returns: (bm25_index, original_texts, metadata_list)
+    Process-wide BM25 index per collection ("content" or "headers"), loaded
+    on first use. The (re)build runs under a per-key lock, outside
+    _bm25_lock, so other server threads keep answering meanwhile.
     """
-    # Generate cache key from collection stats
-    count = collection.count()
-    cache_key = f"bm25_{count}_{COLLECTION_NAME}"
-    cache_file = os.path.join(BM25_CACHE_DIR, f"{cache_key}.pkl")
-    
-    # Try loading from cache
-    if os.path.exists(cache_file):
+    key = f"{collection.name}:{kind}"
+    with _bm25_lock:
+        index = _bm25_indexes.get(key)
+        if index is not None:
+            return index
+        build_lock = _bm25_build_locks.setdefault(key, threading.Lock())
+
+    with build_lock:
+        with _bm25_lock:
+            index = _bm25_indexes.get(key)  # Built by another thread while this one waited
+        if index is None:
+            loader = load_or_build_header_index if kind == "headers" else load_or_build_bm25_index
+            index = loader(collection)
+            with _bm25_lock:
+                _bm25_indexes[key] = index
+    return index
+
+
+_result_cache = ResultCache()
+_corpus_versions: Dict[str, Tuple[float, str]] = {}  # collection name -> (checked at, version)
+
+
+def result_cache() -> ResultCache:
+    return _result_cache
+
+
+def corpus_version(collection) -> str:
+    """
+    Cheap token that changes when an ingester rewrites the collection: the
+    fingerprint in a local store's header, or the ingest manifest's stat
+    info for Chroma, plus the chunk count. Checked at most once per
+    VERSION_CHECK_SECONDS; on a change the result cache is invalidated and
+    the BM25 indexes are re-validated on next use.
+    """
+    now = time.time()
+    checked = _corpus_versions.get(collection.name)
+    if checked and now - checked[0] < VERSION_CHECK_SECONDS:
+        return checked[1]
+
+    fingerprint = (getattr(collection, "metadata", None) or {}).get("corpus_fingerprint")
+    if not fingerprint:
         try:
-            with open(cache_file, 'rb') as f:
-                data = pickle.load(f)
-                if data["count"] == count:
-                    print(f"Loaded BM25 index from cache ({cache_file})")
-                    return data["bm25"], data["texts"], data["metadatas"]
-        except Exception as e:
-            print(f"Cache load failed: {e}, rebuilding...")
-    
-    # Build new index
-    print("Building BM25 index...")
-    results = collection.get(include=["documents", "metadatas"])
-    documents = results["documents"]
-    metadatas = results["metadatas"]
-    
-    bm25 = build_bm25_index(documents)
-    
-    # Cache the index
-    cache_data = {
-        "bm25": bm25,
-        "texts": documents,
-        "metadatas": metadatas,
-        "count": count
-    }
-    with open(cache_file, 'wb') as f:
-        pickle.dump(cache_data, f)
-    
-    print(f"Built and cached BM25 index ({len(documents)} documents)")
-    return bm25, documents, metadatas
+            st = os.stat(MANIFEST_PATH)
+            fingerprint = f"manifest:{st.st_mtime_ns}:{st.st_size}"
+        except OSError:
+            fingerprint = "unknown"
+    version = f"{fingerprint}:{collection.count()}"
+
+    if checked and checked[1] != version:
+        _result_cache.invalidate()
+        with _bm25_lock:
+            for kind in ("content", "headers"):
+                _bm25_indexes.pop(f"{collection.name}:{kind}", None)
+    _corpus_versions[collection.name] = (now, version)
+    return version
+
+
+_encoder_kind = DEFAULT_ENCODER
+_query_encoder = None
+
+
+def set_encoder(kind: str):
+    """Embed queries with another encoder backend (see encoders.py); cached results are dropped"""
+    global _encoder_kind, _query_encoder
+    if kind != _encoder_kind:
+        _encoder_kind = kind
+        _query_encoder = None
+        _result_cache.invalidate()
 
 
-def compute_bm25_scores_direct(query: str, documents: List[str]) -> List[float]:
+def encoder_kind() -> str:
+    return _encoder_kind
+
+
+def query_encoder():
+    """Query embedder behind the shared LRU + SQLite query embedding cache"""
+    global _query_encoder
+    if _query_encoder is None:
+        _query_encoder = get_cache(cache_name(_encoder_kind, MODEL_NAME)).encoder(
+            lazy_embed_fn(_encoder_kind, MODEL_NAME))
+    return _query_encoder
+
+
+def vector_retriever(collection, expanded_queries: List[str], n_results: int) -> List[RetrieverResult]:
+    """One collection.query call for all queries: a single (cached) encode and one batched search"""
+    results = [RetrieverResult("vector") for _ in expanded_queries]
+    embeddings = query_encoder()(list(expanded_queries))
+    vector_results = collection.query(query_embeddings=embeddings.tolist(), n_results=n_results)
+    if not vector_results or not vector_results["documents"]:
+        return results
+    for q, result in enumerate(results):
+        ids = vector_results["ids"][q]
+        texts = vector_results["documents"][q]
+        metadatas = vector_results["metadatas"][q] if vector_results["metadatas"] else [{}] * len(ids)
+        distances = vector_results["distances"][q] if vector_results["distances"] else [1.0] * len(ids)
+        for doc_id, text, metadata, distance in zip(ids, texts, metadatas, distances):
+            result.scores[doc_id] = 1 - distance  # Convert distance to similarity
+            result.documents[doc_id] = text
+            result.metadatas[doc_id] = metadata or {}
+    return results
+
+
+def lexical_retriever(name: str, index: BM25Index, queries: List[str], n_results: int) -> List[RetrieverResult]:
+    results = []
+    for query in queries:
+        result = RetrieverResult(name)
+        rows, scores = index.top_k(query, n_results)
+        for row, score in zip(rows, scores):
+            result.scores[index.id_at(row)] = float(score)
+        results.append(result)
+    return results
+
+
+def rescore_lexical(result: RetrieverResult, index: BM25Index, query: str, candidate_ids: List[str]):
     """
-    Compute BM25 scores directly without full indexing (faster for single query)
-    Uses simplified TF-IDF approach
+    Give a lexical list exact (max-normalized) scores for every fused
+    candidate, so a vector hit outside the lexical top-N is scored on its
+    real BM25 rather than treated as missing
     """
-    from collections import Counter
-    
-    query_tokens = set(tokenize(query))
-    if not query_tokens:
-        return [0.0] * len(documents)
-    
-    scores = []
-    doc_freqs = Counter()
-    
-    # Count document frequencies
-    for doc in documents:
-        doc_tokens = set(tokenize(doc))
-        for token in query_tokens:
-            if token in doc_tokens:
-                doc_freqs[token] += 1
-    
-    total_docs = len(documents)
-    
-    # Compute scores for each document
-    for doc in documents:
-        doc_tokens = tokenize(doc)
-        doc_len = len(doc_tokens)
-        if doc_len == 0:
-            scores.append(0.0)
-            continue
-        
-        score = 0.0
-        for token in query_tokens:
-            if token in doc_tokens:
-                # TF component
-                tf = doc_tokens.count(token) / doc_len
-                
-                # IDF component (with smoothing)
-                df = doc_freqs.get(token, 1)
-                idf = (total_docs - df + 0.5) / (df + 0.5)
-                idf = max(0.1, idf)  # Avoid negative/zero
-                
-                score += tf * idf
-        
-        scores.append(score)
-    
+    missing = [doc_id for doc_id in candidate_ids if doc_id not in result.scores]
+    rows = [index.row_of(doc_id) for doc_id in missing]
+    known = [(doc_id, row) for doc_id, row in zip(missing, rows) if row is not None]
+    if known:
+        exact = index.score_rows(query, [row for _, row in known])
+        for (doc_id, _), score in zip(known, exact):
+            result.scores[doc_id] = float(score)
     # Normalize to 0-1
-    max_score = max(scores) if scores else 1.0
-    if max_score == 0:
-        return [0.0] * len(documents)
-    
-    return [s / max_score for s in scores]
+    max_score = max(result.scores.values()) if result.scores else 0.0
+    if max_score > 0:
+        result.scores = {doc_id: score / max_score for doc_id, score in result.scores.items()}
 
 
 def hybrid_search(
@@ -150,58 +224,175 @@ def hybrid_search(
     top_k: int = 5,
     vector_weight: float = VECTOR_WEIGHT,
     bm25_weight: float = BM25_WEIGHT,
-    use_bm25: bool = True
+    use_bm25: bool = True,
+    fusion: str = FUSION_DEFAULT,
+    header_weight: float = HEADER_WEIGHT,
+    timings: Optional[Dict[str, float]] = None,
+    use_cache: bool = True
 ) -> List[Dict[str, Any]]:
     """
-    Perform hybrid search combining vector and BM25 scores
+    Perform hybrid search: the vector, BM25 and (if weighted) header
+    retrievers run concurrently over the whole corpus, their candidate
+    lists are fused with `fusion` ("linear", "rrf" or "zscore"), and the
+    thesaurus service / doc-type boosts are applied on top.
+    Per-retriever seconds are written into `timings` when given.
+    Results are served from the result cache when `use_cache` is set.
     """
-    # Expand query for semantic search
-    expanded_query = thesaurus.expand_query(query)
-    
-    # Vector search - get more results for reranking
-    vector_results = collection.query(
-        query_texts=[expanded_query],
-        n_results=min(top_k * 5, 100)  # Increased to top_k * 5 for better service boosting
-    )
-    
-    if not vector_results or not vector_results["documents"] or not vector_results["documents"][0]:
+    return hybrid_search_batch(collection, [query], top_k, vector_weight, bm25_weight,
+                               use_bm25, fusion, header_weight, timings, use_cache)[0]
+
+
+def hybrid_search_batch(
+    collection,
+    queries: List[str],
+    top_k: int = 5,
+    vector_weight: float = VECTOR_WEIGHT,
+    bm25_weight: float = BM25_WEIGHT,
+    use_bm25: bool = True,
+    fusion: str = FUSION_DEFAULT,
+    header_weight: float = HEADER_WEIGHT,
+    timings: Optional[Dict[str, float]] = None,
+    use_cache: bool = True
+) -> List[List[Dict[str, Any]]]:
+    """
+    hybrid_search for many queries at once: all queries are embedded and
+    vector-searched in one collection.query call, each lexical retriever
+    scores the whole batch in one task, and candidate documents missing
+    from the vector results are fetched with a single collection.get.
+    Returns one result list per query, in order.
+
+    With `use_cache`, queries already answered for the same parameters,
+    corpus version and thesaurus version come from the result cache and
+    only the rest are searched.
+    """
+    if not queries:
         return []
-    
-    vector_ids = vector_results["ids"][0]
-    vector_docs = vector_results["documents"][0]
-    vector_metas = vector_results["metadatas"][0] if vector_results["metadatas"] else []
-    vector_dists = vector_results["distances"][0] if vector_results["distances"] else []
-    
-    # Compute BM25 scores for the retrieved documents
-    bm25_scores = [0.0] * len(vector_docs)
+    search_args = (top_k, vector_weight, bm25_weight, use_bm25, fusion, header_weight)
+    if not use_cache:
+        return search_uncached(collection, queries, *search_args, timings)
+
+    versions = (collection.name, corpus_version(collection), thesaurus.current().source_hash)
+    keys = [ResultCache.key(query, search_args, *versions) for query in queries]
+    results = [_result_cache.get(key) for key in keys]
+    misses = {}  # key -> query, deduplicated
+    for query, key, cached in zip(queries, keys, results):
+        if cached is None:
+            misses.setdefault(key, query)
+    if timings is not None:
+        timings["result_cache_hits"] = float(len(queries) - sum(r is None for r in results))
+    if misses:
+        fresh = dict(zip(misses, search_uncached(collection, list(misses.values()), *search_args, timings)))
+        for key, found in fresh.items():
+            _result_cache.put(key, found)
+        results = [cached if cached is not None else copy_results(fresh[key])
+                   for key, cached in zip(keys, results)]
+    return results
+
+
+def search_uncached(
+    collection,
+    queries: List[str],
+    top_k: int,
+    vector_weight: float,
+    bm25_weight: float,
+    use_bm25: bool,
+    fusion: str,
+    header_weight: float,
+    timings: Optional[Dict[str, float]] = None
+) -> List[List[Dict[str, Any]]]:
+    """The hybrid_search_batch pipeline itself, bypassing the result cache"""
+    candidate_count = min(top_k * 5, 100)  # Increased to top_k * 5 for better service boosting
+    
+    # Expand queries for semantic search
+    expanded_queries = [thesaurus.expand_query(query) for query in queries]
+    
+    indexes = {}
     if use_bm25:
-        bm25_scores = compute_bm25_scores_direct(query, vector_docs)
+        indexes["bm25"] = get_bm25_index(collection)
+    if header_weight > 0:
+        indexes["header"] = get_bm25_index(collection, "headers")
+    
+    retrievers = {"vector": lambda: vector_retriever(collection, expanded_queries, candidate_count)}
+    for name, index in indexes.items():
+        retrievers[name] = lambda name=name, index=index: lexical_retriever(name, index, queries, candidate_count)
+    
+    start = time.perf_counter()
+    batch_results = run_retrievers(retrievers, timings)
+    if timings is not None:
+        timings["retrieval_seconds"] = time.perf_counter() - start
+    
+    # Per query: {retriever name -> RetrieverResult}
+    per_query = [{name: lists[q] for name, lists in batch_results.items()} for q in range(len(queries))]
+    candidates_per_query = []
+    documents: Dict[str, str] = {}
+    metadatas: Dict[str, Dict[str, Any]] = {}
+    for query, results in zip(queries, per_query):
+        # Union of every retriever's candidates, in first-seen order
+        candidate_ids = list(dict.fromkeys(doc_id for result in results.values() for doc_id in result.scores))
+        candidates_per_query.append(candidate_ids)
+        for name, index in indexes.items():
+            rescore_lexical(results[name], index, query, candidate_ids)
+            if fusion == "rrf":
+                # Zero lexical overlap is not a rank
+                results[name].scores = {i: s for i, s in results[name].scores.items() if s > 0}
+        documents.update(results["vector"].documents)
+        metadatas.update(results["vector"].metadatas)
+    
+    # Fetch text and metadata for candidates only the lexical side found
+    missing = list(dict.fromkeys(doc_id for ids in candidates_per_query for doc_id in ids if doc_id not in documents))
+    if missing:
+        fetched = collection.get(ids=missing, include=["documents", "metadatas"])
+        for doc_id, text, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+            documents[doc_id] = text
+            metadatas[doc_id] = metadata or {}
+    
+    weights = {"vector": vector_weight, "bm25": bm25_weight, "header": header_weight}
+    return [
+        fuse_candidates(query, results, candidate_ids, documents, metadatas, weights, fusion, top_k)
+        for query, results, candidate_ids in zip(queries, per_query, candidates_per_query)
+    ]
+
+
+def fuse_candidates(query: str, results: Dict[str, RetrieverResult], candidate_ids: List[str],
+                    documents: Dict[str, str], metadatas: Dict[str, Dict[str, Any]],
+                    weights: Dict[str, float], fusion: str, top_k: int) -> List[Dict[str, Any]]:
+    """Fuse one query's retriever lists, apply thesaurus boosts and return the top-k"""
+    if not results["vector"].scores:
+        return []
+    fused = fuse(results, weights, fusion)
+    ranks = {name: result.ranks() for name, result in results.items()}
+    # Lexical-only hits ranked below every vector candidate, so the weakest
+    # vector similarity is an upper bound on theirs
+    vector_floor = min(results["vector"].scores.values())
+    # Thesaurus boosts are resolved once per query, then looked up per candidate
+    boosts = thesaurus.query_boosts(query)
     
     # Combine results
     combined_scores = []
     
-    for i, (doc_id, text, metadata, distance) in enumerate(zip(vector_ids, vector_docs, vector_metas, vector_dists)):
-        vector_score = 1 - distance  # Convert distance to similarity
-        bm25_score = bm25_scores[i]
+    for doc_id in candidate_ids:
+        if doc_id not in documents:
+            continue
+        metadata = metadatas.get(doc_id) or {}
         
         # Get boosts
-        service = metadata.get("service", "") if metadata else ""
-        doc_type = metadata.get("type", "") if metadata else ""
-        service_boost = thesaurus.get_service_boost(query, service)
-        doc_type_boost = thesaurus.get_document_type_boost(query, doc_type)
+        service = metadata.get("service", "")
+        doc_type = metadata.get("type", "")
+        service_boost = boosts.service_boost(service)
+        doc_type_boost = boosts.doc_type_boost(doc_type)
         
         # Calculate combined score
-        combined_score = (
-            vector_score * vector_weight +
-            bm25_score * bm25_weight
-        ) * service_boost * doc_type_boost
+        combined_score = fused.get(doc_id, 0.0) * service_boost * doc_type_boost
         
         combined_scores.append({
             "id": doc_id,
-            "text": text,
-            "metadata": metadata if metadata else {},
-            "vector_score": vector_score,
-            "bm25_score": bm25_score,
+            "text": documents[doc_id],
+            "metadata": metadata,
+            "vector_score": results["vector"].scores.get(doc_id, vector_floor),
+            "bm25_score": results["bm25"].scores.get(doc_id, 0.0) if "bm25" in results else 0.0,
+            "header_score": results["header"].scores.get(doc_id, 0.0) if "header" in results else 0.0,
+            "fusion_score": fused.get(doc_id, 0.0),
+            "ranks": {name: r[doc_id] for name, r in ranks.items() if doc_id in r},
             "service_boost": service_boost,
             "doc_type_boost": doc_type_boost,
             "combined_score": combined_score
@@ -214,12 +405,20 @@ def hybrid_search(
     return combined_scores[:top_k]
 
 
-def format_results(results: List[Dict], show_details: bool = False) -> str:
+def format_results(results: List[Dict], show_details: bool = False,
+                   timings: Optional[Dict[str, float]] = None) -> str:
     """Format search results for display"""
     if not results:
         return "No results found."
     
     output = []
+    if show_details and timings:
+        output.append("Retriever timings:")
+        for name, seconds in timings.items():
+            if name.endswith("_seconds"):
+                output.append(f"  {name.replace('_seconds', '')}: {seconds * 1000:.1f}ms")
+        if timings.get("result_cache_hits"):
+            output.append("  (served from the result cache)")
     for i, result in enumerate(results, 1):
         metadata = result["metadata"]
         service = metadata.get("service", "unknown")
@@ -234,6 +433,11 @@ def format_results(results: List[Dict], show_details: bool = False) -> str:
         if show_details:
             output.append(f"  Vector Score: {result['vector_score']:.3f}")
             output.append(f"  BM25 Score: {result['bm25_score']:.3f}")
+            if result.get("header_score"):
+                output.append(f"  Header Score: {result['header_score']:.3f}")
+            if "fusion_score" in result:
+                ranks = ", ".join(f"{name}=#{rank}" for name, rank in result.get("ranks", {}).items())
+                output.append(f"  Fusion Score: {result['fusion_score']:.4f} ({ranks or 'unranked'})")
             output.append(f"  Service Boost: {result['service_boost']:.2f}")
             output.append(f"  Doc Type Boost: {result['doc_type_boost']:.2f}")
         
@@ -246,17 +450,104 @@ def format_results(results: List[Dict], show_details: bool = False) -> str:
     return "\n".join(output)
 
 
+def batch_record(result: Dict[str, Any], include_text: bool) -> Dict[str, Any]:
+    """JSON-friendly view of one result (text only on request)"""
+    record = {key: value for key, value in result.items() if key != "text" or include_text}
+    for key in ("vector_score", "bm25_score", "header_score", "fusion_score", "combined_score"):
+        record[key] = round(float(record[key]), 6)
+    return record
+
+
+def run_batch_file(args):
+    """
+    JSONL in, JSONL out: each input line is {"query": ...} (other keys are
+    passed through, "top_k" overrides --top-k per line); each output line
+    adds "results". Lines are searched BATCH_QUERIES at a time.
+    """
+    source = sys.stdin if args.batch_file == "-" else open(args.batch_file, 'r', encoding='utf-8')
+    with source:
+        requests = [json.loads(line) for line in source if line.strip()]
+    requests = [r if isinstance(r, dict) else {"query": str(r)} for r in requests]
+    
+    if not args.server:
+        collection = open_collection(
+            args.backend,
+            vector_store_path=args.vector_store,
+            chroma_path=CHROMA_DB_PATH,
+            collection_name=COLLECTION_NAME,
+            embed_fn=query_encoder()
+        )
+    params = dict(vector_weight=args.vector_weight, bm25_weight=args.bm25_weight, use_bm25=not args.no_bm25,
+                  fusion=args.fusion, header_weight=args.header_weight)
+    
+    # Group by top_k so each group is one batched call
+    by_top_k: Dict[int, List[int]] = {}
+    for i, request in enumerate(requests):
+        by_top_k.setdefault(int(request.get("top_k", args.top_k)), []).append(i)
+    
+    outputs: List[List[Dict[str, Any]]] = [[] for _ in requests]
+    start = time.time()
+    for top_k, positions in by_top_k.items():
+        for i in range(0, len(positions), BATCH_QUERIES):
+            chunk = positions[i:i + BATCH_QUERIES]
+            queries = [requests[p]["query"] for p in chunk]
+            if args.server:
+                batch = query_client.search_batch(queries, top_k=top_k, server_url=args.server, **params)["results"]
+            else:
+                batch = hybrid_search_batch(collection, queries, top_k=top_k, **params)
+            for p, results in zip(chunk, batch):
+                outputs[p] = results
+    elapsed = time.time() - start
+    
+    sink = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for request, results in zip(requests, outputs):
+            record = dict(request)
+            record["results"] = [batch_record(r, args.details) for r in results]
+            sink.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if args.output:
+            sink.close()
+    
+    if not args.quiet:
+        print(f"✓ {len(requests)} queries in {elapsed:.2f}s "
+              f"({len(requests) / max(elapsed, 1e-9):.1f} queries/s)", file=sys.stderr)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Hybrid RAG Query Tool (BM25 + Vector)")
-    parser.add_argument("query", help="Search query")
+    parser.add_argument("query", nargs="?", help="Search query")
+    parser.add_argument("--batch-file", metavar="JSONL",
+                        help='Run every {"query": ...} line of a JSONL file ("-" for stdin) and write JSONL results')
+    parser.add_argument("--output", metavar="JSONL", help="Batch output file (default: stdout)")
     parser.add_argument("--top-k", type=int, default=TOP_K_DEFAULT, help="Number of results to return")
     parser.add_argument("--vector-weight", type=float, default=VECTOR_WEIGHT, help="Vector search weight (0-1)")
     parser.add_argument("--bm25-weight", type=float, default=BM25_WEIGHT, help="BM25 search weight (0-1)")
     parser.add_argument("--no-bm25", action="store_true", help="Disable BM25 (vector search only)")
+    parser.add_argument("--header-weight", type=float, default=HEADER_WEIGHT,
+                        help="Header/title retriever weight (0 disables it)")
+    parser.add_argument("--fusion", choices=FUSION_METHODS, default=FUSION_DEFAULT,
+                        help="How retriever lists are fused: weighted sum, reciprocal rank, or z-scores")
     parser.add_argument("--details", action="store_true", help="Show detailed scoring breakdown")
     parser.add_argument("--quiet", action="store_true", help="Only show results, no progress info")
+    parser.add_argument("--backend", choices=["chroma", "exact", "ivf"], default="chroma",
+                        help="Vector search backend (exact/ivf run on the NumPy vector store, no Chroma)")
+    parser.add_argument("--vector-store", default=VECTOR_STORE_PATH, help="Vector store directory for exact/ivf")
+    parser.add_argument("--encoder", choices=ENCODERS, default=DEFAULT_ENCODER,
+                        help="Query embedding backend (onnx-int8: quantized ONNX Runtime, CPU)")
+    parser.add_argument("--server", metavar="URL", default=None,
+                        help="Send the query to a running query_server.py (e.g. "
+                             f"{query_client.DEFAULT_SERVER_URL}) instead of loading the model and DB")
     
     args = parser.parse_args()
+    if not args.query and not args.batch_file:
+        parser.error("a query or --batch-file is required")
+    set_encoder(args.encoder)
+    set_quiet(args.quiet)
+    
+    if args.batch_file:
+        run_batch_file(args)
+        return
     
     if args.quiet:
         import logging
@@ -264,15 +555,39 @@ def main():
     else:
         print(f"🔍 Hybrid Search: {args.query}")
         print(f"   Top-K: {args.top_k}")
-        print(f"   Weights: Vector={args.vector_weight}, BM25={args.bm25_weight}")
+        print(f"   Weights: Vector={args.vector_weight}, BM25={args.bm25_weight}, Header={args.header_weight}")
+        print(f"   Fusion: {args.fusion}")
         print()
     
-    # Load ChromaDB
+    if args.server:
+        response = query_client.search(
+            args.query,
+            top_k=args.top_k,
+            server_url=args.server,
+            vector_weight=args.vector_weight,
+            bm25_weight=args.bm25_weight,
+            use_bm25=not args.no_bm25,
+            fusion=args.fusion,
+            header_weight=args.header_weight
+        )
+        print(format_results(response["results"], show_details=args.details, timings=response.get("timings")))
+        if not args.quiet:
+            print(f"\n{'='*80}")
+            print(f"Total results: {len(response['results'])}")
+            print(f"Server latency: {response['latency_ms']:.1f}ms ({args.server})")
+        return
+    
+    # Load ChromaDB (or the local vector store)
     if not args.quiet:
-        print("Loading ChromaDB...")
+        print("Loading ChromaDB..." if args.backend == "chroma" else f"Loading vector store ({args.backend})...")
     start_time = time.time()
-    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-    collection = client.get_collection(name=COLLECTION_NAME)
+    collection = open_collection(
+        args.backend,
+        vector_store_path=args.vector_store,
+        chroma_path=CHROMA_DB_PATH,
+        collection_name=COLLECTION_NAME,
+        embed_fn=query_encoder()
+    )
     load_time = time.time() - start_time
     
     if not args.quiet:
@@ -284,13 +599,17 @@ def main():
         print("Searching...")
     start_time = time.time()
     
+    timings = {}
     results = hybrid_search(
         collection,
         args.query,
         top_k=args.top_k,
         vector_weight=args.vector_weight,
         bm25_weight=args.bm25_weight,
-        use_bm25=not args.no_bm25
+        use_bm25=not args.no_bm25,
+        fusion=args.fusion,
+        header_weight=args.header_weight,
+        timings=timings
     )
     
     search_time = time.time() - start_time
@@ -300,7 +619,7 @@ def main():
         print()
     
     # Display results
-    print(format_results(results, show_details=args.details))
+    print(format_results(results, show_details=args.details, timings=timings))
     
     # Summary
     if not args.quiet:
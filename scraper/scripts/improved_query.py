@@ -3,14 +3,22 @@
 Improved RAG Query System with Query Expansion and Hybrid Search
 """
 
-import chromadb
-from sentence_transformers import SentenceTransformer
+import os
 import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.encoders import DEFAULT_ENCODER, load_encoder
+from scripts.fusion import RetrieverResult, fuse_linear, fuse_rrf
+from scripts.query_cache import get_cache
+from scripts.search_backend import open_collection, VECTOR_STORE_PATH
+
 # Configuration
 CHROMA_DB_PATH = "/home/rag_cache/chroma_db"
 COLLECTION_NAME = "huawei_docs"
 MODEL_NAME = "all-MiniLM-L6-v2"
+MERGE_STRATEGIES = ("max", "mean", "rrf")
+VARIANT_DEPTH = 3  # Candidates per variant, as a multiple of top_k, for mean/rrf merging
 
 # Query expansion mappings
 ACRONYM_EXPANSION = {
@@ -25,11 +33,64 @@ ACRONYM_EXPANSION = {
     'vpn': ['virtual private network', 'tunnel', 'remote access'],
 }
 
+def merge_variants(variants, results, top_k, merge="max"):
+    """
+    Merge a batched query result (one row per query variant) into one ranking.
+    max: best similarity over the variants
+    mean: mean similarity; a variant that missed a chunk counts its lowest score
+    rrf: reciprocal-rank fusion of the variant rankings
+    """
+    lists = {}
+    payloads = {}
+    best = {}  # id -> (similarity, variant)
+    rows = zip(variants, results['ids'], results['documents'], results['metadatas'], results['distances'])
+    for i, (variant, ids, documents, metadatas, distances) in enumerate(rows):
+        scores = {}
+        for chunk_id, document, metadata, distance in zip(ids, documents, metadatas, distances):
+            similarity = 1 - distance
+            scores[chunk_id] = similarity
+            payloads[chunk_id] = (document, metadata, distance)
+            if chunk_id not in best or similarity > best[chunk_id][0]:
+                best[chunk_id] = (similarity, variant)
+        lists[str(i)] = RetrieverResult(str(i), scores)
+
+    if merge == "max":
+        merged = {chunk_id: similarity for chunk_id, (similarity, _) in best.items()}
+    elif merge == "mean":
+        merged = fuse_linear(lists, {name: 1.0 / len(lists) for name in lists})
+    elif merge == "rrf":
+        merged = fuse_rrf(lists, {name: 1.0 for name in lists})
+    else:
+        raise ValueError(f"Unknown merge strategy {merge!r}, expected one of {MERGE_STRATEGIES}")
+
+    ranked = sorted(merged, key=lambda chunk_id: merged[chunk_id], reverse=True)[:top_k]
+    unique_results = []
+    for chunk_id in ranked:
+        document, metadata, _ = payloads[chunk_id]
+        similarity, variant = best[chunk_id]
+        unique_results.append({
+            'query': variant,
+            'id': chunk_id,
+            'document': document,
+            'metadata': metadata,
+            'distance': 1 - similarity,
+            'similarity': similarity,
+            'score': merged[chunk_id]
+        })
+    return unique_results
+
 class ImprovedRAG:
-    def __init__(self):
-        self.client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-        self.collection = self.client.get_collection(COLLECTION_NAME)
-        self.model = SentenceTransformer(MODEL_NAME)
+    def __init__(self, backend="chroma", vector_store_path=VECTOR_STORE_PATH, encoder=DEFAULT_ENCODER):
+        self.model = load_encoder(encoder, MODEL_NAME)  # "torch" or "onnx-int8"
+        # backend: "chroma", or "exact"/"ivf" over the NumPy vector store
+        self.collection = open_collection(
+            backend,
+            vector_store_path=vector_store_path,
+            chroma_path=CHROMA_DB_PATH,
+            collection_name=COLLECTION_NAME,
+            embed_fn=lambda texts: self.model.encode(texts, show_progress_bar=False)
+        )
+        self.cache = get_cache(self.model.cache_name)  # Query embeddings, shared with the other query tools
     
     def expand_query(self, query):
         """Expand query with acronyms and synonyms"""
@@ -54,50 +115,36 @@ class ImprovedRAG:
         
         return result
     
-    def search(self, query, top_k=5, filter_service=None):
-        """Perform search with query expansion"""
+    def search(self, query, top_k=5, filter_service=None, merge="max"):
+        """
+        Perform search with query expansion. All variants are embedded in one
+        encode call and searched in one multi-vector query, with the service
+        filter applied once; merge is one of MERGE_STRATEGIES.
+        """
+        if merge not in MERGE_STRATEGIES:
+            raise ValueError(f"Unknown merge strategy {merge!r}, expected one of {MERGE_STRATEGIES}")
+
         # Expand query
         expanded_queries = self.expand_query(query)
         
-        # Generate embeddings for all query variations
-        embeddings = self.model.encode(expanded_queries, show_progress_bar=False)
-        
-        # Search with all embeddings
-        all_results = []
-        for i, (expanded_query, embedding) in enumerate(zip(expanded_queries, embeddings)):
-            where_filter = {"service": filter_service} if filter_service else None
-            
-            try:
-                results = self.collection.query(
-                    query_embeddings=[embedding.tolist()],
-                    n_results=top_k,
-                    where=where_filter
-                )
-                
-                # Add query info
-                for j in range(len(results['ids'][0])):
-                    all_results.append({
-                        'query': expanded_query,
-                        'id': results['ids'][0][j],
-                        'document': results['documents'][0][j],
-                        'metadata': results['metadatas'][0][j],
-                        'distance': results['distances'][0][j],
-                        'score': 1 - results['distances'][0][j]
-                    })
-            except Exception as e:
-                print(f"Error searching with '{expanded_query}': {e}")
+        # Generate embeddings for all query variations (cached ones skip the model)
+        embeddings = self.cache.encode(expanded_queries,
+                                       lambda texts: self.model.encode(texts, show_progress_bar=False))
         
-        # Sort by score and deduplicate by ID
-        seen_ids = set()
-        unique_results = []
-        for result in sorted(all_results, key=lambda x: x['score'], reverse=True):
-            if result['id'] not in seen_ids:
-                seen_ids.add(result['id'])
-                unique_results.append(result)
-                if len(unique_results) >= top_k:
-                    break
+        # Search with all embeddings at once; max only needs each variant's top_k
+        where_filter = {"service": filter_service} if filter_service else None
+        n_results = top_k if merge == "max" else top_k * VARIANT_DEPTH
+        try:
+            results = self.collection.query(
+                query_embeddings=embeddings.tolist(),
+                n_results=n_results,
+                where=where_filter
+            )
+        except Exception as e:
+            print(f"Error searching with '{query}': {e}")
+            return []
         
-        return unique_results
+        return merge_variants(expanded_queries, results, top_k, merge)
     
     def print_results(self, query, results):
         """Pretty print search results"""
@@ -111,7 +158,7 @@ class ImprovedRAG:
         
         for i, result in enumerate(results, 1):
             metadata = result['metadata']
-            score_pct = result['score'] * 100
+            score_pct = result['similarity'] * 100
             
             print(f"{i}. [{metadata.get('service', 'Unknown'):20s}] Score: {score_pct:6.1f}%")
             print(f"   URL: {metadata.get('url', 'N/A')}")
@@ -132,13 +179,19 @@ class ImprovedRAG:
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python improved_query.py <query> [--top-k N] [--service SERVICE]")
+        print("Usage: python improved_query.py <query> [--top-k N] [--service SERVICE] "
+              "[--merge max|mean|rrf] [--backend chroma|exact|ivf] [--vector-store DIR] "
+              "[--encoder torch|onnx-int8]")
         print("Example: python improved_query.py 'How to create ECS instance?' --top-k 5")
         sys.exit(1)
     
     query = sys.argv[1]
     top_k = 5
     filter_service = None
+    merge = "max"
+    backend = "chroma"
+    vector_store_path = VECTOR_STORE_PATH
+    encoder = DEFAULT_ENCODER
     
     # Parse options
     for i in range(2, len(sys.argv)):
@@ -147,20 +200,29 @@ def main():
             top_k = int(sys.argv[i + 1])
         elif arg == '--service' and i + 1 < len(sys.argv):
             filter_service = sys.argv[i + 1]
+        elif arg == '--merge' and i + 1 < len(sys.argv):
+            merge = sys.argv[i + 1]
+        elif arg == '--backend' and i + 1 < len(sys.argv):
+            backend = sys.argv[i + 1]
+        elif arg == '--vector-store' and i + 1 < len(sys.argv):
+            vector_store_path = sys.argv[i + 1]
+        elif arg == '--encoder' and i + 1 < len(sys.argv):
+            encoder = sys.argv[i + 1]
     
     print("Loading models and database...")
-    rag = ImprovedRAG()
+    rag = ImprovedRAG(backend=backend, vector_store_path=vector_store_path, encoder=encoder)
     print(f"Database loaded: {rag.collection.count()} vectors")
     print()
     
     print(f"Searching for: {query}")
     print(f"Top-K: {top_k}")
     print(f"Service filter: {filter_service if filter_service else 'None'}")
+    print(f"Variant merge: {merge}")
     print()
     
     import time
     start = time.time()
-    results = rag.search(query, top_k=top_k, filter_service=filter_service)
+    results = rag.search(query, top_k=top_k, filter_service=filter_service, merge=merge)
     elapsed = time.time() - start
     
     print(f"Found {len(results)} results in {elapsed*1000:.0f}ms")
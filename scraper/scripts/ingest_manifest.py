@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Incremental Ingestion Manifest
+Tracks per-file stat info, content hashes and emitted chunk ids so ingesters
+only re-chunk and re-embed documents that changed since the previous run
+"""
+
+import os
+import json
+import hashlib
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Optional, Tuple
+
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class FileEntry:
+    path: str  # Relative to the docs root
+    mtime: float
+    size: int
+    content_hash: str
+    chunk_ids: List[str] = field(default_factory=list)
+    fingerprint: Optional[str] = None  # corpus_fingerprint() of this file's chunks
+
+
+@dataclass
+class ManifestDiff:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    def to_process(self) -> List[str]:
+        """Absolute paths that need to be (re-)chunked"""
+        return self.added + self.changed
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "added": len(self.added),
+            "changed": len(self.changed),
+            "removed": len(self.removed),
+            "unchanged": len(self.unchanged)
+        }
+
+
+def chunk_fingerprint(chunk_id: str, text: str) -> int:
+    """64-bit hash of one (id, document) pair"""
+    digest = hashlib.blake2b(chunk_id.encode('utf-8') + b'\0' + (text or "").encode('utf-8'), digest_size=8)
+    return int.from_bytes(digest.digest(), 'little')
+
+
+def combine_fingerprints(values) -> int:
+    """Order-independent combination (sum mod 2^64), so per-file parts add up to the corpus"""
+    return sum(values) % (1 << 64)
+
+
+def format_fingerprint(value: int) -> str:
+    return f"{value:016x}"
+
+
+def corpus_fingerprint(ids: List[str], texts: List[str]) -> str:
+    """Content fingerprint of a set of chunks; changes with any id or text edit"""
+    return format_fingerprint(combine_fingerprints(chunk_fingerprint(i, t) for i, t in zip(ids, texts)))
+
+
+def recorded_fingerprint(path: str) -> Optional[Tuple[str, int]]:
+    """(corpus_fingerprint, chunk count) saved by the last ingestion run, if any"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != MANIFEST_VERSION or not data.get("corpus_fingerprint"):
+        return None
+    return data["corpus_fingerprint"], int(data.get("chunks", -1))
+
+
+def metadata_path(file_path: str) -> str:
+    """Path of the scraper's JSON sidecar for a markdown document"""
+    return file_path.replace('.md', '.json')
+
+
+def stat_document(file_path: str) -> Tuple[float, int]:
+    """Combined mtime/size of a document and its metadata sidecar"""
+    st = os.stat(file_path)
+    mtime, size = st.st_mtime, st.st_size
+    meta_path = metadata_path(file_path)
+    if os.path.exists(meta_path):
+        meta_st = os.stat(meta_path)
+        mtime = max(mtime, meta_st.st_mtime)
+        size += meta_st.st_size
+    return mtime, size
+
+
+def hash_document(file_path: str) -> str:
+    """Content hash of a document plus its metadata sidecar (the URL lives there)"""
+    h = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        h.update(f.read())
+    meta_path = metadata_path(file_path)
+    if os.path.exists(meta_path):
+        h.update(b'\0')
+        with open(meta_path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class IngestManifest:
+    """
+    Persisted record of what the last ingestion run wrote to the collection.
+
+    `params` captures everything that influences chunk ids and embeddings
+    (chunk sizes, model, collection). A manifest written with different
+    params is discarded so the caller falls back to a full rebuild.
+    """
+
+    def __init__(self, path: str, docs_root: str, params: Dict):
+        self.path = path
+        self.docs_root = docs_root
+        self.params = params
+        self.entries: Dict[str, FileEntry] = {}
+        self.valid = False
+        self._pending: Dict[str, Tuple[float, int, str]] = {}
+
+    def load(self) -> bool:
+        """Load the manifest from disk; returns False if missing or incompatible"""
+        self.entries = {}
+        self.valid = False
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Manifest unreadable ({e}), ignoring")
+            return False
+
+        if data.get("version") != MANIFEST_VERSION or data.get("params") != self.params:
+            return False
+
+        for raw in data.get("files", []):
+            entry = FileEntry(**raw)
+            self.entries[entry.path] = entry
+        self.valid = True
+        return True
+
+    def relpath(self, file_path: str) -> str:
+        return os.path.relpath(file_path, self.docs_root)
+
+    def diff(self, files: List[str]) -> ManifestDiff:
+        """
+        Classify files against the manifest.
+        mtime+size is the fast path; content is only hashed when they differ.
+        """
+        diff = ManifestDiff()
+        seen = set()
+
+        for file_path in files:
+            rel = self.relpath(file_path)
+            seen.add(rel)
+            try:
+                mtime, size = stat_document(file_path)
+            except OSError:
+                continue
+
+            entry = self.entries.get(rel)
+            if entry and entry.mtime == mtime and entry.size == size:
+                diff.unchanged.append(file_path)
+                continue
+
+            content_hash = hash_document(file_path)
+            self._pending[rel] = (mtime, size, content_hash)
+            if entry is None:
+                diff.added.append(file_path)
+            elif entry.content_hash == content_hash:
+                # Touched but identical: refresh stat info, keep chunks
+                entry.mtime, entry.size = mtime, size
+                diff.unchanged.append(file_path)
+            else:
+                diff.changed.append(file_path)
+
+        diff.removed = [rel for rel in self.entries if rel not in seen]
+        return diff
+
+    def chunk_ids_for(self, rel_paths: List[str]) -> List[str]:
+        """Chunk ids previously emitted for the given relative paths"""
+        ids = []
+        for rel in rel_paths:
+            entry = self.entries.get(rel)
+            if entry:
+                ids.extend(entry.chunk_ids)
+        return ids
+
+    def stale_chunk_ids(self, diff: ManifestDiff) -> List[str]:
+        """Chunk ids that must be deleted before re-ingesting a diff"""
+        changed = [self.relpath(p) for p in diff.changed]
+        return self.chunk_ids_for(changed + diff.removed)
+
+    def record(self, file_path: str, chunk_ids: List[str], texts: Optional[List[str]] = None):
+        """Record the chunks written for a file (texts enable the corpus fingerprint)"""
+        rel = self.relpath(file_path)
+        pending = self._pending.pop(rel, None)
+        if pending is None:
+            mtime, size = stat_document(file_path)
+            content_hash = hash_document(file_path)
+        else:
+            mtime, size, content_hash = pending
+        fingerprint = corpus_fingerprint(chunk_ids, texts) if texts is not None else None
+        self.entries[rel] = FileEntry(rel, mtime, size, content_hash, list(chunk_ids), fingerprint)
+
+    def forget(self, rel_paths: List[str]):
+        for rel in rel_paths:
+            self.entries.pop(rel, None)
+
+    def reset(self):
+        """Drop all entries (used before a full rebuild)"""
+        self.entries = {}
+        self._pending = {}
+        self.valid = True
+
+    def corpus_fingerprint(self) -> Optional[str]:
+        """Fingerprint of everything recorded, or None if any file predates fingerprints"""
+        if any(e.fingerprint is None for e in self.entries.values()):
+            return None
+        return format_fingerprint(combine_fingerprints(int(e.fingerprint, 16) for e in self.entries.values()))
+
+    def save(self):
+        """Atomically write the manifest"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "params": self.params,
+            "corpus_fingerprint": self.corpus_fingerprint(),
+            "chunks": sum(len(e.chunk_ids) for e in self.entries.values()),
+            "files": [asdict(e) for e in sorted(self.entries.values(), key=lambda e: e.path)]
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+
+def delete_ids(collection, ids: List[str], batch_size: int = 5000):
+    """Delete chunk ids from a Chroma collection in bounded batches"""
+    for i in range(0, len(ids), batch_size):
+        collection.delete(ids=ids[i:i + batch_size])
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Streaming Ingestion Pipeline
+Runs chunking (process pool), embedding and writing concurrently,
+connected by bounded queues so each stage applies backpressure upstream
+"""
+
+import time
+import queue
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    """Busy time (doing work) vs. blocked time (waiting on a full queue)"""
+    name: str
+    items: int = 0
+    busy_seconds: float = 0.0
+    blocked_seconds: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 2),
+            "blocked_seconds": round(self.blocked_seconds, 2)
+        }
+
+
+@dataclass
+class PipelineStats:
+    chunk: StageStats = field(default_factory=lambda: StageStats("chunk"))
+    embed: StageStats = field(default_factory=lambda: StageStats("embed"))
+    write: StageStats = field(default_factory=lambda: StageStats("write"))
+    wall_seconds: float = 0.0
+    # Moving chunk results from workers to the parent: worker-side packing,
+    # parent-side unpacking, and the bytes that crossed
+    ipc_pack_seconds: float = 0.0
+    ipc_unpack_seconds: float = 0.0
+    ipc_bytes: int = 0
+
+    def bottleneck(self) -> str:
+        stages = [self.chunk, self.embed, self.write]
+        return max(stages, key=lambda s: s.busy_seconds).name
+
+    def to_dict(self) -> Dict:
+        return {
+            "wall_seconds": round(self.wall_seconds, 2),
+            "bottleneck": self.bottleneck(),
+            "stages": {s.name: s.to_dict() for s in (self.chunk, self.embed, self.write)},
+            "ipc": {
+                "pack_seconds": round(self.ipc_pack_seconds, 2),
+                "unpack_seconds": round(self.ipc_unpack_seconds, 2),
+                "megabytes": round(self.ipc_bytes / 1e6, 1)
+            }
+        }
+
+
+class IngestPipeline:
+    """
+    chunk -> embed -> write, each stage running concurrently.
+
+    - Chunking runs on a caller-supplied executor with at most
+      `max_inflight` outstanding work items.
+    - `chunk_fn(item)` must return a tuple whose first element is the list
+      of chunks produced; the full tuple is handed to `on_done` once every
+      chunk from it has been written.
+    - `embed_fn(chunks)` returns an embedding matrix for a slice of chunks.
+    - `write_fn(chunks, embeddings)` persists one slice.
+    - `unpack_fn(result)`, if given, turns a worker result into that tuple
+      in the parent and returns (tuple, worker pack seconds, bytes), for
+      workers that hand results over in shared memory.
+    - `discard_fn(result)` frees a worker result that will never be
+      unpacked: on abort, the results of chunking tasks that had already
+      finished or were still running are passed to it.
+
+    A full queue blocks the stage feeding it, so the slowest stage sets the
+    pace and memory stays bounded by the queue sizes.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[Any]], Any],
+        write_fn: Callable[[List[Any], Any], None],
+        on_done: Optional[Callable[[tuple], None]] = None,
+        unpack_fn: Optional[Callable[[Any], tuple]] = None,
+        discard_fn: Optional[Callable[[Any], None]] = None,
+        batch_size: int = 256,
+        queue_size: int = 8,
+        max_inflight: int = 8
+    ):
+        self.embed_fn = embed_fn
+        self.write_fn = write_fn
+        self.on_done = on_done
+        self.unpack_fn = unpack_fn
+        self.discard_fn = discard_fn
+        self.batch_size = batch_size
+        self.max_inflight = max_inflight
+        self.embed_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.write_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.stats = PipelineStats()
+        self._error: Optional[BaseException] = None
+        self._abort = threading.Event()
+
+    def _put(self, q: queue.Queue, item, stage: StageStats):
+        start = time.time()
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        stage.blocked_seconds += time.time() - start
+
+    @staticmethod
+    def _close(q: queue.Queue, consumer: threading.Thread):
+        """Send the end marker without deadlocking if the consumer already died"""
+        while consumer.is_alive():
+            try:
+                q.put(_DONE, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _fail(self, error: BaseException):
+        if self._error is None:
+            self._error = error
+        self._abort.set()
+
+    def _discard(self, futures: List[Future]):
+        """Wait for tasks that could not be cancelled and free their results"""
+        for future in futures:
+            try:
+                result = future.result()
+            except Exception:
+                continue  # A failed task has nothing to free
+            try:
+                self.discard_fn(result)
+            except Exception:
+                pass  # Best effort: the run is already failing with the original error
+
+    def _embed_worker(self):
+        stage = self.stats.embed
+        try:
+            while True:
+                result = self.embed_queue.get()
+                if result is _DONE:
+                    break
+                if self._abort.is_set():
+                    continue
+                chunks = result[0]
+                if not chunks:
+                    self._put(self.write_queue, ([], None, result), stage)
+                    continue
+                for i in range(0, len(chunks), self.batch_size):
+                    batch = chunks[i:i + self.batch_size]
+                    start = time.time()
+                    embeddings = self.embed_fn(batch)
+                    stage.busy_seconds += time.time() - start
+                    stage.items += len(batch)
+                    is_last = i + self.batch_size >= len(chunks)
+                    self._put(self.write_queue, (batch, embeddings, result if is_last else None), stage)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._close(self.write_queue, self._write_thread)
+
+    def _write_worker(self):
+        stage = self.stats.write
+        try:
+            while True:
+                item = self.write_queue.get()
+                if item is _DONE:
+                    break
+                if self._abort.is_set():
+                    continue
+                batch, embeddings, finished = item
+                start = time.time()
+                if batch:
+                    self.write_fn(batch, embeddings)
+                    stage.items += len(batch)
+                if finished is not None and self.on_done:
+                    self.on_done(finished)
+                stage.busy_seconds += time.time() - start
+        except BaseException as e:
+            self._fail(e)
+
+    def run(self, executor, chunk_fn: Callable[[Any], tuple], work_items: Iterable[Any]) -> PipelineStats:
+        """Feed work items through the pipeline and block until everything is written"""
+        wall_start = time.time()
+        embed_thread = threading.Thread(target=self._embed_worker, name="ingest-embed", daemon=True)
+        write_thread = threading.Thread(target=self._write_worker, name="ingest-write", daemon=True)
+        self._write_thread = write_thread
+        write_thread.start()
+        embed_thread.start()
+
+        stage = self.stats.chunk
+        pending = set()
+        ready: List[Future] = []  # Finished tasks whose results have not been unpacked yet
+        items = iter(work_items)
+        exhausted = False
+        try:
+            while not self._abort.is_set():
+                while not exhausted and len(pending) < self.max_inflight:
+                    try:
+                        pending.add(executor.submit(chunk_fn, next(items)))
+                    except StopIteration:
+                        exhausted = True
+                if not pending:
+                    break
+                # Time spent waiting on the pool approximates the chunk stage's cost
+                start = time.time()
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                stage.busy_seconds += time.time() - start
+                ready = list(done)
+                while ready:
+                    result = ready.pop().result()
+                    if self.unpack_fn is not None:
+                        start = time.time()
+                        result, pack_seconds, nbytes = self.unpack_fn(result)
+                        self.stats.ipc_unpack_seconds += time.time() - start
+                        self.stats.ipc_pack_seconds += pack_seconds
+                        self.stats.ipc_bytes += nbytes
+                    stage.items += 1
+                    self._put(self.embed_queue, result, stage)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            for future in pending:
+                future.cancel()
+            if self.discard_fn is not None:
+                self._discard(ready + [f for f in pending if not f.cancelled()])
+            self._close(self.embed_queue, embed_thread)
+            embed_thread.join()
+            write_thread.join()
+            self.stats.wall_seconds = time.time() - wall_start
+
+        if self._error is not None:
+            raise self._error
+        return self.stats
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Aho-Corasick Keyword Matcher
+Finds every occurrence of a fixed set of keywords in one left-to-right pass,
+so matching cost depends on the text length, not on the number of keywords
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    Character-level automaton over (keyword, payload) pairs. Matching is by
+    substring, like `keyword in text`; callers lower-case both sides.
+
+    State tables are plain lists/dicts (goto, fail, out) so they can be
+    serialized and rebuilt without recompiling.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]] = ()):
+        self.payloads: List[Any] = []
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[int]] = [[]]
+        for keyword, payload in patterns:
+            self._insert(keyword, payload)
+        self._link()
+
+    def _insert(self, keyword: str, payload: Any):
+        if not keyword:
+            raise ValueError("Empty keyword")
+        state = 0
+        for ch in keyword:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            state = nxt
+        self.out[state].append(len(self.payloads))
+        self.payloads.append(payload)
+
+    def _link(self):
+        """Breadth-first failure links; each state inherits its fallback's outputs"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find(self, text: str) -> List[int]:
+        """Pattern indices found in text, each once, in order of first match end"""
+        seen: Set[int] = set()
+        found: List[int] = []
+        state = 0
+        goto, fail, out = self.goto, self.fail, self.out
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in out[state]:
+                if index not in seen:
+                    seen.add(index)
+                    found.append(index)
+        return found
+
+    def matches(self, text: str) -> List[Any]:
+        """Payloads of the patterns found in text"""
+        return [self.payloads[i] for i in self.find(text)]
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def tables(self) -> Dict[str, Any]:
+        """JSON-serializable state; payloads must be JSON values themselves"""
+        return {"payloads": self.payloads, "goto": self.goto, "fail": self.fail, "out": self.out}
+
+    @classmethod
+    def from_tables(cls, tables: Dict[str, Any]) -> "AhoCorasick":
+        """Rebuild a matcher from tables() output without recompiling"""
+        matcher = cls.__new__(cls)
+        matcher.payloads = list(tables["payloads"])
+        matcher.goto = [dict(edges) for edges in tables["goto"]]
+        matcher.fail = list(tables["fail"])
+        matcher.out = [list(indices) for indices in tables["out"]]
+        if not (len(matcher.goto) == len(matcher.fail) == len(matcher.out)):
+            raise ValueError("Inconsistent matcher tables")
+        return matcher
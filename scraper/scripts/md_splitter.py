@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Markdown Section Splitter
+Header splitting, whitespace cleanup and token counting shared by
+fast_chunker, sequential_ingest and fast_rag_ingest. A document is read in
+one finditer pass of a precompiled header pattern: section bodies are
+sliced from the match offsets (no per-line re.match, no content.find
+rescans), whitespace is normalized with one split/join instead of two
+re.sub passes, and that same split feeds a translate-based token count.
+
+This is not a drop-in replacement: chunk text, token counts and chunk ids
+differ from the per-line splitter it replaced. Single-chunk sections no
+longer repeat their header block (the old path prepended it to a section
+that already started with it), and tokens are runs of \\w, so punctuation
+now separates words. SPLITTER_VERSION is part of the ingest manifest
+params, so the first run after a change is a full rebuild rather than an
+--incremental one.
+
+`md_splitter.py` benchmarks it against the per-line functions the
+ingesters used before, which _legacy_split_document reproduces exactly.
+
+Standard library only: chunking workers import it.
+"""
+
+import os
+import re
+import sys
+import glob
+import time
+import random
+import argparse
+from itertools import filterfalse
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configuration
+SPLITTER_VERSION = 2  # Bump when chunk boundaries or token counts change; ingest manifests rebuild
+# `# Title` lines: `\n` leads so the scan jumps from newline to newline instead of testing `^` at every
+# character; the first line is matched separately
+HEADER_PATTERN = re.compile(r'\n(#{1,6})[^\S\n]+(.+)')
+FIRST_HEADER_PATTERN = re.compile(r'(#{1,6})[^\S\n]+(.+)')
+PARAGRAPH_PATTERN = re.compile(r'\n\n+')
+BLANK_RUN_PATTERN = re.compile(r'\n{3,}')
+
+Section = Tuple[List[Tuple[int, str]], str]  # (header stack of (level, text), header block + body)
+
+
+class _WordBreaks(dict):
+    """str.translate table mapping every character outside \\w to a space, filled lazily"""
+
+    def __missing__(self, code: int) -> int:
+        char = chr(code)
+        self[code] = code if char.isalnum() or char == '_' else 0x20
+        return self[code]
+
+
+_WORD_BREAKS = _WordBreaks()
+_ASCII_WORD_BREAKS = bytes(b if chr(b).isalnum() or b == 0x5f else 0x20 for b in range(128)) + bytes(range(128, 256))
+
+
+def simple_tokenize(text: str) -> List[str]:
+    """Word tokens for length estimation: runs of \\w, so punctuation separates words"""
+    return text.translate(_WORD_BREAKS).split()
+
+
+def word_tokens(words: List[str]) -> int:
+    """
+    len(simple_tokenize()) of whitespace-split text: ASCII words go through
+    one bytes.translate, only the rest through the (slower) str.translate
+    """
+    tokens = len(' '.join(filter(str.isascii, words)).encode('ascii').translate(_ASCII_WORD_BREAKS).split())
+    other = ' '.join(filterfalse(str.isascii, words))
+    if other:
+        tokens += len(other.translate(_WORD_BREAKS).split())
+    return tokens
+
+
+def count_tokens(text: str) -> int:
+    return word_tokens(text.split())
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse every whitespace run to one space"""
+    return ' '.join(text.split())
+
+
+def clean_lines(text: str) -> str:
+    """Cap blank-line runs at one blank line and strip every line"""
+    return '\n'.join(line.strip() for line in BLANK_RUN_PATTERN.sub('\n\n', text).split('\n'))
+
+
+def header_block(stack: List[Tuple[int, str]]) -> str:
+    return '\n'.join('#' * level + ' ' + text for level, text in stack)
+
+
+def find_headers(content: str) -> List[Tuple[int, str, int, int]]:
+    """(level, text, line start, line end) of every header line"""
+    headers = []
+    first = FIRST_HEADER_PATTERN.match(content)
+    if first:
+        headers.append((len(first.group(1)), first.group(2).strip(), 0, first.end()))
+    for match in HEADER_PATTERN.finditer(content):
+        headers.append((len(match.group(1)), match.group(2).strip(), match.start() + 1, match.end()))
+    return headers
+
+
+def iter_sections(content: str) -> Iterator[Section]:
+    """
+    Every header with a non-empty body, as (header stack, header block +
+    body); text before the first header is dropped. A document without
+    headers (or with only empty sections) is one section.
+    """
+    headers = find_headers(content)
+    stack: List[Tuple[int, str]] = []
+    emitted = False
+    for i, (level, text, _, line_end) in enumerate(headers):
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, text))
+
+        end = headers[i + 1][2] if i + 1 < len(headers) else len(content)
+        body = content[line_end:end].strip()
+        if body:
+            emitted = True
+            yield list(stack), header_block(stack) + '\n\n' + body
+    if not emitted:
+        yield [], content.strip()
+
+
+def pack_paragraphs(text: str, max_tokens: int, min_tokens: int) -> List[Tuple[str, int]]:
+    """
+    Split an oversized section at paragraph breaks into (cleaned text, tokens)
+    pieces of at most max_tokens (a single larger paragraph stays whole); a
+    trailing piece under min_tokens is dropped.
+    """
+    pieces = []
+    parts: List[str] = []
+    tokens = 0
+    for paragraph in PARAGRAPH_PATTERN.split(text):
+        paragraph_tokens = count_tokens(paragraph)
+        if tokens + paragraph_tokens > max_tokens and tokens > 0:
+            pieces.append((normalize_whitespace('\n\n'.join(parts)), tokens))
+            parts = []
+            tokens = 0
+        parts.append(paragraph)
+        tokens += paragraph_tokens
+    if tokens >= min_tokens:
+        pieces.append((normalize_whitespace('\n\n'.join(parts)), tokens))
+    return pieces
+
+
+def split_document(content: str, max_tokens: Optional[int] = None,
+                   min_tokens: int = 0) -> Iterator[Tuple[List[str], str, int]]:
+    """
+    (header texts, whitespace-normalized chunk text, tokens) for each chunk:
+    sections under min_tokens are skipped and, unless max_tokens is None,
+    larger ones are split with pack_paragraphs.
+    """
+    for stack, text in iter_sections(content):
+        words = text.split()  # One split serves both the token count and the normalized text
+        tokens = word_tokens(words)
+        if tokens < min_tokens:
+            continue
+        headers = [header for _, header in stack]
+        if max_tokens is None or tokens <= max_tokens:
+            yield headers, ' '.join(words), tokens
+            continue
+        for piece, piece_tokens in pack_paragraphs(text, max_tokens, min_tokens):
+            yield headers, piece, piece_tokens
+
+
+# The per-line splitter fast_chunker and sequential_ingest used before, output included, kept for the
+# benchmark only
+
+def _legacy_tokenize(text: str) -> List[str]:
+    return text.replace(r'[^\w\s]', ' ').split()  # A literal replace: punctuation never split words
+
+
+def _legacy_clean(text: str) -> str:
+    return re.sub(r'\n{3,}', '\n\n', re.sub(r'\s+', ' ', text)).strip()
+
+
+def _legacy_sections(content: str) -> List[Section]:
+    headers = []
+    pos = 0
+    for line in content.split('\n'):
+        match = re.match(r'^(#{1,6})\s+(.+)$', line)
+        if match:
+            headers.append((len(match.group(1)), match.group(2).strip(), pos))
+        pos += len(line) + 1
+    if not headers:
+        return [([], content.strip())]
+
+    sections = []
+    stack: List[Tuple[int, str]] = []
+    for i, (level, text, position) in enumerate(headers):
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, text))
+        start = content.find(text, position) + len(text)
+        end = headers[i + 1][2] if i + 1 < len(headers) else len(content)
+        body = content[start:end].strip()
+        if body:
+            sections.append((stack.copy(), header_block(stack) + '\n\n' + body))
+    return sections if sections else [([], content.strip())]
+
+
+def _legacy_split_document(content: str, max_tokens: Optional[int] = None,
+                           min_tokens: int = 0) -> List[Tuple[List[str], str, int]]:
+    chunks = []
+    for stack, text in _legacy_sections(content):
+        tokens = len(_legacy_tokenize(text))
+        if tokens < min_tokens:
+            continue
+        headers = [h[1] for h in stack]
+        if max_tokens is None or tokens <= max_tokens:
+            # `text` already starts with the header block; the old code prepended it again
+            chunks.append((headers, _legacy_clean(header_block(stack) + '\n\n' + text), tokens))
+            continue
+        current, current_tokens = "", 0
+        for paragraph in re.split(r'\n\n+', text):
+            paragraph_tokens = len(_legacy_tokenize(paragraph))
+            if current_tokens + paragraph_tokens > max_tokens and current_tokens > 0:
+                chunks.append((headers, _legacy_clean(current), current_tokens))
+                current, current_tokens = paragraph, paragraph_tokens
+            else:
+                current += ('\n\n' if current else '') + paragraph
+                current_tokens += paragraph_tokens
+        if current_tokens >= min_tokens:
+            chunks.append((headers, _legacy_clean(current), current_tokens))
+    return chunks
+
+
+def benchmark(contents: List[str], max_tokens: Optional[int], min_tokens: int,
+              repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Best-of-`repeat` docs/sec of the legacy and the single-pass splitter over
+    in-memory documents; runs alternate so both see the same machine load
+    """
+    splitters = {"legacy": _legacy_split_document, "single_pass": split_document}
+    best = {name: float("inf") for name in splitters}
+    chunks = {}
+    for _ in range(repeat):
+        for name, split in splitters.items():
+            start = time.perf_counter()
+            chunks[name] = [chunk for content in contents for chunk in split(content, max_tokens, min_tokens)]
+            best[name] = min(best[name], time.perf_counter() - start)
+    return {name: {
+        "seconds": best[name],
+        "docs_per_second": len(contents) / best[name] if best[name] else 0.0,
+        "chunks": len(chunks[name]),
+        "tokens": sum(tokens for _, _, tokens in chunks[name])
+    } for name in splitters}
+
+
+def main():
+    from scripts.fast_chunker import DOCS_PATH, MAX_CHUNK_SIZE, MIN_CHUNK_SIZE
+
+    parser = argparse.ArgumentParser(description="Benchmark the markdown splitter against the per-line splitter")
+    parser.add_argument("--docs", default=DOCS_PATH, help="Markdown corpus to sample")
+    parser.add_argument("--files", type=int, default=2000, help="Number of files to split")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per splitter (best is kept)")
+    parser.add_argument("--no-split", action="store_true",
+                        help="Keep oversized sections whole, like sequential_ingest")
+    args = parser.parse_args()
+
+    files = glob.glob(os.path.join(args.docs, "**", "*.md"), recursive=True)
+    random.Random(0).shuffle(files)
+    contents = []
+    for path in files[:args.files]:
+        with open(path, 'r', encoding='utf-8') as f:
+            contents.append(f.read())
+    if not contents:
+        print(f"❌ No markdown files found under {args.docs}")
+        sys.exit(1)
+
+    megabytes = sum(len(c) for c in contents) / 1024 / 1024
+    print(f"📄 {len(contents):,} files ({megabytes:.1f} MB), best of {args.repeat} runs")
+    results = benchmark(contents, None if args.no_split else MAX_CHUNK_SIZE, MIN_CHUNK_SIZE, args.repeat)
+    for name, r in results.items():
+        print(f"   {name:12s} {r['docs_per_second']:10,.0f} docs/s  {megabytes / r['seconds']:7.1f} MB/s  "
+              f"{r['chunks']:,} chunks, {r['tokens']:,} tokens")
+    legacy, single = results["legacy"], results["single_pass"]
+    print(f"   single pass is {single['docs_per_second'] / max(legacy['docs_per_second'], 1e-9):.2f}x faster "
+          f"(output differs: no repeated header block, punctuation now splits words)")
+
+
+if __name__ == "__main__":
+    main()
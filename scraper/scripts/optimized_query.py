@@ -3,9 +3,14 @@
 RAG Query System with Service Boosting and Relevance Optimization
 """
 
-import chromadb
-from sentence_transformers import SentenceTransformer
+import os
 import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.encoders import DEFAULT_ENCODER, load_encoder
+from scripts.query_cache import get_cache
+from scripts.search_backend import open_collection, VECTOR_STORE_PATH
 import math
 
 # Configuration
@@ -42,11 +47,17 @@ SERVICE_WEIGHTS = {
 }
 
 class OptimizedRAG:
-    def __init__(self):
-        self.client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-        self.collection = self.client.get_collection(COLLECTION_NAME)
-        self.model = SentenceTransformer(MODEL_NAME)
-        self.cache = {}  # Cache query embeddings
+    def __init__(self, backend="chroma", vector_store_path=VECTOR_STORE_PATH, encoder=DEFAULT_ENCODER):
+        self.model = load_encoder(encoder, MODEL_NAME)  # "torch" or "onnx-int8"
+        # backend: "chroma", or "exact"/"ivf" over the NumPy vector store
+        self.collection = open_collection(
+            backend,
+            vector_store_path=vector_store_path,
+            chroma_path=CHROMA_DB_PATH,
+            collection_name=COLLECTION_NAME,
+            embed_fn=lambda texts: self.model.encode(texts, show_progress_bar=False)
+        )
+        self.cache = get_cache(self.model.cache_name)  # Query embeddings, shared with the other query tools
     
     def calculate_relevance_score(self, result, query_terms):
         """Calculate relevance score with multiple factors"""
@@ -80,13 +91,8 @@ class OptimizedRAG:
         """Perform search with relevance scoring"""
         query_terms = query.split()
         
-        # Check cache
-        cache_key = query.lower()
-        if cache_key not in self.cache:
-            embedding = self.model.encode(query, show_progress_bar=False)
-            self.cache[cache_key] = embedding
-        else:
-            embedding = self.cache[cache_key]
+        # Embed through the query cache
+        embedding = self.cache.encode([query], lambda texts: self.model.encode(texts, show_progress_bar=False))[0]
         
         # Search
         results = self.collection.query(
@@ -147,18 +153,28 @@ class OptimizedRAG:
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python optimized_query.py <query> [--top-k N]")
+        print("Usage: python optimized_query.py <query> [--top-k N] [--backend chroma|exact|ivf] "
+              "[--vector-store DIR] [--encoder torch|onnx-int8]")
         sys.exit(1)
     
     query = sys.argv[1]
     top_k = 5
+    backend = "chroma"
+    vector_store_path = VECTOR_STORE_PATH
+    encoder = DEFAULT_ENCODER
     
     for i in range(2, len(sys.argv)):
         if sys.argv[i] == '--top-k' and i + 1 < len(sys.argv):
             top_k = int(sys.argv[i + 1])
+        elif sys.argv[i] == '--backend' and i + 1 < len(sys.argv):
+            backend = sys.argv[i + 1]
+        elif sys.argv[i] == '--vector-store' and i + 1 < len(sys.argv):
+            vector_store_path = sys.argv[i + 1]
+        elif sys.argv[i] == '--encoder' and i + 1 < len(sys.argv):
+            encoder = sys.argv[i + 1]
     
     print("Loading models and database...")
-    rag = OptimizedRAG()
+    rag = OptimizedRAG(backend=backend, vector_store_path=vector_store_path, encoder=encoder)
     print(f"Database loaded: {rag.collection.count()} vectors")
     print()
     
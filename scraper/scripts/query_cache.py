@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Query Embedding Cache
+Bounded in-memory LRU (entry count + TTL) in front of a SQLite store, keyed
+by model name and normalized query text, so repeated queries from any
+query tool or the query server skip the encoder
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from scripts.embedding_cache import cache_key
+
+# Configuration
+QUERY_CACHE_PATH = os.environ.get("RAG_QUERY_CACHE", "/home/rag_cache/query_embeddings.sqlite")
+MEMORY_ENTRIES = 10_000
+DISK_ENTRIES = 500_000
+TTL_SECONDS = 30 * 24 * 3600  # Embeddings only change with the model, so this mainly bounds stale junk
+PRUNE_EVERY = 1000  # Disk writes between size/TTL pruning passes
+
+_caches: Dict[str, "QueryEmbeddingCache"] = {}
+_caches_lock = threading.Lock()
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query (the default model is uncased)"""
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Two-level query embedding cache for one model.
+
+    Memory: OrderedDict LRU of key -> (embedding, created), evicted by
+    count and TTL. Disk: one SQLite table shared by every process (WAL
+    mode), pruned by count and TTL. If the database can't be opened the
+    cache runs memory-only.
+    """
+
+    def __init__(self, model_name: str, path: Optional[str] = QUERY_CACHE_PATH,
+                 max_entries: int = MEMORY_ENTRIES, max_disk_entries: int = DISK_ENTRIES,
+                 ttl: float = TTL_SECONDS, lowercase: bool = True):
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.lowercase = lowercase
+        self.memory: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = self._open(path) if path else None
+
+    def _open(self, path: str) -> Optional[sqlite3.Connection]:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS query_embeddings ("
+                       "key BLOB PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, "
+                       "vector BLOB NOT NULL, created REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS query_embeddings_created ON query_embeddings (created)")
+            return db
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️  Query embedding cache {path} unavailable ({e}), using memory only", file=sys.stderr)
+            return None
+
+    def key(self, text: str) -> bytes:
+        return cache_key(self.model_name, normalize_query(text) if self.lowercase else text)
+
+    def _remember(self, key: bytes, embedding: np.ndarray, created: float):
+        self.memory[key] = (embedding, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _load(self, keys: List[bytes], now: float) -> Dict[bytes, tuple]:
+        """Fresh disk entries for keys (caller holds the lock)"""
+        found = {}
+        if self._db is None or not keys:
+            return found
+        try:
+            for start in range(0, len(keys), 500):  # Stay under SQLite's bound-parameter limit
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, dim, vector, created FROM query_embeddings WHERE key IN ({marks}) AND created > ?",
+                    chunk + [now - self.ttl])
+                for key, dim, vector, created in rows:
+                    found[bytes(key)] = (np.frombuffer(vector, dtype=np.float32, count=dim).copy(), created)
+        except sqlite3.Error as e:
+            print(f"⚠️  Query embedding cache read failed: {e}", file=sys.stderr)
+        return found
+
+    def _store(self, entries: Dict[bytes, np.ndarray], now: float):
+        """Write new entries to disk and prune now and then (caller holds the lock)"""
+        if self._db is None or not entries:
+            return
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (key, model, dim, vector, created) VALUES (?, ?, ?, ?, ?)",
+                [(key, self.model_name, int(e.shape[0]), e.astype(np.float32).tobytes(), now)
+                 for key, e in entries.items()])
+            self._writes += len(entries)
+            if self._writes >= PRUNE_EVERY:
+                self._writes = 0
+                self._prune(now)
+        except sqlite3.Error as e:
+            print(f"⚠️  Query embedding cache write failed: {e}", file=sys.stderr)
+
+    def _prune(self, now: float):
+        self._db.execute("DELETE FROM query_embeddings WHERE created <= ?", (now - self.ttl,))
+        self._db.execute("DELETE FROM query_embeddings WHERE key IN (SELECT key FROM query_embeddings "
+                         "ORDER BY created DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,))
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached embedding per text, or None"""
+        now = time.time()
+        keys = [self.key(t) for t in texts]
+        found: List[Optional[np.ndarray]] = [None] * len(texts)
+        with self._lock:
+            missing = []
+            for i, key in enumerate(keys):
+                entry = self.memory.get(key)
+                if entry is not None and now - entry[1] < self.ttl:
+                    self.memory.move_to_end(key)
+                    found[i] = entry[0]
+                    self.hits += 1
+                else:
+                    missing.append(i)
+            if missing:
+                loaded = self._load(list(dict.fromkeys(keys[i] for i in missing)), now)
+                for i in missing:
+                    entry = loaded.get(keys[i])
+                    if entry is not None:
+                        self._remember(keys[i], *entry)
+                        found[i] = entry[0]
+                        self.disk_hits += 1
+                    else:
+                        self.misses += 1
+        return found
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        now = time.time()
+        entries = {self.key(t): np.asarray(e, dtype=np.float32) for t, e in zip(texts, embeddings)}
+        with self._lock:
+            for key, embedding in entries.items():
+                self._remember(key, embedding, now)
+            self._store(entries, now)
+
+    def encode(self, texts: List[str], encoder: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embeddings for texts (float32 matrix, one row per text); only texts
+        missing from both levels reach `encoder`, deduplicated
+        """
+        texts = list(texts)
+        cached = self.get_many(texts)
+        misses: Dict[bytes, int] = {}
+        for i, embedding in enumerate(cached):
+            if embedding is None:
+                misses.setdefault(self.key(texts[i]), i)
+        if misses:
+            miss_texts = [texts[i] for i in misses.values()]
+            fresh = np.asarray(encoder(miss_texts), dtype=np.float32)
+            self.put_many(miss_texts, fresh)
+            by_key = dict(zip(misses, fresh))
+            cached = [e if e is not None else by_key[self.key(t)] for t, e in zip(texts, cached)]
+        if not cached:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(cached)
+
+    def encoder(self, encoder: Callable[[List[str]], np.ndarray]) -> Callable[[List[str]], np.ndarray]:
+        """Wrap an embed function (e.g. a LocalCollection embed_fn) with this cache"""
+        return lambda texts: self.encode(texts, encoder)
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM query_embeddings WHERE model = ?", (self.model_name,))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "model": self.model_name,
+                "memory_entries": len(self.memory),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "persistent": self._db is not None
+            }
+
+
+def get_cache(model_name: str, **kwargs) -> QueryEmbeddingCache:
+    """Process-wide cache for a model, so every tool in a process shares one LRU"""
+    with _caches_lock:
+        if model_name not in _caches:
+            _caches[model_name] = QueryEmbeddingCache(model_name, **kwargs)
+        return _caches[model_name]
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+RAG Query Client
+Thin stdlib-only client for query_server.py, so CLIs and evaluation
+scripts skip the per-invocation model and database load
+"""
+
+import os
+import sys
+import json
+import subprocess
+import tempfile
+import urllib.error
+import urllib.request
+from typing import List, Dict, Any, Optional
+
+# Configuration
+DEFAULT_SERVER_URL = os.environ.get("RAG_QUERY_SERVER", "http://127.0.0.1:8765")
+REQUEST_TIMEOUT = 60
+HYBRID_QUERY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hybrid_query.py")
+
+
+class QueryServerError(RuntimeError):
+    """The server answered with an error status"""
+
+
+def _request(url: str, payload: Optional[Dict[str, Any]] = None, timeout: float = REQUEST_TIMEOUT) -> Dict[str, Any]:
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error", e.reason)
+        except ValueError:
+            message = e.reason
+        raise QueryServerError(f"{e.code}: {message}") from None
+
+
+def server_available(server_url: str = DEFAULT_SERVER_URL, timeout: float = 1.0) -> bool:
+    """True if a query server answers /health at server_url"""
+    try:
+        return _request(server_url.rstrip('/') + "/health", timeout=timeout).get("status") == "ok"
+    except (OSError, ValueError, QueryServerError):
+        return False
+
+
+def search(query: str, top_k: int = 5, server_url: str = DEFAULT_SERVER_URL,
+           **params) -> Dict[str, Any]:
+    """
+    Run hybrid_search on the server. Extra keyword arguments
+    (vector_weight, bm25_weight, use_bm25, fusion, header_weight, use_cache) are
+    passed through. Returns {"query", "results", "timings", "latency_ms"}.
+    """
+    payload = {"query": query, "top_k": top_k}
+    payload.update(params)
+    return _request(server_url.rstrip('/') + "/search", payload)
+
+
+def search_batch(queries: List[str], top_k: int = 5, server_url: str = DEFAULT_SERVER_URL,
+                 **params) -> Dict[str, Any]:
+    """hybrid_search_batch on the server; returns {"results": [per-query lists], "latency_ms"}"""
+    payload = {"queries": list(queries), "top_k": top_k}
+    payload.update(params)
+    return _request(server_url.rstrip('/') + "/search_batch", payload)
+
+
+def reload_thesaurus(server_url: str = DEFAULT_SERVER_URL) -> Dict[str, Any]:
+    """Make the server swap in the current thesaurus; returns its info and build report"""
+    return _request(server_url.rstrip('/') + "/thesaurus/reload", {})
+
+
+def stats(server_url: str = DEFAULT_SERVER_URL) -> Dict[str, Any]:
+    return _request(server_url.rstrip('/') + "/stats")
+
+
+def search_results(query: str, top_k: int = 5, server_url: str = DEFAULT_SERVER_URL) -> List[Dict[str, Any]]:
+    """Just the result list, in hybrid_search's format"""
+    return search(query, top_k=top_k, server_url=server_url)["results"]
+
+
+_server_checks: Dict[str, bool] = {}
+
+
+def _local_search_batch(queries: List[str], top_k: int, params: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
+    """One `hybrid_query.py --batch-file -` run for every query (model and DB load once)"""
+    cmd = [sys.executable, HYBRID_QUERY_SCRIPT, "--batch-file", "-", "--top-k", str(top_k), "--details", "--quiet"]
+    for name in ("vector_weight", "bm25_weight", "header_weight", "fusion"):
+        if name in params:
+            cmd += ["--" + name.replace("_", "-"), str(params[name])]
+    if params.get("use_bm25") is False:
+        cmd.append("--no-bm25")
+    lines = "".join(json.dumps({"query": q}, ensure_ascii=False) + "\n" for q in queries)
+    # Results come back through a file: stdout may carry model/DB load messages
+    fd, output = tempfile.mkstemp(suffix=".jsonl")
+    os.close(fd)
+    try:
+        subprocess.run(cmd + ["--output", output], input=lines, text=True, check=True)
+        with open(output, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    finally:
+        os.remove(output)
+    return [record["results"] for record in records]
+
+
+def search_or_local(queries: List[str], top_k: int = 5, server_url: str = DEFAULT_SERVER_URL,
+                    **params) -> List[List[Dict[str, Any]]]:
+    """
+    Result lists for every query, in order: one /search_batch request when
+    a query server answers at server_url (checked once per URL), otherwise
+    one local hybrid_query.py batch run
+    """
+    if not queries:
+        return []
+    if server_url not in _server_checks:
+        _server_checks[server_url] = server_available(server_url)
+        if _server_checks[server_url]:
+            print(f"Using query server at {server_url}")
+    if _server_checks[server_url]:
+        return search_batch(queries, top_k=top_k, server_url=server_url, **params)["results"]
+    return _local_search_batch(queries, top_k, params)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+RAG Query Server
+Long-running HTTP daemon that loads the collection, embedding model and
+indexes once and serves hybrid_search requests concurrently
+
+Endpoints:
+  POST /search  {"query", "top_k", "vector_weight", "bm25_weight", "use_bm25",
+                 "fusion", "header_weight", "use_cache"}
+  POST /search_batch  same, with "queries": [...] instead of "query"
+  GET  /health
+  POST /thesaurus/reload  swap in the current thesaurus artifact/source
+  GET  /stats   request count, latency percentiles, thesaurus version and
+                query embedding / result cache hit rates
+
+The thesaurus is also reloaded automatically when its files change on disk.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts import hybrid_query
+from scripts import thesaurus
+from scripts.fusion import FUSION_METHODS
+from scripts.encoders import DEFAULT_ENCODER, ENCODERS, cache_name
+from scripts.query_cache import get_cache
+from scripts.search_backend import open_collection, VECTOR_STORE_PATH, MODEL_NAME
+
+# Configuration
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+LATENCY_WINDOW = 1000  # Requests kept for percentile stats
+THESAURUS_CHECK_SECONDS = 5.0  # How often requests stat the thesaurus files for changes
+FLAG_STRINGS = {"true": True, "1": True, "yes": True, "false": False, "0": False, "no": False}  # Boolean fields sent as strings
+
+
+def _flag(params: Dict[str, Any], name: str, default: bool) -> bool:
+    """A boolean request field: a JSON boolean or one of the usual string spellings, else ValueError (400)"""
+    value = params.get(name, default)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in FLAG_STRINGS:
+        return FLAG_STRINGS[value.strip().lower()]
+    raise ValueError(f"'{name}' must be a boolean")
+
+
+class QueryService:
+    """Holds the loaded collection and per-request latency stats"""
+
+    def __init__(self, collection, backend: str):
+        self.collection = collection
+        self.backend = backend
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.thesaurus_reloads = 0
+        self._next_thesaurus_check = 0.0
+        self._lock = threading.Lock()
+
+    def check_thesaurus(self):
+        """Hot-swap the thesaurus if it changed on disk; a broken edit keeps the old one"""
+        now = time.time()
+        with self._lock:
+            if now < self._next_thesaurus_check:
+                return
+            self._next_thesaurus_check = now + THESAURUS_CHECK_SECONDS
+        try:
+            if thesaurus.reload_if_changed():
+                with self._lock:
+                    self.thesaurus_reloads += 1
+                print(f"📖 Thesaurus reloaded ({thesaurus.current().source_hash[:12]})")
+        except (thesaurus.ThesaurusError, OSError) as e:
+            print(f"⚠️  Thesaurus reload failed, keeping current version: {e}")
+
+    def reload_thesaurus(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            loaded = thesaurus.reload()
+        except thesaurus.ThesaurusError as e:
+            raise ValueError(str(e)) from None
+        with self._lock:
+            self.thesaurus_reloads += 1
+        return {"thesaurus": loaded.info(), "report": loaded.report}
+
+    @staticmethod
+    def _search_kwargs(params: Dict[str, Any]) -> Dict[str, Any]:
+        fusion = params.get("fusion", hybrid_query.FUSION_DEFAULT)
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"'fusion' must be one of {FUSION_METHODS}")
+        return dict(
+            top_k=int(params.get("top_k", hybrid_query.TOP_K_DEFAULT)),
+            vector_weight=float(params.get("vector_weight", hybrid_query.VECTOR_WEIGHT)),
+            bm25_weight=float(params.get("bm25_weight", hybrid_query.BM25_WEIGHT)),
+            use_bm25=_flag(params, "use_bm25", True),
+            fusion=fusion,
+            header_weight=float(params.get("header_weight", hybrid_query.HEADER_WEIGHT)),
+            use_cache=_flag(params, "use_cache", True)
+        )
+
+    def search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        query = params.get("query")
+        if not query or not isinstance(query, str):
+            raise ValueError("'query' must be a non-empty string")
+        kwargs = self._search_kwargs(params)
+        self.check_thesaurus()
+
+        start = time.time()
+        timings = {}
+        results = hybrid_query.hybrid_search(self.collection, query, timings=timings, **kwargs)
+        latency_ms = (time.time() - start) * 1000
+        self.record(latency_ms)
+        return {"query": query, "results": results, "timings": timings, "latency_ms": round(latency_ms, 2)}
+
+    def search_batch(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        queries = params.get("queries")
+        if not isinstance(queries, list) or not all(isinstance(q, str) and q for q in queries):
+            raise ValueError("'queries' must be a list of non-empty strings")
+        kwargs = self._search_kwargs(params)
+        self.check_thesaurus()
+
+        start = time.time()
+        timings = {}
+        results = hybrid_query.hybrid_search_batch(self.collection, queries, timings=timings, **kwargs)
+        latency_ms = (time.time() - start) * 1000
+        self.record(latency_ms)
+        return {"results": results, "timings": timings, "latency_ms": round(latency_ms, 2)}
+
+    def record(self, latency_ms: float, failed: bool = False):
+        with self._lock:
+            self.requests += 1
+            if failed:
+                self.errors += 1
+            else:
+                self.latencies.append(latency_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            requests, errors = self.requests, self.errors
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2)
+
+        return {
+            "backend": self.backend,
+            "encoder": hybrid_query.encoder_kind(),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "requests": requests,
+            "errors": errors,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99)
+            },
+            "thesaurus": dict(thesaurus.current().info(), reloads=self.thesaurus_reloads),
+            "query_embedding_cache": get_cache(cache_name(hybrid_query.encoder_kind(), MODEL_NAME)).stats(),
+            "result_cache": hybrid_query.result_cache().stats()
+        }
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    server_version = "RAGQueryServer/1.0"
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload, default=float).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if "latency_ms" in payload:
+            self.send_header("X-Response-Time-Ms", str(payload["latency_ms"]))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service: QueryService = self.server.service
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "collection": service.collection.name,
+                                  "count": service.collection.count()})
+        elif self.path == "/stats":
+            self._send_json(200, service.stats())
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        service: QueryService = self.server.service
+        handlers = {"/search": service.search, "/search_batch": service.search_batch,
+                    "/thesaurus/reload": service.reload_thesaurus}
+        if self.path not in handlers:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        start = time.time()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            params = json.loads(self.rfile.read(length) or b"{}")
+            self._send_json(200, handlers[self.path](params))
+        except ValueError as e:
+            service.record((time.time() - start) * 1000, failed=True)
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            service.record((time.time() - start) * 1000, failed=True)
+            self._send_json(500, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent RAG query server")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Bind address")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Bind port")
+    parser.add_argument("--backend", choices=["chroma", "exact", "ivf"], default="chroma",
+                        help="Vector search backend")
+    parser.add_argument("--vector-store", default=VECTOR_STORE_PATH, help="Vector store directory for exact/ivf")
+    parser.add_argument("--encoder", choices=ENCODERS, default=DEFAULT_ENCODER,
+                        help="Query embedding backend (onnx-int8: quantized ONNX Runtime, CPU)")
+    parser.add_argument("--quiet", action="store_true", help="Disable per-request access logs")
+    args = parser.parse_args()
+
+    hybrid_query.set_encoder(args.encoder)
+    print(f"🚀 Loading collection ({args.backend}, {args.encoder} encoder)...")
+    start = time.time()
+    collection = open_collection(
+        args.backend,
+        vector_store_path=args.vector_store,
+        chroma_path=hybrid_query.CHROMA_DB_PATH,
+        collection_name=hybrid_query.COLLECTION_NAME,
+        embed_fn=hybrid_query.query_encoder()
+    )
+    service = QueryService(collection, args.backend)
+
+    # Warm up the embedding model and indexes before accepting traffic
+    service.search({"query": "warm up", "top_k": 1})
+    print(f"   ✓ Ready in {time.time() - start:.1f}s ({collection.count():,} chunks)")
+
+    server = ThreadingHTTPServer((args.host, args.port), QueryRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.quiet = args.quiet
+    print(f"🔍 Serving on http://{args.host}:{args.port} (POST /search, POST /search_batch, POST /thesaurus/reload, "
+          f"GET /health, GET /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Hybrid Search Result Cache
+LRU of final hybrid_search result lists keyed by normalized query, search
+parameters and the corpus / thesaurus versions they were computed against
+"""
+
+import os
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from scripts.query_cache import normalize_query
+
+# Configuration
+RESULT_CACHE_ENTRIES = int(os.environ.get("RAG_RESULT_CACHE_ENTRIES", "2048"))
+
+
+def copy_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Deep copy of a result list: results nest dicts (metadata, ranks)"""
+    return copy.deepcopy(results)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU of result lists. Entries are keyed by version too, so a
+    new corpus or thesaurus version never serves old results;
+    invalidate() additionally frees the old entries at once.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple, List[Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query: str, params: Tuple, *versions: Hashable) -> Tuple:
+        return (normalize_query(query), params) + versions
+
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        """A copy of the cached results (callers may annotate them), or None"""
+        with self._lock:
+            results = self.entries.get(key)
+            if results is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return copy_results(results)
+
+    def put(self, key: Tuple, results: List[Dict[str, Any]]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self.entries[key] = copy_results(results)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self.entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
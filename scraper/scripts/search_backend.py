@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Vector Search Backends
+Pure-NumPy top-k cosine search over a memory-mapped VectorStore:
+exact batched matmul + argpartition, and an IVF (k-means coarse quantizer)
+index for sub-linear search. LocalCollection wraps either one behind the
+subset of the Chroma collection API the query tools use.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.vector_store import VectorStore, SCORE_BLOCK_ROWS
+
+# Configuration
+CHROMA_DB_PATH = "/home/rag_cache/chroma_db"
+COLLECTION_NAME = "huawei_docs"
+VECTOR_STORE_PATH = "/home/rag_cache/vector_store"
+MODEL_NAME = "all-MiniLM-L6-v2"
+IVF_NPROBE = 16
+KMEANS_ITERATIONS = 20
+KMEANS_SAMPLE = 100_000
+
+
+def topk(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise top-k of a (n_q x n) score matrix, sorted descending"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+class SearchBackend(ABC):
+    """Returns (row indices, cosine scores), each of shape (n_queries, k)"""
+
+    name = "base"
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+
+    @abstractmethod
+    def search(self, queries: np.ndarray, k: int,
+               allowed_rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows per query, optionally restricted to `allowed_rows`"""
+
+
+class ExactBackend(SearchBackend):
+    """
+    Brute-force inner-product search. Rows are scored block by block and
+    a running top-k is kept, so memory is O(n_queries x block).
+    """
+
+    name = "exact"
+
+    def search(self, queries, k, allowed_rows=None):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if allowed_rows is not None:
+            return self._search_rows(queries, k, np.asarray(allowed_rows, dtype=np.int64))
+
+        best_idx = np.zeros((queries.shape[0], 0), dtype=np.int64)
+        best_scores = np.zeros((queries.shape[0], 0), dtype=np.float32)
+        for start in range(0, self.store.count, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, self.store.count)
+            block_idx, block_scores = topk(self.store.scores(queries, start, end), k)
+            merged_idx = np.concatenate([best_idx, block_idx + start], axis=1)
+            merged_scores = np.concatenate([best_scores, block_scores], axis=1)
+            order_idx, best_scores = topk(merged_scores, k)
+            best_idx = np.take_along_axis(merged_idx, order_idx, axis=1)
+        return best_idx, best_scores
+
+    def _search_rows(self, queries, k, rows):
+        if len(rows) == 0:
+            return topk(np.zeros((queries.shape[0], 0), dtype=np.float32), k)
+        scores = queries @ self.store.get_rows(rows).T
+        local_idx, top_scores = topk(scores, k)
+        return rows[local_idx], top_scores
+
+
+class IVFBackend(SearchBackend):
+    """
+    Inverted-file index: k-means centroids partition the rows; a query only
+    scores rows in its `nprobe` closest lists. The trained index is stored
+    next to the vectors (ivf.json, ivf_centroids.f32, ivf_rows.i64,
+    ivf_offsets.i64) and reused while the store row count matches.
+    """
+
+    name = "ivf"
+
+    def __init__(self, store: VectorStore, nlist: Optional[int] = None, nprobe: int = IVF_NPROBE,
+                 rebuild: bool = False):
+        super().__init__(store)
+        self.nlist = nlist or max(1, int(4 * np.sqrt(store.count)))
+        self.nprobe = nprobe
+        self._exact = ExactBackend(store)
+        if rebuild or not self._load():
+            self._train()
+            self._save()
+
+    def _paths(self) -> Dict[str, str]:
+        return {name: os.path.join(self.store.path, name)
+                for name in ("ivf.json", "ivf_centroids.f32", "ivf_rows.i64", "ivf_offsets.i64")}
+
+    def _load(self) -> bool:
+        paths = self._paths()
+        if not os.path.exists(paths["ivf.json"]):
+            return False
+        with open(paths["ivf.json"], 'r') as f:
+            meta = json.load(f)
+        if meta.get("count") != self.store.count or meta.get("dim") != self.store.dim:
+            return False
+        self.nlist = meta["nlist"]
+        self.centroids = np.fromfile(paths["ivf_centroids.f32"], dtype=np.float32).reshape(self.nlist, self.store.dim)
+        self.list_rows = np.memmap(paths["ivf_rows.i64"], dtype=np.int64, mode='r')
+        self.list_offsets = np.fromfile(paths["ivf_offsets.i64"], dtype=np.int64)
+        return True
+
+    def _save(self):
+        paths = self._paths()
+        self.centroids.astype(np.float32).tofile(paths["ivf_centroids.f32"])
+        self.list_rows.astype(np.int64).tofile(paths["ivf_rows.i64"])
+        self.list_offsets.astype(np.int64).tofile(paths["ivf_offsets.i64"])
+        with open(paths["ivf.json"], 'w') as f:
+            json.dump({"nlist": self.nlist, "count": self.store.count, "dim": self.store.dim}, f)
+
+    def _assign(self, rows_start: int, rows_end: int) -> np.ndarray:
+        vectors = self.store.get_rows(np.arange(rows_start, rows_end))
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def _train(self):
+        """Spherical k-means on a sample, then assign every row to its closest centroid"""
+        count = self.store.count
+        self.nlist = min(self.nlist, max(1, count))
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(count, size=min(count, KMEANS_SAMPLE), replace=False))
+        sample = self.store.get_rows(sample_rows)
+        self.centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ self.centroids.T, axis=1)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Re-seed empty lists from random sample points
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            norms[empty] = np.linalg.norm(sums[empty], axis=1, keepdims=True)
+            self.centroids = sums / np.maximum(norms, 1e-12)
+
+        assignment = np.concatenate([
+            self._assign(start, min(start + SCORE_BLOCK_ROWS, count))
+            for start in range(0, count, SCORE_BLOCK_ROWS)
+        ]) if count else np.zeros(0, dtype=np.int64)
+        self.list_rows = np.argsort(assignment, kind='stable').astype(np.int64)
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=self.nlist))])
+
+    def search(self, queries, k, allowed_rows=None):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if allowed_rows is not None:
+            # Filters are usually selective; the exact path over them is cheap
+            return self._exact.search(queries, k, allowed_rows)
+
+        nprobe = min(self.nprobe, self.nlist)
+        probe_idx, _ = topk(queries @ self.centroids.T, nprobe)
+        all_idx = np.zeros((queries.shape[0], k), dtype=np.int64)
+        all_scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        for qi, lists in enumerate(probe_idx):
+            candidates = np.concatenate([
+                self.list_rows[self.list_offsets[l]:self.list_offsets[l + 1]] for l in lists
+            ])
+            if len(candidates) == 0:
+                continue
+            idx, scores = topk((queries[qi:qi + 1] @ self.store.get_rows(candidates).T), k)
+            all_idx[qi, :idx.shape[1]] = candidates[idx[0]]
+            all_scores[qi, :idx.shape[1]] = scores[0]
+        return all_idx, all_scores
+
+
+def recall_at_k(backend: SearchBackend, exact: ExactBackend, queries: np.ndarray, k: int) -> float:
+    """Mean fraction of the exact top-k that the backend also returns"""
+    approx_idx, _ = backend.search(queries, k)
+    exact_idx, _ = exact.search(queries, k)
+    hits = [len(set(a.tolist()) & set(e.tolist())) / max(1, len(e)) for a, e in zip(approx_idx, exact_idx)]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def make_backend(name: str, store: VectorStore, nprobe: int = IVF_NPROBE) -> SearchBackend:
+    if name == "exact":
+        return ExactBackend(store)
+    if name == "ivf":
+        return IVFBackend(store, nprobe=nprobe)
+    raise ValueError(f"Unknown backend {name!r}")
+
+
+class LocalCollection:
+    """
+    Chroma-compatible facade (count/get/query) over a VectorStore and a
+    SearchBackend, so query tools can run without a Chroma database.
+    Distances are cosine distances (1 - similarity), like "hnsw:space": "cosine".
+    """
+
+    def __init__(self, store: VectorStore, backend: SearchBackend,
+                 embed_fn: Optional[Callable[[List[str]], np.ndarray]] = None, name: str = COLLECTION_NAME):
+        if not store.has_documents:
+            raise ValueError(f"Vector store {store.path} was built without documents")
+        self.store = store
+        self.backend = backend
+        self.embed_fn = embed_fn
+        self.name = name
+        self.metadata = {key: value for key, value in store.header.items()
+                         if key not in ("version", "dtype", "dim", "count", "has_documents")}
+        self._metadata_index: Dict[str, Dict[Any, np.ndarray]] = {}
+        self._index_lock = threading.Lock()
+
+    def count(self) -> int:
+        return self.store.count
+
+    def _column_index(self, key: str) -> Dict[Any, np.ndarray]:
+        """
+        value -> sorted rows for one metadata key. Built with a single pass
+        over the stored records the first time the key is filtered on, so
+        later filters never parse documents again.
+        """
+        index = self._metadata_index.get(key)
+        if index is not None:
+            return index
+        with self._index_lock:
+            if key not in self._metadata_index:
+                rows_by_value = defaultdict(list)
+                for row in range(self.store.count):
+                    value = self.store.record(row)["metadata"].get(key)
+                    if value is not None:
+                        rows_by_value[value].append(row)
+                self._metadata_index[key] = {value: np.asarray(rows, dtype=np.int64)
+                                             for value, rows in rows_by_value.items()}
+            return self._metadata_index[key]
+
+    def _rows_for_where(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Rows whose metadata equals every key/value in a flat `where` filter"""
+        if not where:
+            return None
+        rows = None
+        for key, value in where.items():
+            matches = self._column_index(key).get(value, np.zeros(0, dtype=np.int64))
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+        return rows
+
+    def query(self, query_texts: Optional[List[str]] = None, query_embeddings=None,
+              n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None) -> Dict[str, List]:
+        if query_embeddings is None:
+            if self.embed_fn is None:
+                raise ValueError("query_texts needs an embed_fn")
+            query_embeddings = self.embed_fn(list(query_texts))
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+
+        rows, scores = self.backend.search(queries, n_results, self._rows_for_where(where))
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for row_list, score_list in zip(rows, scores):
+            valid = [(int(r), float(s)) for r, s in zip(row_list, score_list) if np.isfinite(s)]
+            records = [self.store.record(r) for r, _ in valid]
+            result["ids"].append([self.store.id_at(r) for r, _ in valid])
+            result["documents"].append([rec["document"] for rec in records])
+            result["metadatas"].append([rec["metadata"] for rec in records])
+            result["distances"].append([1.0 - s for _, s in valid])
+        return result
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None,
+            limit: Optional[int] = None, offset: int = 0, where: Optional[Dict[str, Any]] = None) -> Dict[str, List]:
+        include = include or ["documents", "metadatas"]
+        if ids is not None:
+            rows = [r for r in (self.store.row_of(i) for i in ids) if r is not None]
+        else:
+            filtered = self._rows_for_where(where)
+            rows = list(range(self.store.count)) if filtered is None else filtered.tolist()
+            rows = rows[offset:offset + limit if limit is not None else None]
+        records = [self.store.record(r) for r in rows]
+        result = {"ids": [self.store.id_at(r) for r in rows]}
+        if "documents" in include:
+            result["documents"] = [rec["document"] for rec in records]
+        if "metadatas" in include:
+            result["metadatas"] = [rec["metadata"] for rec in records]
+        if "embeddings" in include:
+            result["embeddings"] = self.store.get_rows(rows) if rows else np.zeros((0, self.store.dim), dtype=np.float32)
+        return result
+
+
+def open_collection(backend: str = "chroma", vector_store_path: str = VECTOR_STORE_PATH,
+                    chroma_path: str = CHROMA_DB_PATH, collection_name: str = COLLECTION_NAME,
+                    embed_fn: Optional[Callable[[List[str]], np.ndarray]] = None, nprobe: int = IVF_NPROBE):
+    """Open either the Chroma collection or a LocalCollection over the vector store"""
+    if backend == "chroma":
+        import chromadb
+        client = chromadb.PersistentClient(path=chroma_path)
+        return client.get_collection(name=collection_name)
+    store = VectorStore(vector_store_path)
+    return LocalCollection(store, make_backend(backend, store, nprobe), embed_fn, collection_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NumPy vector search backends")
+    parser.add_argument("--vector-store", default=VECTOR_STORE_PATH, help="Vector store directory")
+    parser.add_argument("--top-k", type=int, default=10, help="k for recall@k")
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled query vectors")
+    parser.add_argument("--nprobe", type=int, default=IVF_NPROBE, help="IVF lists probed per query")
+    parser.add_argument("--rebuild", action="store_true", help="Retrain the IVF index")
+    args = parser.parse_args()
+
+    store = VectorStore(args.vector_store)
+    print(f"Store: {store.count:,} x {store.dim} {store.dtype} ({store.nbytes() / 1e6:.1f} MB)")
+
+    # Perturbed stored vectors stand in for real queries
+    rng = np.random.default_rng(1)
+    rows = rng.choice(store.count, size=min(args.queries, store.count), replace=False)
+    queries = store.get_rows(rows) + rng.normal(scale=0.05, size=(len(rows), store.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact = ExactBackend(store)
+    start = time.time()
+    ivf = IVFBackend(store, nprobe=args.nprobe, rebuild=args.rebuild)
+    print(f"IVF index: {ivf.nlist} lists, nprobe={ivf.nprobe} (ready in {time.time() - start:.1f}s)")
+
+    for backend in (exact, ivf):
+        start = time.time()
+        backend.search(queries, args.top_k)
+        per_query = (time.time() - start) / len(queries) * 1000
+        print(f"{backend.name:6s}: {per_query:.2f} ms/query (batched)")
+    print(f"IVF recall@{args.top_k} vs exact: {recall_at_k(ivf, exact, queries, args.top_k):.3f}")
+
+
+if __name__ == "__main__":
+    main()
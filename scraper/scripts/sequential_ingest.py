@@ -9,12 +9,20 @@ import sys
 import json
 import glob
 import time
-import re
 import hashlib
+import argparse
 from pathlib import Path
 from tqdm import tqdm
 import chromadb
-from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.chunk_model import ChunkBatch
+from scripts.ingest_manifest import IngestManifest, delete_ids
+from scripts.embedding_cache import EmbeddingCache
+from scripts.encode_scheduler import TOKEN_BUDGET, TokenBudgetScheduler
+from scripts.encoders import DEFAULT_ENCODER, ENCODERS, cache_name, load_encoder
+from scripts.md_splitter import SPLITTER_VERSION, split_document
 
 # Configuration
 CHROMA_DB_PATH = "/home/rag_cache/chroma_db"
@@ -24,90 +32,68 @@ MODEL_NAME = "all-MiniLM-L6-v2"
 BATCH_SIZE = 256
 MAX_CHUNK_SIZE = 1500
 MIN_CHUNK_SIZE = 200
+EMBEDDING_CACHE_DIR = "/home/rag_cache/embedding_cache"
+MANIFEST_PATH = os.path.join(os.path.dirname(CHROMA_DB_PATH), f"ingest_manifest_{COLLECTION_NAME}.json")
 
-def simple_tokenize(text):
-    return text.replace(r'[^\w\s]', ' ').split()
-
-def extract_headers(content):
-    headers = []
-    pos = 0
-    for line in content.split('\n'):
-        match = re.match(r'^(#{1,6})\s+(.+)$', line)
-        if match:
-            headers.append((len(match.group(1)), match.group(2).strip(), pos))
-        pos += len(line) + 1
-    return headers
-
-def split_by_headers(content, headers):
-    if not headers:
-        return [([], content.strip())]
+def chunk_document(file_path, service, page_id, url):
+    """Process a single document into chunks; read errors propagate to the caller"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
     
-    sections = []
-    header_stack = []
+    chunks = ChunkBatch()
+    path_hash = hashlib.md5(file_path.encode()).hexdigest()[:8]
     
-    for i, (level, text, position) in enumerate(headers):
-        while header_stack and header_stack[-1][0] >= level:
-            header_stack.pop()
-        header_stack.append((level, text))
+    # Just store the full section (no splitting for now to keep it simple)
+    for headers, clean_content, tokens in split_document(content, None, MIN_CHUNK_SIZE):
+        chunk_index = len(chunks)
+        content_hash = hashlib.md5(clean_content[:100].encode()).hexdigest()[:8]
         
-        start = content.find(text, position) + len(text)
-        end = headers[i + 1][2] if i + 1 < len(headers) else len(content)
-        section_content = content[start:end].strip()
-        
-        if section_content:
-            header_text = '\n'.join(['#' * h[0] + ' ' + h[1] for h in header_stack])
-            sections.append((header_stack.copy(), header_text + '\n\n' + section_content))
+        chunks.append(
+            id=f"chunk_{path_hash}_{content_hash}_{chunk_index}",
+            content=clean_content,
+            service=service,
+            page_id=page_id,
+            headers=headers,
+            url=url,
+            position=chunk_index,
+            token_count=tokens
+        )
     
-    return sections if sections else [([], content.strip())]
+    return chunks
 
-def chunk_document(file_path, service, page_id, url):
-    """Process a single document into chunks"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        headers = extract_headers(content)
-        sections = split_by_headers(content, headers)
-        
-        chunks = []
-        chunk_index = 0
-        
-        for header_stack, section_content in sections:
-            tokens = len(simple_tokenize(section_content))
-            
-            if tokens < MIN_CHUNK_SIZE:
-                continue
-            
-            # Just store the full section (no splitting for now to keep it simple)
-            header_text = '\n'.join(['#' * h[0] + ' ' + h[1] for h in header_stack])
-            clean_content = re.sub(r'\n{3,}', '\n\n', re.sub(r'\s+', ' ', header_text + '\n\n' + section_content)).strip()
-            
-            content_hash = hashlib.md5(clean_content[:100].encode()).hexdigest()[:8]
-            path_hash = hashlib.md5(file_path.encode()).hexdigest()[:8]
-            
-            chunks.append({
-                'id': f"chunk_{path_hash}_{content_hash}_{chunk_index}",
-                'content': clean_content,
-                'service': service,
-                'page_id': page_id,
-                'headers': json.dumps([h[1] for h in header_stack]),
-                'url': url,
-                'position': chunk_index,
-                'token_count': tokens
-            })
-            chunk_index += 1
-        
-        return chunks
-    except Exception as e:
-        print(f"Error: {file_path}: {e}")
-        return []
+def manifest_params(encoder: str = "torch"):
+    """Settings that change chunk ids or vectors; a mismatch forces a full rebuild"""
+    return {
+        "ingester": "sequential_ingest",
+        "collection": COLLECTION_NAME,
+        "model": cache_name(encoder, MODEL_NAME),
+        "max_chunk_size": MAX_CHUNK_SIZE,
+        "min_chunk_size": MIN_CHUNK_SIZE,
+        "splitter": SPLITTER_VERSION
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sequential RAG Document Processor")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-ingest files added, changed or removed since the last run")
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="Always run the model instead of reusing cached chunk embeddings")
+    parser.add_argument("--encoder", choices=ENCODERS, default=DEFAULT_ENCODER,
+                        help="Embedding backend (onnx-int8: quantized ONNX Runtime, CPU; see encoders.py)")
+    parser.add_argument("--token-budget", type=int, default=TOKEN_BUDGET,
+                        help="Padded tokens per encode batch; chunks are batched by tokenized length "
+                             "(0: fixed-size batches)")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    
     print("=" * 80)
     print("RAG Sequential Document Processor")
     print("=" * 80)
-    print(f"Model: {MODEL_NAME}")
+    print(f"Model: {MODEL_NAME} ({args.encoder})")
     print(f"Batch size: {BATCH_SIZE}")
+    print(f"Mode: {'incremental' if args.incremental else 'full rebuild'}")
     print()
     
     # Find all documents
@@ -117,39 +103,72 @@ def main():
     print(f"Found {len(all_files):,} documents")
     print()
     
+    # Initialize ChromaDB
+    print("Initializing ChromaDB...")
+    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    
+    manifest = IngestManifest(MANIFEST_PATH, DOCS_PATH, manifest_params(args.encoder))
+    incremental = args.incremental
+    if incremental and not manifest.load():
+        print("No compatible manifest found, falling back to full rebuild")
+        incremental = False
+    
+    if incremental:
+        collection = client.get_or_create_collection(
+            name=COLLECTION_NAME,
+            metadata={"hnsw:space": "cosine"}
+        )
+        print(f"Collection '{COLLECTION_NAME}' opened ({collection.count():,} vectors)")
+    else:
+        try:
+            client.delete_collection(COLLECTION_NAME)
+            print("Deleted existing collection")
+        except:
+            pass
+        
+        collection = client.create_collection(
+            name=COLLECTION_NAME,
+            metadata={"hnsw:space": "cosine"}
+        )
+        print(f"Collection '{COLLECTION_NAME}' created")
+        manifest.reset()
+    print()
+    
+    # Work out which files need (re-)processing
+    diff = manifest.diff(all_files)
+    summary = diff.summary()
+    print(f"Added: {summary['added']:,}  Changed: {summary['changed']:,}  "
+          f"Removed: {summary['removed']:,}  Unchanged: {summary['unchanged']:,}")
+    
+    stale_ids = manifest.stale_chunk_ids(diff)
+    if stale_ids:
+        print(f"Deleting {len(stale_ids):,} stale chunks...")
+        delete_ids(collection, stale_ids)
+    manifest.forget(diff.removed)
+    print()
+    
     # Group by service
     service_files = {}
-    for f in all_files:
+    for f in diff.to_process():
         relative_path = os.path.relpath(f, DOCS_PATH)
         service = relative_path.split(os.sep)[0]
         if service not in service_files:
             service_files[service] = []
         service_files[service].append(f)
     
-    print(f"Found {len(service_files)} services")
-    print()
-    
-    # Initialize ChromaDB
-    print("Initializing ChromaDB...")
-    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-    
-    try:
-        client.delete_collection(COLLECTION_NAME)
-        print("Deleted existing collection")
-    except:
-        pass
-    
-    collection = client.create_collection(
-        name=COLLECTION_NAME,
-        metadata={"hnsw:space": "cosine"}
-    )
-    print(f"Collection '{COLLECTION_NAME}' created")
+    print(f"Found {len(service_files)} services to process")
     print()
     
     # Load model
-    print(f"Loading embedding model: {MODEL_NAME}...")
-    model = SentenceTransformer(MODEL_NAME)
+    print(f"Loading embedding model: {MODEL_NAME} ({args.encoder})...")
+    model = load_encoder(args.encoder, MODEL_NAME)
+    if args.token_budget > 0:
+        model = TokenBudgetScheduler(model, args.token_budget)
     print("Model loaded!")
+    embedding_cache = None
+    if not args.no_embedding_cache:
+        embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIR, model.cache_name)
+        print(f"Embedding cache: {EMBEDDING_CACHE_DIR} ({embedding_cache.rows:,} cached)")
     print()
     
     # Process all services
@@ -166,7 +185,8 @@ def main():
     for service_idx, (service, files) in enumerate(service_list, 1):
         print(f"[{service_idx}/{len(service_list)}] Service: {service} ({len(files)} docs)")
         
-        service_chunks = []
+        service_chunks = ChunkBatch()
+        service_file_chunk_ids = {}
         
         # Process all files in service
         for file_path in tqdm(files, desc="  Chunking", leave=False):
@@ -186,16 +206,19 @@ def main():
                 # Chunk document
                 chunks = chunk_document(file_path, service, page_id, url)
                 service_chunks.extend(chunks)
+                service_file_chunk_ids[file_path] = chunks.ids
                 total_processed += 1
             except Exception as e:
                 total_failed += 1
                 print(f"  Error: {file_path}: {e}")
+                # Keep no entry for it, so the next --incremental run retries the file
+                manifest.forget([manifest.relpath(file_path)])
         
         # Generate embeddings and add to ChromaDB
         if service_chunks:
             print(f"  Embedding {len(service_chunks)} chunks...")
             
-            texts = [c['content'] for c in service_chunks]
+            texts = service_chunks.contents
             
             # Process in batches
             for i in tqdm(range(0, len(texts), BATCH_SIZE), desc="  Embedding", leave=False):
@@ -203,28 +226,30 @@ def main():
                 batch_chunks = service_chunks[i:i+BATCH_SIZE]
                 
                 # Generate embeddings
-                embeddings = model.encode(batch_texts, show_progress_bar=False)
+                if embedding_cache:
+                    embeddings = embedding_cache.encode(model, batch_texts)
+                else:
+                    embeddings = model.encode(batch_texts, show_progress_bar=False)
                 
-                # Add to ChromaDB
-                collection.add(
-                    ids=[c['id'] for c in batch_chunks],
-                    documents=[c['content'] for c in batch_chunks],
+                # Upsert so re-ingested chunks with unchanged ids are replaced
+                collection.upsert(
+                    ids=batch_chunks.ids,
+                    documents=batch_chunks.contents,
                     embeddings=embeddings.tolist(),
-                    metadatas=[{
-                        "service": c['service'],
-                        "page_id": c['page_id'],
-                        "headers": c['headers'],
-                        "url": c['url'],
-                        "position": c['position'],
-                        "token_count": c['token_count']
-                    } for c in batch_chunks]
+                    metadatas=batch_chunks.chroma_metadatas()
                 )
             
             total_chunks += len(service_chunks)
             print(f"  ✓ Complete: {len(service_chunks)} chunks (total: {total_chunks})")
         
+        text_by_id = dict(zip(service_chunks.ids, service_chunks.contents))
+        for file_path, chunk_ids in service_file_chunk_ids.items():
+            manifest.record(file_path, chunk_ids, [text_by_id[i] for i in chunk_ids])
+        manifest.save()
+        
         print()
     
+    manifest.save()
     elapsed = time.time() - start_time
     
     # Summary
@@ -239,6 +264,12 @@ def main():
     # Get collection stats
     count = collection.count()
     print(f"Collection size: {count:,} vectors")
+    if embedding_cache:
+        cache_stats = embedding_cache.stats()
+        print(f"Embedding cache: {cache_stats['hits']:,} hits, {cache_stats['misses']:,} misses "
+              f"({cache_stats['hit_rate']*100:.1f}% hit rate)")
+    if isinstance(model, TokenBudgetScheduler):
+        print(f"Encoding: {model.summary()}")
     
     # Save stats
     stats = {
@@ -247,7 +278,12 @@ def main():
         "failed_documents": total_failed,
         "elapsed_seconds": elapsed,
         "docs_per_second": total_processed / elapsed if elapsed > 0 else 0,
-        "collection_size": count
+        "collection_size": count,
+        "mode": "incremental" if incremental else "full",
+        "files": summary,
+        "deleted_chunks": len(stale_ids),
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+        "encoding": model.stats() if isinstance(model, TokenBudgetScheduler) else None
     }
     
     with open(os.path.join(CHROMA_DB_PATH, "..", "ingestion_stats.json"), "w") as f:
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Shared-Memory Columnar Batches
+Chunking workers pack a batch of rows column by column into one
+multiprocessing.shared_memory segment: int columns as int64 arrays, text
+columns as a character-offset array plus one UTF-8 blob, and JSON columns
+(lists / dicts) the same way after json.dumps. Only a small
+SharedColumns handle goes back through the pool, so results cross the
+process boundary without pickling each chunk; the parent reads the
+columns and unlinks the segment.
+
+Standard library only, like fast_chunker: it is imported by pool workers.
+"""
+
+import json
+import time
+from array import array
+from itertools import accumulate
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+COLUMN_KINDS = ("str", "int", "json")
+ALIGN = 8
+
+
+def ensure_tracker():
+    """
+    Start the resource tracker in the parent before creating a pool, so
+    every worker shares it: segments a worker creates are then released
+    by the parent's unlink instead of being reported as leaked when the
+    worker exits.
+    """
+    resource_tracker.ensure_running()
+
+
+def _aligned(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+class SharedColumns:
+    """Picklable handle to a packed batch: segment name plus column layout"""
+    __slots__ = ("name", "rows", "layout", "nbytes", "pack_seconds")
+
+    def __init__(self, name: Optional[str], rows: int, layout: List[Tuple[str, str, int, int, int]],
+                 nbytes: int, pack_seconds: float):
+        self.name = name
+        self.rows = rows
+        self.layout = layout  # (column, kind, offsets start, data start, data bytes)
+        self.nbytes = nbytes
+        self.pack_seconds = pack_seconds
+
+    def __getstate__(self):
+        return (self.name, self.rows, self.layout, self.nbytes, self.pack_seconds)
+
+    def __setstate__(self, state):
+        self.name, self.rows, self.layout, self.nbytes, self.pack_seconds = state
+
+    def load(self, unlink: bool = True) -> Dict[str, List[Any]]:
+        """Read every column back into Python lists; frees the segment unless unlink=False"""
+        if self.name is None:
+            return {column: [] for column, *_ in self.layout}
+        shm = shared_memory.SharedMemory(name=self.name)
+        try:
+            buf = shm.buf
+            columns: Dict[str, List[Any]] = {}
+            for column, kind, offsets_at, data_at, data_bytes in self.layout:
+                if kind == "int":
+                    columns[column] = buf[data_at:data_at + 8 * self.rows].cast('q').tolist()
+                    continue
+                bounds = buf[offsets_at:offsets_at + 8 * (self.rows + 1)].cast('q').tolist()
+                text = bytes(buf[data_at:data_at + data_bytes]).decode('utf-8')
+                values = [text[bounds[i]:bounds[i + 1]] for i in range(self.rows)]
+                columns[column] = [json.loads(v) for v in values] if kind == "json" else values
+            del buf
+        finally:
+            shm.close()
+            if unlink:
+                shm.unlink()
+        return columns
+
+    def discard(self):
+        """Free the segment without reading it (e.g. when the run aborts)"""
+        if self.name is None:
+            return
+        try:
+            shm = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+
+
+def pack(columns: Dict[str, List[Any]], schema: Dict[str, str]) -> SharedColumns:
+    """Pack equal-length columns (kinds from `schema`: str / int / json) into a new segment"""
+    start = time.time()
+    rows = len(next(iter(columns.values()))) if columns else 0
+
+    encoded = []  # (column, kind, offsets bytes or None, data bytes)
+    for column, kind in schema.items():
+        values = columns[column]
+        if len(values) != rows:
+            raise ValueError(f"Column '{column}' has {len(values)} rows, expected {rows}")
+        if kind == "int":
+            encoded.append((column, kind, None, array('q', values).tobytes()))
+            continue
+        if kind == "json":
+            values = [json.dumps(v, ensure_ascii=False, separators=(',', ':')) for v in values]
+        elif kind != "str":
+            raise ValueError(f"Unknown column kind '{kind}' (expected one of {', '.join(COLUMN_KINDS)})")
+        offsets = array('q', [0])
+        offsets.extend(accumulate(len(v) for v in values))
+        encoded.append((column, kind, offsets.tobytes(), "".join(values).encode('utf-8')))
+
+    layout = []
+    size = 0
+    for column, kind, offsets, data in encoded:
+        offsets_at = size
+        size = _aligned(size + len(offsets or b""))
+        layout.append((column, kind, offsets_at, size, len(data)))
+        size = _aligned(size + len(data))
+
+    if rows == 0 or size == 0:
+        return SharedColumns(None, 0, layout, 0, time.time() - start)
+
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        buf = shm.buf
+        for (_, _, offsets, data), (_, _, offsets_at, data_at, _) in zip(encoded, layout):
+            if offsets:
+                buf[offsets_at:offsets_at + len(offsets)] = offsets
+            buf[data_at:data_at + len(data)] = data
+        del buf
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return SharedColumns(shm.name, rows, layout, size, time.time() - start)
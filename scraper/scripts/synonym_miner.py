@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Thesaurus Synonym Miner
+Derives acronym expansions and service keyword boosts from the scraped
+service catalog and from term/service co-occurrence in the chunked corpus.
+The output has the same layout as thesaurus.json; thesaurus.py merges it
+under the hand-written entries when it compiles the thesaurus.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.bm25_index import read_corpus, tokenize
+from scripts.thesaurus import MINED_PATH
+
+# Configuration
+SERVICE_CATALOG_PATH = "/home/rag_cache/service-catalog.json"
+MIN_DF = 20  # Chunks a term must appear in before its statistics are trusted
+MAX_DF_RATIO = 0.05  # Terms in more chunks than this are too common to expand or boost on
+MIN_PURITY = 0.8  # Share of a term's chunks that must belong to one service to boost it
+KEYWORDS_PER_SERVICE = 8
+EXPANSIONS_PER_TERM = 4
+MIN_NPMI = 0.3  # Normalized PMI needed for a co-occurring term to become an expansion
+MIN_ABBREVIATION_COUNT = 3  # "Long Form (LF)" sightings needed to accept a corpus abbreviation
+MIN_KEYWORD_LENGTH = 4  # Boost keywords match as substrings, so short ones misfire
+MIN_ACRONYM_LENGTH = 3  # Two-letter codes (as, dc, er) collide with ordinary words
+CATALOG_BOOST = 5.0
+
+ABBREVIATION_RE = re.compile(r"\(([A-Z][A-Za-z0-9]{1,9})\)")
+LONG_FORM_WORDS = 8  # Words before "(ABBR)" considered as its long form
+
+
+def is_abbreviation(short: str, long_form: str) -> bool:
+    """
+    True if `short` is spelled by prefixes of at least two words of
+    `long_form`, in order and starting with the first word (ECS <- Elastic
+    Cloud Server, APIG <- API Gateway, SFSTurbo <- Scalable File Service
+    Turbo). Words may be skipped, as in "Identity and Access Management".
+    """
+    short = short.lower()
+    words = re.findall(r"[a-z0-9]+", long_form.lower())
+    if not short or not words or short[0] != words[0][0]:
+        return False
+
+    def spell(i: int, j: int, used: int) -> bool:
+        if i == len(short):
+            return used >= 2
+        if j == len(words):
+            return False
+        word = words[j]
+        for k in range(min(len(word), len(short) - i), 0, -1):
+            if short[i:i + k] == word[:k] and spell(i + k, j + 1, used + 1):
+                return True
+        return j > 0 and spell(i, j + 1, used)
+
+    return spell(0, 0, 0)
+
+
+def clean_title(title: str) -> str:
+    """Catalog title as a lower-case phrase, without a trailing "(ABBR)" """
+    return " ".join(re.sub(r"\([^)]*\)", " ", title).lower().split())
+
+
+def is_distinctive(title: str) -> bool:
+    """Product names like FunctionGraph or GaussDB can't be ordinary English words"""
+    return bool(re.search(r"[a-z][A-Z]|\d", title.strip()))
+
+
+def load_catalog(path: str = SERVICE_CATALOG_PATH) -> List[Dict[str, str]]:
+    """Products of the scraped service catalog as {code, title, category, description}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        catalog = json.load(f)
+    products = []
+    for category in catalog.get("categories", []):
+        for product in category.get("products", []):
+            if product.get("code") and product.get("title"):
+                products.append({
+                    "code": product["code"].lower(),
+                    "title": product["title"].strip(),
+                    "category": product.get("category") or category.get("code", ""),
+                    "description": product.get("description", "")
+                })
+    return products
+
+
+class CorpusStats:
+    """
+    Binary chunk x term matrix X and chunk x service matrix S (both CSR).
+    X^T S gives term/service chunk counts, X^T X term co-occurrence.
+    """
+
+    def __init__(self, documents: List[str], services: List[str], min_df: int = MIN_DF):
+        counts: Counter = Counter()
+        token_sets = []
+        for doc in tqdm(documents, desc="Tokenizing", unit="chunk"):
+            tokens = set(tokenize(doc or ""))
+            token_sets.append(tokens)
+            counts.update(tokens)
+
+        self.vocab = {term: i for i, term in enumerate(t for t, c in counts.items() if c >= min_df)}
+        self.terms = list(self.vocab)
+        self.service_ids = {s: i for i, s in enumerate(sorted(set(services)))}
+        self.services = list(self.service_ids)
+
+        indptr = [0]
+        indices: List[int] = []
+        for tokens in token_sets:
+            indices.extend(self.vocab[t] for t in tokens if t in self.vocab)
+            indptr.append(len(indices))
+        n = len(documents)
+        self.X = sp.csr_matrix((np.ones(len(indices), dtype=np.float32), np.array(indices, dtype=np.int32),
+                                np.array(indptr, dtype=np.int64)), shape=(n, len(self.vocab)))
+        self.S = sp.csr_matrix((np.ones(n, dtype=np.float32), [self.service_ids[s] for s in services],
+                                np.arange(n + 1)), shape=(n, len(self.service_ids)))
+        self.Xt = self.X.T.tocsr()  # Term rows, for co-occurrence lookups
+        self.n = n
+        self.df = np.asarray(self.X.sum(axis=0)).ravel()
+
+    def service_purity(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Per term: the service holding most of its chunks, and that share"""
+        counts = (self.Xt @ self.S).tocsr()
+        best = np.asarray(counts.argmax(axis=1)).ravel()
+        top = counts.max(axis=1).toarray().ravel()
+        return best, top / np.maximum(self.df, 1)
+
+    def cooccurring(self, term: str, k: int = EXPANSIONS_PER_TERM, min_npmi: float = MIN_NPMI,
+                    max_df: Optional[float] = None) -> List[str]:
+        """Terms with the highest normalized PMI against `term` over chunks"""
+        i = self.vocab.get(term)
+        if i is None:
+            return []
+        joint = (self.Xt[i] @ self.X).toarray().ravel()
+        joint[i] = 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p_joint = joint / self.n
+            pmi = np.log(p_joint / ((self.df[i] / self.n) * (self.df / self.n)))
+            npmi = np.where(joint > 0, pmi / -np.log(p_joint), -1.0)
+        if max_df is not None:
+            npmi[self.df > max_df] = -1.0
+        order = np.argsort(-npmi)[:k]
+        return [self.terms[j] for j in order if npmi[j] >= min_npmi]
+
+
+def corpus_abbreviations(documents: List[str], min_count: int = MIN_ABBREVIATION_COUNT) -> Dict[str, str]:
+    """
+    "Long Form (LF)" definitions in the corpus, keeping the shortest word
+    suffix that spells the abbreviation and the most frequent long form
+    """
+    seen: Dict[str, Counter] = defaultdict(Counter)
+    for doc in documents:
+        if not doc or "(" not in doc:
+            continue
+        for match in ABBREVIATION_RE.finditer(doc):
+            abbr = match.group(1)
+            words = re.findall(r"[A-Za-z][\w-]*", doc[max(0, match.start() - 16 * LONG_FORM_WORDS):match.start()])
+            words = words[-LONG_FORM_WORDS:]
+            for start in range(len(words) - 1, -1, -1):
+                candidate = " ".join(words[start:])
+                if is_abbreviation(abbr, candidate):
+                    seen[abbr.lower()][candidate.lower()] += 1
+                    break
+    found = {}
+    for abbr, forms in seen.items():
+        long_form, count = forms.most_common(1)[0]
+        if count >= min_count and long_form != abbr:
+            found[abbr] = long_form
+    return found
+
+
+def mine(products: List[Dict[str, str]], documents: Optional[List[str]] = None,
+         services: Optional[List[str]] = None, min_df: int = MIN_DF,
+         min_purity: float = MIN_PURITY) -> Dict[str, Any]:
+    """
+    Mine thesaurus entries. Without a corpus only catalog abbreviations and
+    distinctive product names are used; with one, purity (share of a term's
+    chunks in one service) decides which ordinary words may act as keywords,
+    and co-occurrence adds expansions.
+    """
+    stats = CorpusStats(documents, services, min_df) if documents else None
+    if stats is not None:
+        best, purity = stats.service_purity()
+        max_df = MAX_DF_RATIO * stats.n
+
+    def specific_to(term: str, code: str) -> bool:
+        """The corpus ties `term` to the service `code` (unknown without a corpus)"""
+        if stats is None or term not in stats.vocab:
+            return False
+        i = stats.vocab[term]
+        return stats.services[best[i]] == code and purity[i] >= min_purity
+
+    catalog_terms: Dict[str, List[str]] = {}
+    catalog_boosts: Dict[str, Dict[str, float]] = {}
+    for product in products:
+        code, title = product["code"], clean_title(product["title"])
+        if not re.fullmatch(r"[a-z0-9]+", code) or code == title:
+            code_ok = False
+        else:
+            code_ok = ((len(code) >= MIN_ACRONYM_LENGTH and is_abbreviation(code, title))
+                       or specific_to(code, code))
+        title_ok = " " in title or is_distinctive(product["title"]) or specific_to(title, code)
+
+        if code_ok:
+            expansions = [title] if title_ok else []
+            if stats is not None:
+                expansions += [t for t in stats.cooccurring(code, max_df=max_df)
+                               if t not in title.split() and t not in expansions]
+            if expansions:
+                catalog_terms[code] = expansions
+            if len(code) >= MIN_KEYWORD_LENGTH:
+                catalog_boosts[code] = {code: CATALOG_BOOST}
+        if title_ok and len(title) >= MIN_KEYWORD_LENGTH:
+            catalog_boosts.setdefault(title, {code: CATALOG_BOOST})
+
+    corpus_terms: Dict[str, List[str]] = {}
+    corpus_boosts: Dict[str, Dict[str, float]] = {}
+    if stats is not None:
+        for abbr, long_form in corpus_abbreviations(documents).items():
+            if len(abbr) >= MIN_ACRONYM_LENGTH and abbr not in catalog_terms:
+                corpus_terms[abbr] = [long_form]
+
+        keywords: Dict[str, List[Tuple[float, str]]] = defaultdict(list)
+        for i in np.flatnonzero((purity >= min_purity) & (stats.df <= max_df)):
+            term = stats.terms[i]
+            if len(term) >= MIN_KEYWORD_LENGTH and not term.isdigit() and term not in catalog_boosts:
+                keywords[stats.services[best[i]]].append((stats.df[i] * purity[i], term))
+        for service, ranked in keywords.items():
+            for _, term in sorted(ranked, reverse=True)[:KEYWORDS_PER_SERVICE]:
+                i = stats.vocab[term]
+                corpus_boosts[term] = {service: round(1.0 + 4.0 * float(purity[i]), 1)}
+
+    return {
+        "_comment": ["Generated by synonym_miner.py; hand-written entries in thesaurus.json take precedence."],
+        "generated_at": time.time(),
+        "products": len(products),
+        "corpus_chunks": stats.n if stats is not None else 0,
+        "terms": {"Catalog services": catalog_terms, "Corpus abbreviations": corpus_terms},
+        "service_keyword_boosts": {"Catalog services": catalog_boosts, "Corpus co-occurrence": corpus_boosts}
+    }
+
+
+def main():
+    from scripts.search_backend import open_collection, VECTOR_STORE_PATH
+
+    parser = argparse.ArgumentParser(description="Mine thesaurus synonyms and service boosts from the catalog and corpus")
+    parser.add_argument("--catalog", default=SERVICE_CATALOG_PATH, help="Scraped service-catalog.json")
+    parser.add_argument("--output", default=MINED_PATH, help="Mined thesaurus JSON")
+    parser.add_argument("--backend", choices=["chroma", "exact"], default="chroma", help="Corpus source")
+    parser.add_argument("--vector-store", default=VECTOR_STORE_PATH, help="Vector store directory")
+    parser.add_argument("--no-corpus", action="store_true", help="Mine the catalog only")
+    parser.add_argument("--min-df", type=int, default=MIN_DF, help="Minimum chunk frequency of mined terms")
+    parser.add_argument("--min-purity", type=float, default=MIN_PURITY,
+                        help="Minimum share of a keyword's chunks in its service")
+    args = parser.parse_args()
+
+    products = load_catalog(args.catalog)
+    print(f"📚 {len(products)} products in {args.catalog}")
+
+    documents = services = None
+    if not args.no_corpus:
+        collection = open_collection(args.backend, vector_store_path=args.vector_store)
+        print(f"📄 Reading {collection.count():,} chunks...")
+        _, documents, metadatas = read_corpus(collection, with_metadata=True)
+        services = [(m or {}).get("service", "").lower() for m in metadatas]
+
+    start = time.time()
+    mined = mine(products, documents, services, args.min_df, args.min_purity)
+    terms = sum(len(group) for group in mined["terms"].values())
+    boosts = sum(len(group) for group in mined["service_keyword_boosts"].values())
+    print(f"   ✓ {terms} term expansions, {boosts} service keywords in {time.time() - start:.1f}s")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    tmp_path = args.output + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(mined, f, indent=1)
+    os.replace(tmp_path, args.output)
+    print(f"✓ Wrote {args.output}; run 'thesaurus.py build' to compile it in")
+
+
+if __name__ == "__main__":
+    main()
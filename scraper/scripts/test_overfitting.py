@@ -4,10 +4,14 @@ Test RAG with NEW queries to check for overfitting
 These queries were NOT used in the thesaurus tuning process
 """
 
-import subprocess
-import re
+import os
+import sys
 from typing import List, Dict
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts import query_client
+
 # NEW test queries - completely different from tuning set
 NEW_TEST_QUERIES = [
     {
@@ -128,24 +132,18 @@ NEW_TEST_QUERIES = [
 ]
 
 
-def run_query(query: str, top_k: int = 3) -> List[Dict]:
-    """Run hybrid search and return results"""
-    cmd = ["python3", "scripts/hybrid_query.py", query, "--top-k", str(top_k), "--quiet"]
-    result = subprocess.run(cmd, capture_output=True, text=True, cwd="/home/scraper")
-    output = result.stdout
-    
-    # Parse results
-    results = []
-    pattern = r"Service: (\w+)\s+Section:"
-    matches = re.findall(pattern, output)
-    
-    for i, service in enumerate(matches):
-        results.append({
-            "rank": i + 1,
-            "service": service.lower()
-        })
-    
-    return results
+def run_queries(queries: List[str], top_k: int = 3) -> List[List[Dict]]:
+    """Run hybrid search for every query in one batch (query server if running, else one local run)"""
+    return [
+        [
+            {
+                "rank": i + 1,
+                "service": result["metadata"].get("service", "unknown").lower()
+            }
+            for i, result in enumerate(results)
+        ]
+        for results in query_client.search_or_local(queries, top_k=top_k)
+    ]
 
 
 def is_relevant(result: Dict, expected_services) -> bool:
@@ -181,6 +179,8 @@ def evaluate():
         "other": {"total": 0, "pass": 0}
     }
     
+    all_results = run_queries([test["query"] for test in NEW_TEST_QUERIES], top_k=3)
+    
     for i, test in enumerate(NEW_TEST_QUERIES, 1):
         query = test["query"]
         expected = test["expected_service"]
@@ -190,7 +190,7 @@ def evaluate():
         print(f"  Text: {query}")
         print(f"  Expected: {expected}")
         
-        results = run_query(query, top_k=3)
+        results = all_results[i - 1]
         
         if not results:
             print(f"  Result: ❌ FAIL - No results")
@@ -270,10 +270,9 @@ def evaluate():
     print("="*80)
     print(f"FAILING QUERIES ({failed_queries})")
     print("="*80)
-    for test in NEW_TEST_QUERIES:
+    for test, results in zip(NEW_TEST_QUERIES, all_results):
         query = test["query"]
         expected = test["expected_service"]
-        results = run_query(query, top_k=3)
         
         if results:
             top_result = results[0]
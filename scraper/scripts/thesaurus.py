@@ -1,316 +1,464 @@
-# Huawei Cloud Query Expansion Thesaurus
-# Maps terms to their expansions for better search relevance
-
-TERMS = {
-    # Authentication & Security
-    "authentication": ["identity", "access", "management", "iam", "ak", "sk", "token", "credential", "login", "sign-in"],
-    "api": ["application programming interface", "restful", "rest", "sdk", "endpoint", "api-gateway", "apig"],
-    "security": ["protection", "encryption", "firewall", "ddos", "anti-ddos", "waf", "security group"],
-    "authorization": ["permission", "policy", "role", "privilege", "access control"],
-    
-    # Compute Services
-    "ecs": ["elastic cloud server", "virtual machine", "vm", "cloud server", "compute", "instance"],
-    "instance": ["virtual machine", "vm", "server", "compute node"],
-    "server": ["instance", "vm", "host", "node"],
-    "scaling": ["auto-scaling", "autoscaling", "as", "elastic scaling", "scale-out", "scale-in"],
-    
-    # Storage Services
-    "storage": ["object storage", "block storage", "file storage", "disk", "volume"],
-    "obs": ["object storage service", "s3", "bucket", "object", "file storage", "aws s3", "amazon s3"],
-    "evs": ["elastic volume service", "block storage", "disk", "volume", "storage device"],
-    "sfs": ["scalable file service", "nas", "network-attached storage", "file system"],
-    "backup": ["snapshot", "restore", "recovery", "archive"],
-    
-    # Network Services
-    "vpc": ["virtual private cloud", "private network", "virtual network", "subnet"],
-    "network": ["vpc", "subnet", "router", "gateway", "bandwidth", "eip", "elastic ip"],
-    "subnet": ["network segment", "ip range", "cidr", "network partition"],
-    "eip": ["elastic ip", "public ip", "elastic ip address", "static ip"],
-    "load balancer": ["elb", "elastic load balance", "traffic distribution", "load balancing"],
-    "elb": ["load balancer", "elastic load balance", "traffic management"],
-    "cdn": ["content delivery network", "distribution", "acceleration", "edge cache"],
-    
-    # Database Services
-    "database": ["db", "rdbms", "relational database", "data store", "repository"],
-    "rds": ["relational database service", "mysql", "postgresql", "sql server", "mariadb"],
-    "mysql": ["relational database", "rds", "database", "data"],
-    "postgresql": ["postgres", "relational database", "rds"],
-    "taurusdb": ["mysql", "relational database", "gaussdb", "mysql-compatible"],
-    "gaussdb": ["postgresql", "mysql", "relational database", "distributed database"],
-    "nosql": ["cassandra", "mongodb", "redis", "document database", "key-value", "graph"],
-    "redis": ["cache", "key-value", "memory database", "in-memory"],
-    "dds": ["document database service", "mongodb", "nosql", "document store"],
-    "dws": ["data warehouse service", "analytics", "olap", "data warehouse"],
-    
-    # AI & Analytics
-    "ai": ["artificial intelligence", "machine learning", "ml", "deep learning", "model"],
-    "model": ["ai", "machine learning", "training", "inference", "prediction"],
-    "training": ["machine learning", "model development", "neural network"],
-    "inference": ["prediction", "model serving", "ml inference"],
-    "mrs": ["mapreduce service", "hadoop", "spark", "big data", "data processing"],
-    
-    # Container & Serverless
-    "cce": ["cloud container engine", "kubernetes", "k8s", "container", "orchestration"],
-    "kubernetes": ["k8s", "container", "orchestration", "cce"],
-    "swr": ["software repository for container", "container registry", "docker", "image"],
-    "docker": ["container", "image", "containerization"],
-    "function": ["serverless", "functiongraph", "fgs", "lambda", "cloud function"],
-    "serverless": ["functiongraph", "fgs", "cloud function", "event-driven"],
-    
-    # Management & DevOps
-    "monitor": ["cloud eye", "ces", "monitoring", "metrics", "alarm", "alert"],
-    "cloud eye": ["ces", "monitoring", "metric", "alarm"],
-    "ces": ["cloud eye", "monitoring", "metrics"],
-    "log": ["cloud trace service", "cts", "logging", "log collection", "audit"],
-    "cts": ["cloud trace service", "audit", "log"],
-    "aom": ["application operations management", "devops", "operations", "monitoring"],
-    "devops": ["ci/cd", "pipeline", "deployment", "automation", "aom", "codearts"],
-    "codearts": ["devops", "ci/cd", "deployment", "codehub"],
-    
-    # Middleware & Messaging
-    "message": ["kafka", "dms", "mq", "queue", "topic"],
-    "dms": ["distributed message service", "kafka", "rabbitmq", "mq"],
-    "kafka": ["message queue", "stream", "event streaming", "dms"],
-    "rabbitmq": ["message queue", "mq", "dms"],
-    "api gateway": ["apig", "api-gateway", "api proxy", "gateway"],
-    
-    # Edge & IoT
-    "iot": ["internet of things", "device", "sensor", "edge"],
-    "edge": ["edge computing", "iot edge", "edge node"],
-    
-    # Common Operations
-    "create": ["provision", "launch", "deploy", "set up", "initialize", "start"],
-    "delete": ["remove", "destroy", "terminate", "clean up", "remove"],
-    "update": ["modify", "change", "edit", "alter", "upgrade"],
-    "configure": ["setup", "configure", "setting", "configuration", "parameter"],
-    "deploy": ["create", "launch", "install", "provision", "set up"],
-    "manage": ["administer", "control", "operate", "maintain"],
-    "troubleshoot": ["debug", "fix", "resolve", "problem-solving", "error"],
-    "error": ["exception", "failure", "issue", "problem", "bug"],
-    
-    # Pricing & Billing
-    "price": ["cost", "pricing", "billing", "fee", "charge", "payment", "free tier", "tier"],
-    "billing": ["cost", "pricing", "payment", "invoice", "account", "subscription"],
-    "quota": ["limit", "restriction", "threshold", "maximum", "cap"],
-    "limit": ["quota", "restriction", "threshold", "capacity", "constraint"],
-    "free tier": ["free", "tier", "trial", "free account"],
-    "tier": ["level", "edition", "plan", "package"],
-    
-    # Performance
-    "performance": ["speed", "throughput", "latency", "optimization", "tune"],
-    "optimize": ["improve", "tune", "enhance", "boost", "accelerate"],
-    "latency": ["delay", "response time", "lag"],
-    
-    # Migration
-    "migrate": ["transfer", "move", "import", "export", "migration"],
-    "migration": ["transfer", "move", "import", "export"],
-    "import": ["ingest", "load", "upload"],
-    "export": ["download", "save", "extract"],
-    
-    # Security & Compliance
-    "encrypt": ["encryption", "secure", "protect", "cipher", "ssl", "tls"],
-    "firewall": ["security group", "network security", "access control"],
-    "security group": ["firewall", "network acl", "access control list", "acl"],
-    "ssl": ["certificate", "tls", "https", "secure", "encryption"],
-    "certificate": ["ssl", "tls", "security", "credential", "cert"],
-    "tls": ["ssl", "certificate", "secure", "encryption"],
-    
-    # Documentation Types
-    "api reference": ["api-doc", "api-documentation", "sdk", "endpoint"],
-    "user guide": ["guide", "tutorial", "how-to", "manual"],
-    "best practice": ["recommendation", "guideline", "standard", "pattern"],
-}
-
-# Document type boost factors
-# Different document types are more relevant for different query types
-DOCUMENT_TYPE_BOOSTS = {
-    # For "how to" questions
-    "guide": 1.5,
-    "tutorial": 1.5,
-    "user guide": 1.5,
-    
-    # For API/technical questions
-    "api": 1.8,
-    "api reference": 1.8,
-    "sdk": 1.6,
-    
-    # For troubleshooting/error questions
-    "troubleshooting": 2.0,
-    "error": 2.0,
-    "faq": 1.7,
-    
-    # For pricing questions
-    "pricing": 2.0,
-    "cost": 2.0,
-    "billing": 2.0,
-    
-    # For best practices
-    "best practice": 1.8,
-    "recommendation": 1.6,
-}
-
-# Service priority weights for query terms
-# When query contains these terms, boost matching services
-SERVICE_KEYWORD_BOOSTS = {
-    # Authentication & Security
-    "authentication": {"iam": 5.0, "security": 3.0, "identity": 4.0},
-    "identity": {"iam": 5.0, "identitycenter": 3.0},
-    "access control": {"iam": 4.0, "security": 2.5},
-    "api": {"apig": 2.0, "iam": 1.5},
-    "ak": {"iam": 3.0},
-    "sk": {"iam": 3.0},
-    
-    # Compute Services
-    "ecs": {"ecs": 5.0, "sms": 0.1, "ims": 0.1},
-    "elastic cloud server": {"ecs": 5.0},
-    "instance": {"ecs": 4.0, "cce": 2.0, "rds": 2.0},
-    "virtual machine": {"ecs": 5.0},
-    "vm": {"ecs": 4.0},
-    "compute": {"ecs": 3.0, "cce": 2.0},
-    
-    # Storage Services
-    "storage": {"obs": 2.0, "evs": 2.0, "sfs": 1.5},
-    "obs": {"obs": 5.0},
-    "object storage": {"obs": 5.0},
-    "bucket": {"obs": 5.0},
-    "evs": {"evs": 5.0},
-    "block storage": {"evs": 4.0},
-    "volume": {"evs": 5.0},
-    "disk": {"evs": 4.0},
-    "sfs": {"sfs": 5.0},
-    "nas": {"sfs": 4.0},
-    
-    # Network Services
-    "vpc": {"vpc": 5.0},
-    "virtual private cloud": {"vpc": 5.0},
-    "network": {"vpc": 3.0, "elb": 2.0},
-    "load balancer": {"elb": 5.0},
-    "loadbalancer": {"elb": 5.0},
-    "elb": {"elb": 5.0},
-    "cdn": {"cdn": 5.0},
-    
-    # Database Services
-    "database": {"rds": 3.0, "taurusdb": 2.5, "gaussdb": 2.5, "dds": 2.0},
-    "rds": {"rds": 5.0},
-    "mysql": {"rds": 5.0, "taurusdb": 4.0},
-    "postgresql": {"gaussdb": 5.0, "rds": 3.0},
-    "sql": {"rds": 3.0},
-    "nosql": {"dds": 4.0, "redis": 4.0, "dcs": 4.0},
-    "redis": {"dcs": 5.0, "redis": 5.0},
-    "cache": {"dcs": 5.0, "redis": 5.0},
-    "mongodb": {"dds": 5.0},
-    "taurusdb": {"taurusdb": 5.0},
-    "gaussdb": {"gaussdb": 5.0},
-    "dds": {"dds": 5.0},
-    "dcs": {"dcs": 5.0},
-    
-    # AI & Analytics
-    "ai": {"modelarts": 3.0},
-    "machine learning": {"modelarts": 5.0},
-    "modelarts": {"modelarts": 5.0},
-    
-    # Container & Serverless
-    "kubernetes": {"cce": 5.0},
-    "k8s": {"cce": 5.0},
-    "container": {"cce": 4.0, "swr": 2.0},
-    "cce": {"cce": 5.0},
-    "docker": {"swr": 3.0},
-    "serverless": {"functiongraph": 4.0},
-    "function": {"functiongraph": 3.0},
-    "functiongraph": {"functiongraph": 5.0},
-    
-    # Management & DevOps
-    "monitoring": {"ces": 3.0, "aom": 3.0},
-    "ces": {"ces": 5.0},
-    "aom": {"aom": 5.0},
-    "log": {"cts": 3.0, "lts": 3.0},
-    "devops": {"codearts": 4.0, "aom": 2.0},
-    "codearts": {"codearts": 5.0},
-    
-    # Middleware & Messaging
-    "kafka": {"dms": 5.0},
-    "message": {"dms": 3.0},
-    "dms": {"dms": 5.0},
-    
-    # Edge & IoT
-    "iot": {"iotda": 4.0},
-    
-    # Penalty boosts (reduce score for clearly wrong services)
-    "server migration": {"sms": 0.1},
-    "migration": {"sms": 0.5},
-    "image": {"ims": 2.0, "swr": 1.5},
-    "docker": {"swr": 5.0, "cci": 2.0},
-    "snapshot": {"evs": 3.0, "obs": 2.5, "rds": 2.0},
-    "backup": {"evs": 2.5, "obs": 2.5, "rds": 3.0, "functiongraph": 2.0},
-    "nat": {"natgateway": 5.0},
-    "certificate": {"scm": 4.0, "ccm": 3.0, "elb": 2.5, "cdn": 2.0},
-    "security group": {"vpc": 5.0},
-    "firewall": {"vpc": 4.0, "elb": 2.0},
-    "s3": {"obs": 5.0},
-    "aws s3": {"obs": 5.0},
-    "amazon s3": {"obs": 5.0},
-    "kafka": {"dms": 4.0},
-    "message": {"dms": 3.0},
-    "rabbitmq": {"dms": 4.0},
-    "function": {"functiongraph": 4.0, "fgs": 3.0},
-    "serverless": {"functiongraph": 5.0},
-}
+#!/usr/bin/env python3
+"""
+Huawei Cloud Query Expansion Thesaurus
+Maps terms to their expansions and query keywords to service / document-type
+boosts. The tables are defined in thesaurus.json; `thesaurus.py build`
+merges in the entries mined by synonym_miner.py, validates them and writes
+a compiled artifact (normalized keys, tokenized expansions, keyword matcher
+tables and a duplicate/conflict report) that query tools load lazily and
+the query server can reload without a restart.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.bm25_index import tokenize
+from scripts.keyword_matcher import AhoCorasick
+
+# Configuration
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thesaurus.json")
+ARTIFACT_PATH = os.environ.get("RAG_THESAURUS", "/home/rag_cache/thesaurus_compiled.json")
+MINED_PATH = os.environ.get("RAG_THESAURUS_MINED", "/home/rag_cache/thesaurus_mined.json")
+MINED_SECTIONS = ("terms", "service_keyword_boosts")
+ARTIFACT_VERSION = 1
+QUERY_CACHE_SIZE = 4096
+SECTIONS = ("terms", "document_type_boosts", "service_keyword_boosts")
+
+
+class ThesaurusError(ValueError):
+    """The thesaurus source failed validation or no thesaurus could be loaded"""
+
+
+class _Object(dict):
+    """JSON object that remembers keys it saw more than once (json would keep the last silently)"""
+
+    def __init__(self, pairs):
+        super().__init__()
+        self.duplicates: List[Tuple[str, Any, Any]] = []
+        for key, value in pairs:
+            if key in self:
+                self.duplicates.append((key, self[key], value))
+            self[key] = value
+
+
+def normalize_key(key: str) -> str:
+    """Lower-case and collapse whitespace, the form queries are matched in"""
+    return " ".join(key.lower().split())
+
+
+def sources_hash(source_path: str, mined_path: Optional[str] = None) -> str:
+    """Hash of the source plus the mined file (if present); an artifact is current only if it matches"""
+    h = hashlib.sha1()
+    with open(source_path, 'rb') as f:
+        h.update(f.read())
+    if mined_path and os.path.exists(mined_path):
+        h.update(b'\0')
+        with open(mined_path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def read_source(path: str = SOURCE_PATH) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f, object_pairs_hook=_Object)
+
+
+def flatten_section(source: Dict[str, Any], section: str, report: Dict[str, List],
+                    required: bool = True) -> Dict[str, Any]:
+    """
+    Merge a section's topic groups into one normalized key -> value map.
+    A key defined twice (in one group, across groups, or differing only in
+    case/spacing) is reported; like a Python dict literal, the later value
+    wins and the key keeps its first position.
+    """
+    groups = source.get(section)
+    if groups is None and not required:
+        return {}
+    if not isinstance(groups, dict):
+        raise ThesaurusError(f"Section '{section}' must be an object of topic groups")
+
+    flat: Dict[str, Any] = {}
+    origin: Dict[str, str] = {}
+    for group, entries in groups.items():
+        if not isinstance(entries, dict):
+            raise ThesaurusError(f"{section}/{group} must be an object")
+        for key, first, second in getattr(entries, "duplicates", []):
+            report["duplicates"].append({"section": section, "key": key, "groups": [group, group],
+                                         "values": [first, second], "kept": second})
+        for key, value in entries.items():
+            norm = normalize_key(key)
+            if norm in flat:
+                report["duplicates"].append({"section": section, "key": norm, "groups": [origin[norm], group],
+                                             "values": [flat[norm], value], "kept": value})
+            else:
+                origin[norm] = group
+            flat[norm] = value
+    return flat
+
+
+def _conflict(report: Dict[str, List], severity: str, section: str, key: str, message: str):
+    report["conflicts"].append({"severity": severity, "section": section, "key": key, "message": message})
+
+
+def _positive(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+
+def compile_source(source: Dict[str, Any], source_hash: str = "",
+                   mined: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Validate a parsed thesaurus.json and compile it into the artifact layout.
+    Mined terms and service keywords fill in keys the source doesn't define.
+    Raises ThesaurusError if any entry is unusable; duplicates and
+    suspicious-but-valid entries only go into the report.
+    """
+    report: Dict[str, List] = {"duplicates": [], "conflicts": [], "mined": []}
+    terms, doc_type_boosts, service_boosts = (flatten_section(source, s, report) for s in SECTIONS)
+
+    for section, table in zip(MINED_SECTIONS, (terms, service_boosts)):
+        if mined is None:
+            break
+        entries = flatten_section(mined, section, report, required=False)
+        added = {key: value for key, value in entries.items() if key not in table}
+        table.update(added)
+        report["mined"].append({"section": section, "added": len(added),
+                                "overridden": len(entries) - len(added)})
+
+    compiled_terms = {}
+    for key, expansions in terms.items():
+        if not isinstance(expansions, list) or not all(isinstance(e, str) and e.strip() for e in expansions):
+            _conflict(report, "error", "terms", key, "expansions must be a list of non-empty strings")
+            continue
+        if " " in key:
+            # expand_query looks terms up one query word at a time
+            _conflict(report, "warning", "terms", key, "multi-word term can never match a single query word")
+        if not expansions:
+            _conflict(report, "warning", "terms", key, "term has no expansions")
+        expansions = [" ".join(e.split()) for e in expansions]
+        compiled_terms[key] = {"expansions": expansions, "tokens": tokenize(" ".join(expansions))}
+
+    for key, boost in doc_type_boosts.items():
+        if not _positive(boost):
+            _conflict(report, "error", "document_type_boosts", key, f"boost must be a positive number, got {boost!r}")
+
+    compiled_services = {}
+    for key, boosts in service_boosts.items():
+        if not isinstance(boosts, dict) or not all(_positive(b) for b in boosts.values()):
+            _conflict(report, "error", "service_keyword_boosts", key,
+                      "value must map service names to positive numbers")
+            continue
+        compiled_services[key] = {service.lower(): float(b) for service, b in boosts.items()}
+    # Keywords match as substrings, so a keyword inside another compounds with it
+    for key in compiled_services:
+        for other in compiled_services:
+            if key != other and key in other:
+                _conflict(report, "warning", "service_keyword_boosts", key,
+                          f"also matches inside '{other}'; both boosts apply to such queries")
+
+    intents = []
+    for i, intent in enumerate(source.get("document_type_intents", [])):
+        boost = normalize_key(str(intent.get("boost", "")))
+        words = [normalize_key(w) for w in intent.get("query_words", [])]
+        doc_types = [normalize_key(t) for t in intent.get("doc_types", [])]
+        if boost not in doc_type_boosts:
+            _conflict(report, "error", "document_type_intents", boost or str(i),
+                      "boost key is not defined in document_type_boosts")
+        if not words or not all(words):
+            _conflict(report, "error", "document_type_intents", boost or str(i), "query_words must be non-empty")
+        intents.append([boost, words, doc_types])
+
+    errors = [c for c in report["conflicts"] if c["severity"] == "error"]
+    if errors:
+        raise ThesaurusError("Invalid thesaurus: " + "; ".join(f"{c['section']}/{c['key']}: {c['message']}"
+                                                             for c in errors))
+
+    doc_type_boosts = {key: float(boost) for key, boost in doc_type_boosts.items()}
+    matcher = CompiledThesaurus(compiled_services, doc_type_boosts, intents).matcher
+    return {
+        "version": ARTIFACT_VERSION,
+        "source_hash": source_hash,
+        "built_at": time.time(),
+        "terms": compiled_terms,
+        "document_type_boosts": doc_type_boosts,
+        "service_keyword_boosts": compiled_services,
+        "document_type_intents": intents,
+        "matcher": matcher.tables(),
+        "report": report
+    }
+
+
+def build(source_path: str = SOURCE_PATH, mined_path: Optional[str] = MINED_PATH) -> Dict[str, Any]:
+    mined = read_source(mined_path) if mined_path and os.path.exists(mined_path) else None
+    return compile_source(read_source(source_path), sources_hash(source_path, mined_path), mined)
+
+
+def write_artifact(artifact: Dict[str, Any], path: str = ARTIFACT_PATH):
+    """Atomically write a compiled artifact, so a running server never reads half a file"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(artifact, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+class QueryBoosts:
+    """Boosts for one query, computed once and applied to any number of candidates"""
+    __slots__ = ("service_boosts", "doc_type_rules")
+
+    def __init__(self, service_boosts: Dict[str, float], doc_type_rules: List[Tuple[frozenset, float]]):
+        self.service_boosts = service_boosts
+        self.doc_type_rules = doc_type_rules
+
+    def service_boost(self, service: str) -> float:
+        return self.service_boosts.get(service, 1.0)
+
+    def doc_type_boost(self, doc_type: Optional[str]) -> float:
+        if doc_type is None:
+            return 1.0
+        doc_type = doc_type.lower()
+        for doc_types, boost in self.doc_type_rules:
+            if doc_type in doc_types:
+                return boost
+        return 1.0
+
+
+class CompiledThesaurus:
+    """
+    Every service keyword and intent keyword in one Aho-Corasick automaton.
+    A query is scanned once; the result is a service -> boost map plus the
+    ordered doc-type rules of the intents it triggers.
+    """
+
+    def __init__(self, service_keyword_boosts: Dict[str, Dict[str, float]],
+                 document_type_boosts: Dict[str, float], intents: List[Tuple[str, List[str], List[str]]],
+                 matcher: Optional[AhoCorasick] = None):
+        self.service_keyword_boosts = service_keyword_boosts
+        self.intent_rules = [(frozenset(doc_types), document_type_boosts.get(key, 1.0))
+                             for key, _, doc_types in intents]
+        if matcher is None:
+            patterns = [(keyword, ("service", keyword)) for keyword in service_keyword_boosts]
+            patterns += [(word, ("intent", i)) for i, (_, words, _) in enumerate(intents) for word in words]
+            matcher = AhoCorasick(patterns)
+        self.matcher = matcher
+
+    def query_boosts(self, query: str) -> QueryBoosts:
+        service_boosts: Dict[str, float] = {}
+        intents = set()
+        for kind, value in self.matcher.matches(query.lower()):
+            if kind == "service":
+                for service, boost in self.service_keyword_boosts[value].items():
+                    service_boosts[service] = service_boosts.get(service, 1.0) * boost
+            else:
+                intents.add(value)
+        rules = [self.intent_rules[i] for i in sorted(intents)]
+        return QueryBoosts(service_boosts, rules)
+
+
+class Thesaurus:
+    """
+    One loaded thesaurus version. Instances are immutable and carry their
+    own query cache, so a reload swaps tables and cache together.
+    """
+
+    def __init__(self, artifact: Dict[str, Any], stamp: Tuple = ()):
+        self.source_hash = artifact["source_hash"]
+        self.built_at = artifact.get("built_at")
+        self.report = artifact.get("report", {"duplicates": [], "conflicts": []})
+        self.stamp = stamp  # File mtimes this version was loaded from
+        self.terms: Dict[str, List[str]] = {key: entry["expansions"] for key, entry in artifact["terms"].items()}
+        self.term_tokens: Dict[str, List[str]] = {key: entry["tokens"] for key, entry in artifact["terms"].items()}
+        self.expansions = {key: " ".join(terms) for key, terms in self.terms.items() if terms}
+        self.document_type_boosts: Dict[str, float] = artifact["document_type_boosts"]
+        self.service_keyword_boosts: Dict[str, Dict[str, float]] = artifact["service_keyword_boosts"]
+        self.document_type_intents = [tuple(intent) for intent in artifact["document_type_intents"]]
+        self.compiled = CompiledThesaurus(self.service_keyword_boosts, self.document_type_boosts,
+                                          self.document_type_intents,
+                                          AhoCorasick.from_tables(artifact["matcher"]))
+        self.query_boosts = lru_cache(maxsize=QUERY_CACHE_SIZE)(self.compiled.query_boosts)
+
+    def expand_query(self, query: str) -> str:
+        expanded = [query]  # Always include original query
+        for word in query.lower().split():
+            expansion = self.expansions.get(word.strip(".,!?;:"))
+            if expansion:
+                expanded.append(expansion)
+        return " ".join(expanded)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "source_hash": self.source_hash,
+            "built_at": self.built_at,
+            "terms": len(self.terms),
+            "service_keywords": len(self.service_keyword_boosts),
+            "duplicates": len(self.report["duplicates"]),
+            "conflicts": len(self.report["conflicts"])
+        }
+
+
+def _stamp(*paths: str) -> Tuple:
+    stamp = []
+    for path in paths:
+        try:
+            stamp.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def load(artifact_path: Optional[str] = None, source_path: Optional[str] = None,
+         mined_path: Optional[str] = None) -> Thesaurus:
+    """
+    Load the compiled artifact if it was built from the current source and
+    mined files; otherwise compile them in memory (so an edit works before
+    a rebuild)
+    """
+    artifact_path = artifact_path or ARTIFACT_PATH
+    source_path = source_path or SOURCE_PATH
+    mined_path = mined_path or MINED_PATH
+    stamp = _stamp(artifact_path, source_path, mined_path)
+    digest = sources_hash(source_path, mined_path) if os.path.exists(source_path) else None
+
+    try:
+        with open(artifact_path, 'r', encoding='utf-8') as f:
+            artifact = json.load(f)
+    except (OSError, ValueError):
+        artifact = None
+    if artifact and artifact.get("version") == ARTIFACT_VERSION and digest in (None, artifact.get("source_hash")):
+        return Thesaurus(artifact, stamp)
+
+    if digest is None:
+        raise ThesaurusError(f"No thesaurus at {artifact_path} or {source_path}")
+    return Thesaurus(build(source_path, mined_path), stamp)
+
+
+_current: Optional[Thesaurus] = None
+_rejected_stamp: Optional[Tuple] = None
+_lock = threading.Lock()
+
+
+def current() -> Thesaurus:
+    """The active thesaurus, loaded on first use"""
+    global _current
+    if _current is None:
+        with _lock:
+            if _current is None:
+                _current = load()
+    return _current
+
+
+def reload() -> Thesaurus:
+    """
+    Load the thesaurus again and swap it in. If the new version is invalid
+    ThesaurusError is raised and the active one stays in place.
+    """
+    global _current
+    thesaurus = load()
+    with _lock:
+        _current = thesaurus
+    return thesaurus
+
+
+def reload_if_changed() -> bool:
+    """Reload if the artifact, source or mined file changed on disk since the active version was loaded"""
+    global _rejected_stamp
+    if _current is None:
+        return False
+    stamp = _stamp(ARTIFACT_PATH, SOURCE_PATH, MINED_PATH)
+    if stamp == _current.stamp or stamp == _rejected_stamp:
+        return False
+    try:
+        reload()
+    except (ThesaurusError, OSError, ValueError):
+        _rejected_stamp = stamp  # Don't retry a broken edit until the files change again
+        raise
+    return True
+
+
+def __getattr__(name: str):
+    # Module-level tables resolve against the active thesaurus
+    tables = {
+        "TERMS": lambda t: t.terms,
+        "DOCUMENT_TYPE_BOOSTS": lambda t: t.document_type_boosts,
+        "SERVICE_KEYWORD_BOOSTS": lambda t: t.service_keyword_boosts,
+        "DOCUMENT_TYPE_INTENTS": lambda t: t.document_type_intents
+    }
+    if name in tables:
+        return tables[name](current())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def expand_query(query: str) -> str:
     """
     Expand query with related terms from thesaurus
     """
-    words = query.lower().split()
-    expanded = [query]  # Always include original query
-    
-    for word in words:
-        word = word.strip(".,!?;:")
-        if word in TERMS:
-            for term in TERMS[word]:
-                expanded.append(term)
-    
-    return " ".join(expanded)
+    return current().expand_query(query)
+
+def query_boosts(query: str) -> QueryBoosts:
+    """Per-query boosts; callers scoring many candidates should fetch this once"""
+    return current().query_boosts(query)
 
 def get_service_boost(query: str, service: str) -> float:
     """
     Get boost factor for a service based on query keywords
     """
-    query_lower = query.lower()
-    boost = 1.0
-    
-    for keyword, service_boosts in SERVICE_KEYWORD_BOOSTS.items():
-        if keyword in query_lower and service in service_boosts:
-            boost *= service_boosts[service]
-    
-    return boost
+    return query_boosts(query).service_boost(service)
 
 def get_document_type_boost(query: str, doc_type: str = None) -> float:
     """
     Get boost factor for document type based on query type
     """
-    if doc_type is None:
-        return 1.0
-    
-    query_lower = query.lower()
-    boost = 1.0
-    
-    # Detect query type
-    is_how_to = any(w in query_lower for w in ["how", "create", "set up", "deploy", "install"])
-    is_troubleshoot = any(w in query_lower for w in ["error", "fail", "problem", "issue", "troubleshoot", "fix"])
-    is_pricing = any(w in query_lower for w in ["price", "cost", "billing", "fee"])
-    is_api = any(w in query_lower for w in ["api", "sdk", "endpoint", "reference"])
-    is_best_practice = any(w in query_lower for w in ["best", "practice", "recommend", "optimize"])
-    
-    # Apply boosts
-    if is_how_to and doc_type.lower() in ["guide", "tutorial", "user guide"]:
-        boost *= DOCUMENT_TYPE_BOOSTS.get("guide", 1.0)
-    elif is_troubleshoot and doc_type.lower() in ["troubleshooting", "error", "faq"]:
-        boost *= DOCUMENT_TYPE_BOOSTS.get("troubleshooting", 1.0)
-    elif is_pricing and doc_type.lower() in ["pricing", "cost", "billing"]:
-        boost *= DOCUMENT_TYPE_BOOSTS.get("pricing", 1.0)
-    elif is_api and doc_type.lower() in ["api", "api reference", "sdk"]:
-        boost *= DOCUMENT_TYPE_BOOSTS.get("api", 1.0)
-    elif is_best_practice and doc_type.lower() in ["best practice", "recommendation"]:
-        boost *= DOCUMENT_TYPE_BOOSTS.get("best practice", 1.0)
-    
-    return boost
\ No newline at end of file
+    return query_boosts(query).doc_type_boost(doc_type)
+
+
+def print_report(report: Dict[str, List]):
+    for dup in report["duplicates"]:
+        groups = " / ".join(dict.fromkeys(dup["groups"]))
+        print(f"   ⚠️  duplicate {dup['section']}/{dup['key']} ({groups}): "
+              f"{json.dumps(dup['values'][0])} overwritten by {json.dumps(dup['kept'])}")
+    for conflict in report["conflicts"]:
+        print(f"   {'❌' if conflict['severity'] == 'error' else '⚠️ '} {conflict['section']}/{conflict['key']}: "
+              f"{conflict['message']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and compile the query thesaurus")
+    parser.add_argument("command", choices=["build", "check"],
+                        help="build: write the compiled artifact; check: validate and print the report only")
+    parser.add_argument("--source", default=SOURCE_PATH, help="Thesaurus source JSON")
+    parser.add_argument("--mined", default=MINED_PATH, help="synonym_miner.py output to merge ('' to skip)")
+    parser.add_argument("--output", default=ARTIFACT_PATH, help="Compiled artifact path")
+    parser.add_argument("--strict", action="store_true", help="Fail on duplicate keys")
+    args = parser.parse_args()
+
+    try:
+        artifact = build(args.source, args.mined)
+    except ThesaurusError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    report = artifact["report"]
+    print(f"📖 {len(artifact['terms'])} terms, {len(artifact['service_keyword_boosts'])} service keywords, "
+          f"{len(artifact['document_type_intents'])} intents, {len(artifact['matcher']['goto'])} matcher states")
+    for mined in report["mined"]:
+        print(f"   + {mined['added']} mined {mined['section']} ({mined['overridden']} overridden by the source)")
+    print(f"   {len(report['duplicates'])} duplicates, {len(report['conflicts'])} conflicts")
+    print_report(report)
+    if args.strict and report["duplicates"]:
+        print("❌ Duplicate keys (--strict)")
+        sys.exit(1)
+
+    if args.command == "build":
+        write_artifact(artifact, args.output)
+        print(f"✓ Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Contiguous Vector Store
+Persists embeddings as one row-major matrix (float32, float16 or per-row
+scaled int8) with id and document sidecars, and memory-maps it for queries
+
+Directory layout:
+  header.json   version, dtype, dim, count, corpus_fingerprint
+  vectors.bin   count x dim matrix in the stored dtype
+  scales.f32    per-row dequantization scales (int8 only)
+  ids.bin       UTF-8 ids back to back
+  ids.off       int64 offsets into ids.bin (count + 1)
+  docs.jsonl    one {"document", "metadata"} line per row (optional)
+  docs.off      int64 offsets into docs.jsonl (count + 1)
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.ingest_manifest import chunk_fingerprint, combine_fingerprints, format_fingerprint
+
+STORE_VERSION = 1
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+SCORE_BLOCK_ROWS = 65536  # Rows dequantized at a time when scoring
+
+
+def quantize_int8(embeddings: np.ndarray):
+    """Symmetric per-row int8 quantization; returns (codes, scales)"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scales = np.abs(embeddings).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class VectorStoreWriter:
+    """
+    Append-only writer. Rows go to a staging directory that replaces the
+    target atomically on close(), so readers never see a half-written store.
+    """
+
+    def __init__(self, path: str, dtype: str = "float32", store_documents: bool = True):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype!r}, expected one of {sorted(DTYPES)}")
+        self.path = path.rstrip(os.sep)
+        self.dtype = dtype
+        self.store_documents = store_documents
+        self.dim: Optional[int] = None
+        self.count = 0
+
+        self._tmp = self.path + ".tmp"
+        if os.path.exists(self._tmp):
+            shutil.rmtree(self._tmp)
+        os.makedirs(self._tmp)
+        self._vectors = open(os.path.join(self._tmp, "vectors.bin"), 'wb')
+        self._scales = open(os.path.join(self._tmp, "scales.f32"), 'wb') if dtype == "int8" else None
+        self._ids = open(os.path.join(self._tmp, "ids.bin"), 'wb')
+        self._id_offsets = [0]
+        self._docs = open(os.path.join(self._tmp, "docs.jsonl"), 'wb') if store_documents else None
+        self._doc_offsets = [0]
+        self._fingerprint = 0
+
+    def add(self, ids: List[str], embeddings, documents: Optional[List[str]] = None,
+            metadatas: Optional[List[Dict[str, Any]]] = None):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[0] != len(ids):
+            raise ValueError(f"Batch mismatch: {len(ids)} ids vs embeddings of shape {embeddings.shape}")
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension changed from {self.dim} to {embeddings.shape[1]}")
+
+        if self.dtype == "int8":
+            codes, scales = quantize_int8(embeddings)
+            self._vectors.write(codes.tobytes())
+            self._scales.write(scales.tobytes())
+        else:
+            self._vectors.write(embeddings.astype(DTYPES[self.dtype]).tobytes())
+
+        for chunk_id in ids:
+            raw = chunk_id.encode('utf-8')
+            self._ids.write(raw)
+            self._id_offsets.append(self._id_offsets[-1] + len(raw))
+
+        if self._docs is not None:
+            documents = documents or [""] * len(ids)
+            metadatas = metadatas or [{}] * len(ids)
+            self._fingerprint = combine_fingerprints(
+                [self._fingerprint] + [chunk_fingerprint(i, t) for i, t in zip(ids, documents)])
+            for text, metadata in zip(documents, metadatas):
+                line = json.dumps({"document": text, "metadata": metadata}, ensure_ascii=False).encode('utf-8') + b'\n'
+                self._docs.write(line)
+                self._doc_offsets.append(self._doc_offsets[-1] + len(line))
+
+        self.count += len(ids)
+
+    def add_chunks(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]], embeddings):
+        self.add(ids, embeddings, texts, metadatas)
+
+    def close(self, extra_header: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        for handle in (self._vectors, self._scales, self._ids, self._docs):
+            if handle is not None:
+                handle.close()
+        np.asarray(self._id_offsets, dtype=np.int64).tofile(os.path.join(self._tmp, "ids.off"))
+        if self._docs is not None:
+            np.asarray(self._doc_offsets, dtype=np.int64).tofile(os.path.join(self._tmp, "docs.off"))
+
+        header = {
+            "version": STORE_VERSION,
+            "dtype": self.dtype,
+            "dim": self.dim or 0,
+            "count": self.count,
+            "has_documents": self._docs is not None
+        }
+        if self._docs is not None:
+            header["corpus_fingerprint"] = format_fingerprint(self._fingerprint)
+        header.update(extra_header or {})
+        with open(os.path.join(self._tmp, "header.json"), 'w') as f:
+            json.dump(header, f, indent=2)
+
+        if os.path.exists(self.path):
+            old = self.path + ".old"
+            if os.path.exists(old):
+                shutil.rmtree(old)
+            os.replace(self.path, old)
+            os.replace(self._tmp, self.path)
+            shutil.rmtree(old)
+        else:
+            os.replace(self._tmp, self.path)
+        return header
+
+    def abort(self):
+        for handle in (self._vectors, self._scales, self._ids, self._docs):
+            if handle is not None and not handle.closed:
+                handle.close()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+class VectorStore:
+    """
+    Read-only, memory-mapped view of a store written by VectorStoreWriter.
+    Opening only maps files, so cold start is independent of corpus size.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "header.json"), 'r') as f:
+            self.header = json.load(f)
+        if self.header.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported vector store version {self.header.get('version')}")
+
+        self.dtype = self.header["dtype"]
+        self.dim = int(self.header["dim"])
+        self.count = int(self.header["count"])
+
+        self.vectors = self._map("vectors.bin", DTYPES[self.dtype], (self.count, self.dim))
+        self.scales = self._map("scales.f32", np.float32, (self.count,)) if self.dtype == "int8" else None
+        self._id_blob = self._map("ids.bin", np.uint8, None)
+        self._id_offsets = self._map("ids.off", np.int64, (self.count + 1,))
+        self.has_documents = bool(self.header.get("has_documents"))
+        if self.has_documents:
+            self._doc_blob = self._map("docs.jsonl", np.uint8, None)
+            self._doc_offsets = self._map("docs.off", np.int64, (self.count + 1,))
+        self._row_by_id: Optional[Dict[str, int]] = None
+
+    def _map(self, name: str, dtype, shape):
+        file_path = os.path.join(self.path, name)
+        if os.path.getsize(file_path) == 0:
+            return np.zeros(shape or (0,), dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode='r', shape=shape)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def nbytes(self) -> int:
+        """Bytes occupied by the vector payload (plus int8 scales)"""
+        return self.vectors.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def id_at(self, row: int) -> str:
+        start, end = self._id_offsets[row], self._id_offsets[row + 1]
+        return bytes(self._id_blob[start:end]).decode('utf-8')
+
+    def ids(self, rows) -> List[str]:
+        return [self.id_at(int(r)) for r in rows]
+
+    def row_of(self, chunk_id: str) -> Optional[int]:
+        if self._row_by_id is None:
+            self._row_by_id = {self.id_at(i): i for i in range(self.count)}
+        return self._row_by_id.get(chunk_id)
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """{"document", "metadata"} for a row (requires a store with documents)"""
+        if not self.has_documents:
+            return {"document": "", "metadata": {}}
+        start, end = self._doc_offsets[row], self._doc_offsets[row + 1]
+        return json.loads(bytes(self._doc_blob[start:end]))
+
+    def get_rows(self, rows) -> np.ndarray:
+        """Dequantized float32 copies of the requested rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        out = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            out *= self.scales[rows][:, None]
+        return out
+
+    def scores(self, queries: np.ndarray, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        """
+        Inner products of queries (n_q x dim) against rows [start, end).
+        Stored vectors are dequantized block by block, never all at once.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        end = self.count if end is None else end
+        out = np.empty((queries.shape[0], end - start), dtype=np.float32)
+        for block_start in range(start, end, SCORE_BLOCK_ROWS):
+            block_end = min(block_start + SCORE_BLOCK_ROWS, end)
+            block = self.vectors[block_start:block_end]
+            if self.dtype == "float32":
+                block_scores = queries @ block.T
+            else:
+                block_scores = queries @ block.astype(np.float32).T
+            if self.scales is not None:
+                block_scores *= self.scales[block_start:block_end]
+            out[:, block_start - start:block_end - start] = block_scores
+        return out
+
+
+def build_from_collection(collection, path: str, dtype: str = "float32",
+                          store_documents: bool = True, page_size: int = 1000) -> Dict[str, Any]:
+    """Write a vector store from every row of a Chroma collection"""
+    from scripts.cpp_export import iter_collection
+
+    writer = VectorStoreWriter(path, dtype=dtype, store_documents=store_documents)
+    try:
+        for ids, texts, metadatas, embeddings in iter_collection(collection, page_size):
+            writer.add(ids, embeddings, texts, metadatas)
+        return writer.close({"collection": collection.name})
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect a contiguous vector store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Build a store from a Chroma collection")
+    build.add_argument("--out", required=True, help="Store directory")
+    build.add_argument("--dtype", choices=sorted(DTYPES), default="float16", help="Storage dtype")
+    build.add_argument("--chroma-path", default="/home/rag_cache/chroma_db", help="ChromaDB directory")
+    build.add_argument("--collection", default="huawei_docs", help="Collection name")
+    build.add_argument("--no-documents", action="store_true", help="Only store ids and vectors")
+    info = sub.add_parser("info", help="Print store header and footprint")
+    info.add_argument("path", help="Store directory")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        import chromadb
+        client = chromadb.PersistentClient(path=args.chroma_path)
+        collection = client.get_collection(name=args.collection)
+        print(f"Building {args.dtype} vector store from '{args.collection}' ({collection.count():,} rows)...")
+        header = build_from_collection(collection, args.out, args.dtype, not args.no_documents)
+        print(f"✅ Wrote {header['count']:,} x {header['dim']} vectors to {args.out}")
+    else:
+        store = VectorStore(args.path)
+        print(json.dumps(store.header, indent=2))
+        float32_bytes = store.count * store.dim * 4
+        print(f"Vector payload: {store.nbytes() / 1e6:.1f} MB "
+              f"({float32_bytes / max(store.nbytes(), 1):.1f}x smaller than float32)")
+
+
+if __name__ == "__main__":
+    main()
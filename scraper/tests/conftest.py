@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the ingest / query modules the way the scripts do: `from scripts.X import ...`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,178 @@
+import os
+import math
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from scripts.bm25_index import B, K1, BM25Index, collection_fingerprint, load_or_build, tokenize
+from scripts.ingest_manifest import IngestManifest, corpus_fingerprint
+
+WORDS = ["ecs", "obs", "vpc", "bucket", "instance", "create", "delete", "policy", "subnet", "云", "服务器"]
+
+
+def random_corpus(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    ids = [f"chunk_{i}" for i in range(count)]
+    docs = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 30))) for _ in range(count)]
+    return ids, docs
+
+
+def reference_scores(docs, query):
+    """Textbook BM25 with the index's non-negative IDF"""
+    tokenized = [Counter(tokenize(d)) for d in docs]
+    avgdl = sum(sum(c.values()) for c in tokenized) / len(docs)
+    scores = []
+    for counts in tokenized:
+        dl = sum(counts.values())
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(1 for c in tokenized if term in c)
+            tf = counts.get(term, 0)
+            if tf:
+                idf = math.log1p((len(docs) - df + 0.5) / (df + 0.5))
+                score += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl / avgdl))
+        scores.append(score)
+    return np.array(scores, dtype=np.float32)
+
+
+class FakeCollection:
+    """The count/get subset of a Chroma collection read_corpus uses"""
+
+    def __init__(self, ids, docs, metadata=None, name="huawei_docs"):
+        self.ids, self.docs = ids, docs
+        self.metadata = metadata
+        self.name = name
+        self.reads = 0
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, limit, offset, include):
+        self.reads += 1
+        page = {"ids": self.ids[offset:offset + limit], "documents": self.docs[offset:offset + limit]}
+        if "metadatas" in include:
+            page["metadatas"] = [{"headers": f"h{i}"} for i in range(offset, offset + len(page["ids"]))]
+        return page
+
+
+def test_scores_match_reference():
+    ids, docs = random_corpus(60)
+    index = BM25Index.build(ids, docs)
+    for query in ("ecs instance", "云 bucket policy", "missing words"):
+        np.testing.assert_allclose(index.score_rows(query, range(60)), reference_scores(docs, query), rtol=1e-5)
+
+
+def test_maxscore_agrees_with_exhaustive():
+    ids, docs = random_corpus(400, seed=1)
+    index = BM25Index.build(ids, docs)
+    for query in ("ecs", "create delete subnet", "服务器 vpc obs bucket", "nothing"):
+        for k in (1, 10, 1000):
+            rows, scores = index.top_k(query, k)
+            _, expected = index.top_k_exhaustive(query, k)
+            np.testing.assert_allclose(scores, expected, rtol=1e-5)
+            np.testing.assert_allclose(index.score_rows(query, rows), scores, rtol=1e-5)
+
+
+def test_repeated_query_terms_count_once():
+    ids, docs = random_corpus(40, seed=2)
+    index = BM25Index.build(ids, docs)
+    np.testing.assert_array_equal(index.score_rows("ecs ECS ecs!", range(40)), index.score_rows("ecs", range(40)))
+    assert index.query_terms("ecs ecs 云") == index.query_terms("云 ecs")
+
+
+def test_documents_without_tokens_never_score():
+    ids = ["a", "b", "c", "d"]
+    index = BM25Index.build(ids, ["", "ecs bucket", "!! --", "ecs"])
+    assert index.doc_lengths.tolist() == [0, 2, 0, 1] and index.avgdl == 0.75
+    rows, scores = index.top_k("ecs", 10)
+    assert rows.tolist() == [3, 1] and (scores > 0).all()
+    assert index.score_rows("ecs", [0, 2]).tolist() == [0.0, 0.0]
+
+
+def test_loaded_index_is_memory_mapped(tmp_path):
+    ids = [f"页面_{i}" for i in range(50)]
+    _, docs = random_corpus(50)
+    built = BM25Index.build(ids, docs)
+    built.save(str(tmp_path / "bm25"), {"collection": "huawei_docs"})
+
+    loaded = BM25Index.load(str(tmp_path / "bm25"))
+    assert all(isinstance(loaded.arrays[name], np.memmap) for name in BM25Index.FILES)
+    np.testing.assert_array_equal(loaded.term_max, built.term_max)  # Bounds persisted, not recomputed
+    assert loaded.row_of("页面_17") == 17 and loaded.row_of("页面_99") is None
+    for query in ("ecs bucket", "云"):
+        np.testing.assert_array_equal(loaded.top_k(query, 5)[0], built.top_k(query, 5)[0])
+
+
+def test_duplicate_chunk_ids_are_rejected():
+    with pytest.raises(ValueError, match="collision"):
+        BM25Index.build(["a", "b", "a"], ["ecs", "obs", "vpc"])
+
+
+def test_manifest_fingerprint_trusted_only_when_count_matches(tmp_path):
+    ids, docs = random_corpus(30)
+    manifest = IngestManifest(str(tmp_path / "manifest.json"), str(tmp_path), {})
+    manifest.reset()
+    (tmp_path / "page.md").write_text("# Page")
+    manifest.record(str(tmp_path / "page.md"), ids, docs)
+    manifest.save()
+
+    collection = FakeCollection(ids, docs)  # Chroma: no fingerprint of its own
+    assert collection_fingerprint(collection) is None
+    assert collection_fingerprint(collection, manifest.path) == corpus_fingerprint(ids, docs)
+    load_or_build(collection, str(tmp_path / "bm25"), manifest.path, verbose=False)
+    load_or_build(collection, str(tmp_path / "bm25"), manifest.path, verbose=False)
+    assert collection.reads == 1  # Built once; the fresh index was then trusted without a read
+
+    # A run that died before saving its manifest: the recorded count no longer matches
+    grown = FakeCollection(ids + ["chunk_new"], docs + ["ecs new"])
+    assert collection_fingerprint(grown, manifest.path) is None
+    index = load_or_build(grown, str(tmp_path / "bm25"), manifest.path, verbose=False)
+    assert index.num_docs == 31 and index.row_of("chunk_new") == 30
+
+    labelled = FakeCollection(ids, docs, {"corpus_fingerprint": "from-the-store"})
+    assert collection_fingerprint(labelled, manifest.path) == "from-the-store"
+
+
+def test_load_or_build_uses_fingerprint(tmp_path):
+    path = str(tmp_path / "bm25")
+    ids, docs = random_corpus(30)
+    fingerprint = corpus_fingerprint(ids, docs)
+    collection = FakeCollection(ids, docs, {"corpus_fingerprint": fingerprint})
+
+    built = load_or_build(collection, path, verbose=False)
+    assert collection.reads == 1 and built.fingerprint == fingerprint
+
+    loaded = load_or_build(collection, path, verbose=False)
+    assert collection.reads == 1  # Fresh index: loaded without reading the corpus
+    assert loaded.path == path
+
+    docs[0] = "edited ecs text"
+    changed = FakeCollection(ids, docs, {"corpus_fingerprint": corpus_fingerprint(ids, docs)})
+    rebuilt = load_or_build(changed, path, verbose=False)
+    assert changed.reads == 1 and rebuilt.fingerprint != fingerprint
+    assert rebuilt.score_rows("edited", [0])[0] > 0
+
+
+def test_load_or_build_without_recorded_fingerprint(tmp_path):
+    path = str(tmp_path / "bm25")
+    ids, docs = random_corpus(30)
+    collection = FakeCollection(ids, docs)
+    load_or_build(collection, path, verbose=False)
+    index = load_or_build(collection, path, verbose=False)
+    assert collection.reads == 2  # Fingerprint computed from the corpus each time, index loaded the second
+    assert index.fingerprint == corpus_fingerprint(ids, docs)
+
+    with open(os.path.join(path, "header.json"), "w") as f:
+        f.write("{")
+    assert load_or_build(collection, path, verbose=False).num_docs == 30
+
+
+def test_text_fn_indexes_derived_text(tmp_path):
+    ids, docs = random_corpus(5)
+    collection = FakeCollection(ids, docs)
+    index = load_or_build(collection, str(tmp_path / "headers"), verbose=False,
+                          text_fn=lambda doc, meta: meta["headers"])
+    assert index.top_k("h3", 1)[0].tolist() == [3]
+    assert index.fingerprint == corpus_fingerprint(ids, docs)  # Keyed by the corpus, not the derived text
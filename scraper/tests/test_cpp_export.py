@@ -0,0 +1,92 @@
+import gzip
+import json
+import os
+import struct
+
+import numpy as np
+import pytest
+
+from scripts.cpp_export import DOCS_FILE, EMBEDDINGS_FILE, CppCorpusWriter
+
+
+def read_like_server(out_dir):
+    """documents.json / embeddings.bin parsed the way rag-cpp-server's loader does (.gz preferred)"""
+    def payload(name):
+        path = os.path.join(out_dir, name)
+        if os.path.exists(path + ".gz"):
+            with gzip.open(path + ".gz", 'rb') as f:
+                return f.read()
+        with open(path, 'rb') as f:
+            return f.read()
+
+    docs = json.loads(payload(DOCS_FILE))
+    buffer = payload(EMBEDDINGS_FILE)
+    count, = struct.unpack_from('<I', buffer, 0)
+    offset, rows = 4, []
+    for _ in range(count):
+        dim, = struct.unpack_from('<I', buffer, offset)
+        rows.append(np.frombuffer(buffer, dtype='<f4', count=dim, offset=offset + 4))
+        offset += 4 + 4 * dim
+    assert offset == len(buffer)
+    return docs, rows
+
+
+def docs(n, start=0):
+    return [{"id": f"c{i}", "content": f"text {i}"} for i in range(start, start + n)]
+
+
+def test_count_patched_and_rows_prefixed(tmp_path):
+    embeddings = np.arange(5 * 3, dtype=np.float32).reshape(5, 3) / 7
+    writer = CppCorpusWriter(str(tmp_path), categories={})
+    writer.add(docs(2), embeddings[:2])
+    writer.add(docs(3, start=2), embeddings[2:])
+    assert writer.close() == {"documents": 5, "dim": 3, "compressed": False}
+
+    with open(tmp_path / EMBEDDINGS_FILE, 'rb') as f:
+        raw = f.read()
+    assert struct.unpack_from('<I', raw, 0) == (5,)
+    assert len(raw) == 4 + 5 * (4 + 3 * 4)
+    for row in range(5):
+        offset = 4 + row * 16
+        assert struct.unpack_from('<I', raw, offset) == (3,)
+        assert struct.unpack_from('<3f', raw, offset + 4) == tuple(embeddings[row].astype('<f4'))
+
+    loaded_docs, rows = read_like_server(str(tmp_path))
+    assert [d["id"] for d in loaded_docs] == [f"c{i}" for i in range(5)]
+    np.testing.assert_array_equal(np.stack(rows), embeddings)
+
+
+def test_add_chunks_maps_metadata(tmp_path):
+    writer = CppCorpusWriter(str(tmp_path), categories={"ecs": "compute"})
+    writer.add_chunks(["c0"], ["body"], [{"service": "ecs", "headers": '["ECS", "Create"]', "url": "u"}],
+                      np.ones((1, 2)))
+    writer.close()
+    assert read_like_server(str(tmp_path))[0] == [
+        {"id": "c0", "content": "body", "source": "u", "title": "Create", "product": "ECS", "category": "compute"}]
+
+
+def test_count_mismatch_rejected(tmp_path):
+    writer = CppCorpusWriter(str(tmp_path), categories={})
+    with pytest.raises(ValueError, match="Batch mismatch"):
+        writer.add(docs(3), np.zeros((2, 4)))
+    writer.add(docs(2), np.zeros((2, 4)))
+    with pytest.raises(ValueError, match="dimension changed"):
+        writer.add(docs(1), np.zeros((1, 5)))
+
+    writer.doc_count += 1  # A document without a vector
+    with pytest.raises(ValueError, match="count mismatch"):
+        writer.close()
+    writer.abort()
+    assert os.listdir(tmp_path) == []  # Nothing installed, temporaries removed
+
+
+@pytest.mark.parametrize("first,second", [(False, True), (True, False)])
+def test_switching_compression_removes_stale_variant(tmp_path, first, second):
+    for compress, value in ((first, 1.0), (second, 2.0)):
+        writer = CppCorpusWriter(str(tmp_path), compress=compress, categories={})
+        writer.add(docs(1), np.full((1, 2), value))
+        writer.close()
+
+    suffix = ".gz" if second else ""
+    assert sorted(os.listdir(tmp_path)) == [DOCS_FILE + suffix, EMBEDDINGS_FILE + suffix]
+    assert read_like_server(str(tmp_path))[1][0].tolist() == [2.0, 2.0]
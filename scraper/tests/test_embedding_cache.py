@@ -0,0 +1,100 @@
+import os
+import json
+
+import numpy as np
+
+from scripts.embedding_cache import EmbeddingCache
+
+DIM = 4
+
+
+class FakeModel:
+    """encode() with deterministic vectors that records every text it was asked for"""
+
+    def __init__(self):
+        self.seen = []
+
+    def encode(self, texts, **kwargs):
+        self.seen.extend(texts)
+        return np.array([[len(t), sum(map(ord, t)) % 97, 1.0, -1.0] for t in texts], dtype=np.float32)
+
+
+def test_hub_model_name_persists(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "sentence-transformers/all-MiniLM-L6-v2")
+    first = cache.encode(FakeModel(), ["alpha", "beta"])
+    assert sorted(os.listdir(tmp_path)) == ["sentence-transformers__all-MiniLM-L6-v2" + ext
+                                            for ext in (".f32", ".json", ".keys")]
+
+    reopened = EmbeddingCache(str(tmp_path), "sentence-transformers/all-MiniLM-L6-v2")
+    model = FakeModel()
+    vectors = reopened.encode(model, ["beta", "alpha"])
+    assert model.seen == []
+    assert type(vectors) is np.ndarray  # A copy, not a view of the memory map
+    np.testing.assert_array_equal(vectors, first[::-1])
+
+
+def test_only_misses_reach_the_model(tmp_path):
+    model = FakeModel()
+    cache = EmbeddingCache(str(tmp_path), "model-a")
+    cache.encode(model, ["alpha"])
+    vectors = cache.encode(model, ["alpha", "gamma", "gamma", "  alpha\n"])
+
+    assert model.seen == ["alpha", "gamma"]  # In-batch duplicates and whitespace variants hit
+    assert cache.rows == 2
+    np.testing.assert_array_equal(vectors[0], vectors[3])
+    assert (cache.hits, cache.misses) == (2, 3)  # Counted per text: both gammas missed the cache
+
+
+def test_hits_and_misses_keep_input_order(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model-a")
+    cache.encode(FakeModel(), ["beta", "delta"])
+    texts = ["alpha", "beta", "gamma", "delta", "alpha"]
+    np.testing.assert_array_equal(cache.encode(FakeModel(), texts), FakeModel().encode(texts))
+    assert cache.rows == 4
+
+
+def test_zero_vector(tmp_path):
+    class ZeroModel(FakeModel):
+        def encode(self, texts, **kwargs):
+            super().encode(texts)
+            return np.zeros((len(texts), DIM), dtype=np.float32)
+
+    EmbeddingCache(str(tmp_path), "model-a").encode(ZeroModel(), [""])
+    reopened = EmbeddingCache(str(tmp_path), "model-a")
+    model = FakeModel()
+    np.testing.assert_array_equal(reopened.encode(model, [""]), np.zeros((1, DIM)))
+    assert model.seen == []
+
+
+def test_append_skips_known_keys(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model-a")
+    keys, _ = cache.lookup(["alpha", "beta"])
+    cache.append(keys, np.ones((2, DIM)))
+    cache.append(keys[::-1] + keys, np.zeros((4, DIM)))
+    assert cache.rows == 2
+    assert os.path.getsize(cache.data_path) == 2 * DIM * 4
+    np.testing.assert_array_equal(cache.encode(FakeModel(), ["beta"]), np.ones((1, DIM)))
+
+
+def test_stale_header_starts_fresh(tmp_path, capsys):
+    cache = EmbeddingCache(str(tmp_path), "model-a")
+    cache.encode(FakeModel(), ["alpha"])
+    with open(cache.meta_path) as f:
+        meta = json.load(f)
+    with open(cache.meta_path, "w") as f:
+        json.dump(dict(meta, version=0), f)
+
+    reopened = EmbeddingCache(str(tmp_path), "model-a")
+    assert "incompatible" in capsys.readouterr().out
+    assert reopened.rows == 0 and not os.path.exists(reopened.data_path)
+    model = FakeModel()
+    reopened.encode(model, ["alpha"])
+    assert model.seen == ["alpha"]
+
+
+def test_models_never_share_rows(tmp_path):
+    EmbeddingCache(str(tmp_path), "model-a").encode(FakeModel(), ["alpha"])
+    other = EmbeddingCache(str(tmp_path), "model-a:onnx-int8")
+    model = FakeModel()
+    other.encode(model, ["alpha"])
+    assert model.seen == ["alpha"]
@@ -0,0 +1,127 @@
+import io
+import json
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+from scripts import hybrid_query, thesaurus
+from scripts.result_cache import ResultCache
+from scripts.vector_store import VectorStoreWriter
+
+DIM = 32
+DOCS = [
+    ("ecs", "Create an ECS instance", "To create an ECS instance, choose a flavor and an image."),
+    ("ecs", "Resize an ECS instance", "Stop the instance before you change its flavor."),
+    ("obs", "Upload objects to OBS", "Upload objects to an OBS bucket with the console or obsutil."),
+    ("obs", "Bucket policies", "A bucket policy grants other accounts access to OBS objects."),
+    ("vpc", "Create a VPC", "A VPC needs a CIDR block and at least one subnet."),
+    ("vpc", "Security groups", "Security group rules control inbound and outbound traffic."),
+]
+
+
+def embed(texts):
+    """Stand-in for the sentence-transformers model: hashed bag of words"""
+    vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in text.lower().split():
+            vectors[row, zlib.crc32(token.strip(".,?").encode()) % DIM] += 1.0
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-6)
+
+
+def write_store(path, docs=DOCS):
+    writer = VectorStoreWriter(str(path))
+    writer.add([f"chunk_{i}" for i in range(len(docs))], embed([text for _, _, text in docs]),
+               [text for _, _, text in docs],
+               [{"service": service, "title": title, "headers": json.dumps([title])}
+                for service, title, _ in docs])
+    writer.close()
+    return str(path)
+
+
+@pytest.fixture
+def local_query(tmp_path, monkeypatch):
+    """hybrid_query on a vector store in tmp_path, with embed() as the query encoder"""
+    monkeypatch.setattr(hybrid_query, "BM25_CACHE_DIR", str(tmp_path / "bm25"))
+    monkeypatch.setattr(hybrid_query, "MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(hybrid_query, "_query_encoder", embed)
+    monkeypatch.setattr(hybrid_query, "_bm25_indexes", {})
+    monkeypatch.setattr(hybrid_query, "_corpus_versions", {})
+    monkeypatch.setattr(hybrid_query, "_result_cache", ResultCache())
+    return write_store(tmp_path / "store")
+
+
+def test_batch_file_stdout_is_jsonl(local_query, monkeypatch, capsys):
+    queries = ["create ecs instance", "obs bucket policy", "vpc subnet", "create ecs instance"]
+    monkeypatch.setattr(sys, "stdin", io.StringIO("".join(json.dumps({"query": q, "id": i}) + "\n"
+                                                          for i, q in enumerate(queries))))
+    # Not --quiet, and the BM25 indexes are built from scratch: progress must stay off stdout
+    monkeypatch.setattr(sys, "argv", ["hybrid_query.py", "--batch-file", "-", "--top-k", "2",
+                                      "--backend", "exact", "--vector-store", local_query])
+    hybrid_query.main()
+
+    out, err = capsys.readouterr()
+    records = [json.loads(line) for line in out.splitlines()]
+    assert [r["id"] for r in records] == [0, 1, 2, 3]
+    assert all(len(r["results"]) == 2 for r in records)
+    assert records[0]["results"][0]["metadata"]["service"] == "ecs"
+    assert records[1]["results"][0]["metadata"]["service"] == "obs"
+    assert records[0] == dict(records[3], id=0)
+    assert "BM25" in err
+
+
+@pytest.fixture
+def collection(local_query, monkeypatch):
+    monkeypatch.setattr(hybrid_query, "VERSION_CHECK_SECONDS", 0.0)
+    return hybrid_query.open_collection("exact", vector_store_path=local_query, embed_fn=embed)
+
+
+def test_corpus_change_invalidates_caches(collection):
+    first = hybrid_query.hybrid_search(collection, "create ecs instance", top_k=2)
+    assert hybrid_query.hybrid_search(collection, "create ecs instance", top_k=2) == first
+    assert hybrid_query._result_cache.stats()["hits"] == 1
+    assert "huawei_docs:content" in hybrid_query._bm25_indexes
+
+    collection.metadata["corpus_fingerprint"] = "re-ingested"
+    hybrid_query.corpus_version(collection)
+    assert hybrid_query._result_cache.stats()["entries"] == 0
+    assert hybrid_query._bm25_indexes == {}
+
+
+def test_manifest_change_invalidates_caches(collection, tmp_path):
+    del collection.metadata["corpus_fingerprint"]  # Chroma-like: versioned by the ingest manifest
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text("{}")
+    hybrid_query.hybrid_search(collection, "obs bucket policy", top_k=2)
+    hybrid_query.corpus_version(collection)
+    assert hybrid_query._result_cache.stats()["entries"] == 1
+
+    manifest.write_text('{"files": {}}')
+    hybrid_query.corpus_version(collection)
+    assert hybrid_query._result_cache.stats()["entries"] == 0
+    assert hybrid_query._bm25_indexes == {}
+
+
+def test_thesaurus_change_misses(collection, monkeypatch):
+    hybrid_query.hybrid_search(collection, "vpc subnet", top_k=2)
+    artifact = thesaurus.build(thesaurus.SOURCE_PATH, None)
+    monkeypatch.setattr(thesaurus, "_current", thesaurus.Thesaurus(dict(artifact, source_hash="edited")))
+
+    hybrid_query.hybrid_search(collection, "vpc subnet", top_k=2)
+    stats = hybrid_query._result_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (0, 2, 2)
+
+
+def test_cached_results_survive_caller_mutation(collection):
+    results = hybrid_query.hybrid_search(collection, "create ecs instance", top_k=2)
+    expected = json.loads(json.dumps(results))
+    results[0]["metadata"]["service"] = "mutated"
+    results[0]["ranks"].clear()
+    results.pop()
+
+    again = hybrid_query.hybrid_search(collection, "create ecs instance", top_k=2)
+    assert hybrid_query._result_cache.stats()["hits"] == 1
+    assert json.loads(json.dumps(again)) == expected
+    again[0]["metadata"]["service"] = "mutated"
+    assert hybrid_query.hybrid_search(collection, "create ecs instance", top_k=2)[0]["metadata"]["service"] == "ecs"
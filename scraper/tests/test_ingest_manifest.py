@@ -0,0 +1,132 @@
+import os
+import json
+
+import pytest
+
+from scripts import ingest_manifest
+from scripts.ingest_manifest import IngestManifest, corpus_fingerprint, recorded_fingerprint
+
+PARAMS = {"ingester": "test", "model": "m", "max_chunk_size": 1000, "splitter": 2}
+
+
+def write(path, text: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def docs(tmp_path):
+    root = tmp_path / "docs"
+    files = [write(root / "ecs" / f"page_{i}.md", f"# Page {i}\n\nbody {i}") for i in range(3)]
+    return str(root), files
+
+
+def new_manifest(tmp_path, docs_root, params=PARAMS):
+    return IngestManifest(str(tmp_path / "manifest.json"), docs_root, params)
+
+
+def record_all(manifest, files):
+    for i, path in enumerate(files):
+        manifest.record(path, [f"chunk_{i}_0", f"chunk_{i}_1"], [f"text {i}a", f"text {i}b"])
+
+
+def test_touched_file_is_hashed_once(tmp_path, docs, monkeypatch):
+    root, files = docs
+    manifest = new_manifest(tmp_path, root)
+    manifest.reset()
+    record_all(manifest, manifest.diff(files).to_process())
+    manifest.save()
+
+    hashed = []
+    hash_document = ingest_manifest.hash_document
+    monkeypatch.setattr(ingest_manifest, "hash_document", lambda path: hashed.append(path) or hash_document(path))
+    os.utime(files[0], (5, 5))
+    loaded = new_manifest(tmp_path, root)
+    assert loaded.load()
+    assert loaded.diff(files).unchanged == files
+    assert hashed == [files[0]]  # Stat mismatch: hashed, found identical, stat info refreshed
+    assert loaded.diff(files).unchanged == files
+    assert hashed == [files[0]]  # Fast path from then on
+
+
+def test_diff_classifies_changes(tmp_path, docs):
+    root, files = docs
+    manifest = new_manifest(tmp_path, root)
+    manifest.reset()
+    record_all(manifest, manifest.diff(files).to_process())
+
+    write(tmp_path / "docs" / "ecs" / "page_0.md", "# Page 0\n\nedited")
+    os.utime(files[1], (1, 1))  # Touched, same content
+    added = write(tmp_path / "docs" / "obs" / "new.md", "# New")
+    diff = manifest.diff([files[0], files[1], added])
+
+    assert diff.changed == [files[0]]
+    assert diff.unchanged == [files[1]]
+    assert diff.added == [added]
+    assert diff.removed == [os.path.join("ecs", "page_2.md")]
+    assert sorted(manifest.stale_chunk_ids(diff)) == ["chunk_0_0", "chunk_0_1", "chunk_2_0", "chunk_2_1"]
+
+
+def test_sidecar_change_counts_as_change(tmp_path, docs):
+    root, files = docs
+    manifest = new_manifest(tmp_path, root)
+    manifest.reset()
+    record_all(manifest, manifest.diff(files).to_process())
+
+    write(tmp_path / "docs" / "ecs" / "page_1.json", json.dumps({"url": "https://example.com"}))
+    assert manifest.diff(files).changed == [files[1]]
+
+
+def test_forgotten_file_is_retried(tmp_path, docs):
+    root, files = docs
+    manifest = new_manifest(tmp_path, root)
+    manifest.reset()
+    record_all(manifest, manifest.diff(files).to_process())
+    manifest.forget([manifest.relpath(files[2])])  # e.g. it failed to chunk
+    manifest.save()
+
+    loaded = new_manifest(tmp_path, root)
+    assert loaded.load()
+    assert loaded.diff(files).added == [files[2]]
+
+
+def test_stale_params_force_rebuild(tmp_path, docs):
+    root, files = docs
+    manifest = new_manifest(tmp_path, root)
+    manifest.reset()
+    record_all(manifest, files)
+    manifest.save()
+
+    stale = new_manifest(tmp_path, root, dict(PARAMS, splitter=1))
+    assert not stale.load()
+    assert stale.entries == {}
+    assert stale.diff(files).added == files
+
+
+def test_record_without_texts_has_no_fingerprint(tmp_path, docs):
+    root, files = docs
+    manifest = new_manifest(tmp_path, root)
+    manifest.reset()
+    record_all(manifest, files[:2])
+    manifest.record(files[2], ["chunk_2_0"])  # No diff() first, no texts: e.g. an older ingester
+    manifest.save()
+
+    assert manifest.entries[manifest.relpath(files[2])].content_hash == ingest_manifest.hash_document(files[2])
+    assert manifest.corpus_fingerprint() is None
+    assert recorded_fingerprint(manifest.path) is None
+    with open(manifest.path, encoding="utf-8") as f:
+        assert json.load(f)["chunks"] == 5
+
+
+def test_fingerprint_is_order_independent(tmp_path, docs):
+    root, files = docs
+    manifest = new_manifest(tmp_path, root)
+    manifest.reset()
+    record_all(manifest, files)
+
+    ids = [f"chunk_{i}_{j}" for i in range(3) for j in range(2)]
+    texts = [f"text {i}{c}" for i in range(3) for c in "ab"]
+    assert manifest.corpus_fingerprint() == corpus_fingerprint(ids, texts)
+    assert corpus_fingerprint(ids[::-1], texts[::-1]) == corpus_fingerprint(ids, texts)
+    assert corpus_fingerprint(ids, texts[:-1] + ["edited"]) != corpus_fingerprint(ids, texts)
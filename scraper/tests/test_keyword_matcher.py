@@ -0,0 +1,88 @@
+import json
+import random
+
+import pytest
+
+from scripts import thesaurus
+from scripts.keyword_matcher import AhoCorasick
+
+
+def substring_matches(patterns, text):
+    return {keyword for keyword in patterns if keyword in text}
+
+
+@pytest.mark.parametrize("text", ["ushers", "hishers", "she", "h", "", "xhersx", "shishe"])
+def test_overlapping_keywords(text):
+    patterns = ["he", "she", "his", "hers", "s"]
+    matcher = AhoCorasick((keyword, keyword) for keyword in patterns)
+    assert len(matcher.matches(text)) == len(set(matcher.matches(text)))
+    assert set(matcher.matches(text)) == substring_matches(patterns, text)
+
+
+def test_keywords_inside_longer_keywords():
+    patterns = ["ecs", "ecs instance", "instance", "cs in", "elastic cloud server", "cloud"]
+    matcher = AhoCorasick((keyword, i) for i, keyword in enumerate(patterns))
+    for text in ["create an ecs instance", "ecs", "ecs instanc", "elastic cloud servers", "cs instance"]:
+        assert {patterns[i] for i in matcher.matches(text)} == substring_matches(patterns, text)
+
+
+def test_empty_keyword_rejected():
+    with pytest.raises(ValueError):
+        AhoCorasick([("", None)])
+
+
+def test_tables_round_trip():
+    matcher = AhoCorasick([("ab", ["x", 1]), ("b", ["y", 2])])
+    restored = AhoCorasick.from_tables(json.loads(json.dumps(matcher.tables())))
+    assert restored.matches("cab") == matcher.matches("cab") == [["x", 1], ["y", 2]]
+    with pytest.raises(ValueError):
+        AhoCorasick.from_tables(dict(matcher.tables(), fail=[0]))
+
+
+def old_service_boost(tables, query, service):
+    """The pre-matcher loop: every keyword tested with `in`"""
+    query_lower = query.lower()
+    boost = 1.0
+    for keyword, service_boosts in tables.service_keyword_boosts.items():
+        if keyword in query_lower and service in service_boosts:
+            boost *= service_boosts[service]
+    return boost
+
+
+def old_doc_type_boost(tables, query, doc_type):
+    """The pre-matcher if/elif chain: first triggered intent covering doc_type wins"""
+    query_lower = query.lower()
+    for key, words, doc_types in tables.document_type_intents:
+        if any(w in query_lower for w in words) and doc_type.lower() in doc_types:
+            return tables.document_type_boosts.get(key, 1.0)
+    return 1.0
+
+
+def shipped_queries(tables, count=3000):
+    keywords = list(tables.service_keyword_boosts) + [w for _, words, _ in tables.document_type_intents
+                                                      for w in words]
+    rng = random.Random(0)
+    queries = list(keywords)
+    for _ in range(count):
+        picked = rng.sample(keywords, rng.randint(1, 4))
+        glue = rng.choice([" ", "", "-", " how to "])
+        query = glue.join(picked)
+        if rng.random() < 0.3:  # Cut into a keyword
+            query = query[rng.randint(0, 2):len(query) - rng.randint(0, 2)]
+        queries.append(query.upper() if rng.random() < 0.1 else query)
+    return queries
+
+
+def test_shipped_thesaurus_matches_substring_loop():
+    # Through a JSON round trip, like a thesaurus loaded from the compiled artifact
+    shipped = thesaurus.Thesaurus(json.loads(json.dumps(thesaurus.build(thesaurus.SOURCE_PATH, None))))
+    services = sorted({s for boosts in shipped.service_keyword_boosts.values() for s in boosts})
+    doc_types = sorted({d for _, _, types in shipped.document_type_intents for d in types}) + ["Other"]
+    for query in shipped_queries(shipped):
+        boosts = shipped.query_boosts(query)
+        for service in services:
+            assert boosts.service_boost(service) == pytest.approx(old_service_boost(shipped, query, service)), \
+                (query, service)
+        for doc_type in doc_types:
+            assert boosts.doc_type_boost(doc_type) == old_doc_type_boost(shipped, query, doc_type), \
+                (query, doc_type)
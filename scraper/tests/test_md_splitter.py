@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from scripts import fast_ingest
+from scripts.md_splitter import (
+    SPLITTER_VERSION, _legacy_split_document, count_tokens, find_headers, iter_sections,
+    pack_paragraphs, simple_tokenize, split_document, word_tokens
+)
+
+
+def test_sections_carry_their_header_stack_once():
+    content = "intro is dropped\n# Guide\nsetup steps\n## Create\ncreate an ECS\n### Empty\n## Delete\ndelete it\n"
+    assert list(split_document(content)) == [
+        (["Guide"], "# Guide setup steps", 3),
+        (["Guide", "Create"], "# Guide ## Create create an ECS", 5),
+        (["Guide", "Delete"], "# Guide ## Delete delete it", 4)
+    ]
+
+
+def test_header_lines():
+    content = "#NoSpace\n  # indented\n####### seven\n# First\ntext\n###### Six  \nmore"
+    assert [(level, text) for level, text, _, _ in find_headers(content)] == [(1, "First"), (6, "Six")]
+    assert [level for level, *_ in find_headers("## Top\nbody")] == [2]
+
+
+@pytest.mark.parametrize("content", ["", "   \n\n", "# Only\n\n## Headers\n"])
+def test_documents_without_bodies(content):
+    assert list(iter_sections(content)) == [([], content.strip())]
+    assert list(split_document(content, 1000, 1)) == ([] if not content.strip() else [([], " ".join(content.split()), 2)])
+
+
+def test_min_and_max_tokens():
+    body = "\n\n".join(" ".join(f"p{i}w{j}" for j in range(40)) for i in range(5))
+    content = "# Big\n" + body + "\n# Small\ntiny section"
+    chunks = list(split_document(content, max_tokens=100, min_tokens=5))
+
+    assert [headers for headers, _, _ in chunks] == [["Big"]] * 3
+    assert [tokens for _, _, tokens in chunks] == [81, 80, 40]  # "#" is not a word
+    assert all(count_tokens(text) == tokens for _, text, tokens in chunks)
+    assert chunks[0][1].startswith("# Big p0w0")
+    assert list(split_document(content, None, 5))[0][2] == 201  # max_tokens=None keeps sections whole
+
+
+def test_pack_paragraphs_keeps_oversized_paragraph_and_drops_small_tail():
+    big = " ".join(["word"] * 50)
+    pieces = pack_paragraphs(f"{big}\n\nshort one\n\n\n{big}\n\nx", max_tokens=20, min_tokens=2)
+    assert [tokens for _, tokens in pieces] == [50, 2, 50]
+
+
+def test_token_count_matches_tokenizer():
+    rng = random.Random(0)
+    alphabet = list("abcXYZ019_ -.,:;/()[]#\n\t") + ["云", "服务器", "é", "ß", "—", "١"]
+    for _ in range(300):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+        assert word_tokens(text.split()) == len(simple_tokenize(text)) == count_tokens(text)
+    assert simple_tokenize("ECS-API v2.0 (云服务器)") == ["ECS", "API", "v2", "0", "云服务器"]
+
+
+def test_legacy_splitter_reproduces_baseline_output():
+    # The old single-chunk path prepended the header block to a section that already started with it,
+    # and its tokenizer only split on whitespace
+    content = "# A\n## B\nbody, text\n"
+    assert _legacy_split_document(content) == [(["A", "B"], "# A ## B # A ## B body, text", 6)]
+    assert list(split_document(content)) == [(["A", "B"], "# A ## B body, text", 4)]
+
+    body = "\n\n".join(["one two three"] * 4)
+    assert _legacy_split_document("# H\n" + body, max_tokens=7) == [
+        (["H"], "# H one two three", 5), (["H"], "one two three one two three", 6), (["H"], "one two three", 3)
+    ]
+
+
+def test_splitter_version_is_part_of_the_manifest_params():
+    # A splitter change alters chunk text and ids, so --incremental must fall back to a full rebuild
+    assert fast_ingest.manifest_params()["splitter"] == SPLITTER_VERSION
@@ -0,0 +1,47 @@
+import os
+import tempfile
+
+from scripts import query_client
+from test_hybrid_query import write_store
+
+SCRAPER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs the real hybrid_query CLI on a vector store, with the hashed
+# bag-of-words stand-in for the model; the stray print is the kind of
+# library noise that can land on stdout
+WRAPPER = """
+import sys
+sys.path[:0] = [{scraper!r}, {tests!r}]
+from scripts import hybrid_query
+from test_hybrid_query import embed
+hybrid_query.BM25_CACHE_DIR = {bm25!r}
+hybrid_query.MANIFEST_PATH = {manifest!r}
+hybrid_query._query_encoder = embed
+print("Loading model...")
+sys.argv += ["--backend", "exact", "--vector-store", {store!r}]
+hybrid_query.main()
+"""
+
+
+def test_local_fallback_end_to_end(tmp_path, monkeypatch):
+    wrapper = tmp_path / "hybrid_query_wrapper.py"
+    wrapper.write_text(WRAPPER.format(scraper=SCRAPER_DIR, tests=os.path.join(SCRAPER_DIR, "tests"),
+                                      bm25=str(tmp_path / "bm25"), manifest=str(tmp_path / "manifest.json"),
+                                      store=write_store(tmp_path / "store")))
+    monkeypatch.setattr(query_client, "HYBRID_QUERY_SCRIPT", str(wrapper))
+    server_url = "http://127.0.0.1:9"  # Nothing listens on the discard port
+    monkeypatch.setattr(query_client, "_server_checks", {})
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(scratch))
+
+    results = query_client.search_or_local(["create ecs instance", "obs bucket policy", "vpc subnet"],
+                                           top_k=2, server_url=server_url, use_bm25=True)
+    assert [len(r) for r in results] == [2, 2, 2]
+    assert [r[0]["metadata"]["service"] for r in results] == ["ecs", "obs", "vpc"]
+    assert all("text" in result for r in results for result in r)  # --details keeps the text
+
+    no_bm25 = query_client.search_or_local(["create ecs instance"], top_k=2, server_url=server_url,
+                                           use_bm25=False)
+    assert no_bm25[0][0]["bm25_score"] == 0.0
+    assert os.listdir(scratch) == []  # Result files are removed
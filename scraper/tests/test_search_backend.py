@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from scripts.search_backend import ExactBackend, IVFBackend, LocalCollection, SearchBackend
+from scripts.vector_store import VectorStore, VectorStoreWriter
+
+SERVICES = ("ecs", "obs", "vpc")
+
+
+@pytest.fixture
+def store(tmp_path):
+    vectors = np.random.default_rng(0).normal(size=(300, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    writer = VectorStoreWriter(str(tmp_path / "store"))
+    writer.add([f"chunk_{i}" for i in range(300)], vectors, [f"text {i}" for i in range(300)],
+               [{"service": SERVICES[i % 3], "lang": "en" if i % 2 else "zh"} for i in range(300)])
+    writer.close()
+    return VectorStore(str(tmp_path / "store"))
+
+
+def brute_force(store, queries, k, rows=None):
+    rows = np.arange(store.count) if rows is None else np.asarray(rows)
+    scores = queries @ store.get_rows(rows).T
+    return rows[np.argsort(-scores, axis=1, kind="stable")[:, :k]]
+
+
+def test_backend_is_abstract(store):
+    with pytest.raises(TypeError):
+        SearchBackend(store)
+
+
+def test_exact_matches_brute_force(store):
+    queries = store.get_rows([3, 50, 299]) + 0.01
+    rows, scores = ExactBackend(store).search(queries, 5)
+    np.testing.assert_array_equal(rows, brute_force(store, queries, 5))
+    assert (np.diff(scores, axis=1) <= 0).all()
+
+
+def test_ivf_full_probe_is_exact_and_persists(store):
+    ivf = IVFBackend(store, nlist=8, nprobe=8)
+    queries = store.get_rows([10, 20])
+    np.testing.assert_array_equal(ivf.search(queries, 5)[0], ExactBackend(store).search(queries, 5)[0])
+
+    reloaded = IVFBackend(store, nlist=99, nprobe=8)
+    assert reloaded.nlist == 8  # Trained index reused from disk
+    np.testing.assert_array_equal(reloaded.list_rows, ivf.list_rows)
+
+
+def test_where_filters(store):
+    collection = LocalCollection(store, ExactBackend(store))
+    query = store.get_rows([0])
+
+    result = collection.query(query_embeddings=query, n_results=4, where={"service": "obs", "lang": "en"})
+    expected = [i for i in range(300) if i % 3 == 1 and i % 2]
+    assert len(result["ids"][0]) == 4
+    assert all(m == {"service": "obs", "lang": "en"} for m in result["metadatas"][0])
+    assert result["ids"][0] == [f"chunk_{r}" for r in brute_force(store, query, 4, expected)[0]]
+
+    assert collection.get(where={"service": "vpc"}, limit=3)["ids"] == ["chunk_2", "chunk_5", "chunk_8"]
+    assert collection.get(where={"service": "rds"})["ids"] == []
+    assert collection.query(query_embeddings=query, n_results=4, where={"service": "rds"})["ids"] == [[]]
+
+
+def test_metadata_index_is_built_once(store, monkeypatch):
+    collection = LocalCollection(store, ExactBackend(store))
+    collection.get(where={"service": "ecs"})
+
+    def fail(row):
+        raise AssertionError("metadata re-parsed")
+
+    monkeypatch.setattr(store, "record", fail)
+    assert len(collection._rows_for_where({"service": "ecs"})) == 100
@@ -0,0 +1,139 @@
+import os
+import time
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from scripts.fast_chunker import discard_batch, process_batch, unpack_batch
+from scripts.ingest_pipeline import IngestPipeline
+from scripts.shared_columns import ensure_tracker, pack
+
+SCHEMA = {"id": "str", "position": "int", "headers": "json"}
+
+
+def segment_exists(name: str) -> bool:
+    return os.path.exists(os.path.join("/dev/shm", name))
+
+
+def test_round_trip_frees_segment():
+    columns = {
+        "id": ["a", "ü-ñ", "", "云服务器"],
+        "position": [0, -1, 2 ** 40, 3],
+        "headers": [["Intro"], [], ["ECS", "创建"], {"k": [1, None]}]
+    }
+    shared = pack(columns, SCHEMA)
+    assert shared.rows == 4 and segment_exists(shared.name)
+
+    assert shared.load() == columns
+    assert not segment_exists(shared.name)
+
+
+def test_handle_pickles_without_data():
+    shared = pack({"id": ["x"], "position": [1], "headers": [[]]}, SCHEMA)
+    copy = pickle.loads(pickle.dumps(shared))
+    assert (copy.name, copy.rows, copy.layout) == (shared.name, shared.rows, shared.layout)
+    assert copy.load() == {"id": ["x"], "position": [1], "headers": [[]]}
+
+
+def test_empty_batch_has_no_segment():
+    shared = pack({"id": [], "position": [], "headers": []}, SCHEMA)
+    assert shared.name is None
+    assert shared.load() == {"id": [], "position": [], "headers": []}
+    shared.discard()
+
+
+def test_discard_is_idempotent():
+    shared = pack({"id": ["x"], "position": [1], "headers": [[]]}, SCHEMA)
+    shared.discard()
+    assert not segment_exists(shared.name)
+    shared.discard()
+
+
+def test_rejects_ragged_columns_and_unknown_kinds():
+    with pytest.raises(ValueError):
+        pack({"id": ["a", "b"], "position": [1], "headers": [[], []]}, SCHEMA)
+    with pytest.raises(ValueError):
+        pack({"id": ["a"]}, {"id": "float"})
+
+
+def write_docs(tmp_path, count: int):
+    paths = []
+    for i in range(count):
+        path = tmp_path / "ecs" / f"page_{i}.md"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(f"# Page {i}\n\n" + " ".join(f"word{j}" for j in range(300)), encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+class RecordingExecutor:
+    """Process pool that remembers the segment of every result a worker packed"""
+
+    def __init__(self, executor: ProcessPoolExecutor, segments: list):
+        self.executor = executor
+        self.segments = segments
+
+    def submit(self, fn, *args):
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(self._record)
+        return future
+
+    def _record(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.segments.append(future.result()[0].name)
+
+
+def run_pipeline(paths, write_fn, segments: list) -> list:
+    """
+    fast_ingest's wiring: process_batch on a process pool, results handed
+    over in shared memory. Returns the finished results; `segments` gets
+    the name of every segment a worker created.
+    """
+    finished = []
+    pipeline = IngestPipeline(
+        embed_fn=lambda chunks: [[0.0]] * len(chunks),
+        write_fn=write_fn,
+        on_done=finished.append,
+        unpack_fn=unpack_batch,
+        discard_fn=discard_batch,
+        batch_size=4,
+        queue_size=1,
+        max_inflight=4
+    )
+    ensure_tracker()
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        try:
+            pipeline.run(RecordingExecutor(pool, segments), process_batch,
+                         [([path], i) for i, path in enumerate(paths)])
+        finally:
+            pool.shutdown(wait=True)  # Every done-callback has run once this returns
+    return finished
+
+
+def test_pipeline_unpacks_every_result(tmp_path):
+    paths = write_docs(tmp_path, 12)
+    written = []
+    segments = []
+    finished = run_pipeline(paths, lambda chunks, embeddings: written.extend(chunks), segments)
+
+    assert sorted(path for result in finished for path in result[3]) == sorted(paths)
+    assert len(written) == sum(len(result[0]) for result in finished) > 0
+    assert len(segments) == 12
+    assert not any(segment_exists(name) for name in segments)
+
+
+def test_abort_leaves_no_segments(tmp_path):
+    paths = write_docs(tmp_path, 40)
+    segments = []
+
+    def failing_write(chunks, embeddings):
+        time.sleep(0.5)  # Let the in-flight tasks finish so their segments exist when the run aborts
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError, match="disk full"):
+        run_pipeline(paths, failing_write, segments)
+
+    # Results still queued, finished or running when the write failed were discarded, not leaked
+    assert segments
+    assert not any(segment_exists(name) for name in segments)
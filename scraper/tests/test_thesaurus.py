@@ -0,0 +1,146 @@
+import os
+import json
+
+import pytest
+
+from scripts import thesaurus
+from scripts.keyword_matcher import AhoCorasick
+from scripts.thesaurus import ThesaurusError, build, compile_source, load, write_artifact
+
+SOURCE = {
+    "terms": {
+        "Compute": {"ecs": ["elastic cloud server", "vm"], "bms": ["bare metal server"]},
+        "Storage": {"obs": ["object storage", "bucket"]}
+    },
+    "document_type_boosts": {"Guides": {"guide": 1.3}, "Errors": {"troubleshooting": 1.5}},
+    "service_keyword_boosts": {
+        "Compute": {"ecs": {"ECS": 2.0}, "server": {"ecs": 1.2, "bms": 1.1}},
+        "Storage": {"bucket": {"obs": 1.8}}
+    },
+    "document_type_intents": [
+        {"boost": "guide", "query_words": ["how", "set up"], "doc_types": ["guide", "User Guide"]},
+        {"boost": "troubleshooting", "query_words": ["error"], "doc_types": ["faq"]}
+    ]
+}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    source = tmp_path / "thesaurus.json"
+    source.write_text(json.dumps(SOURCE), encoding="utf-8")
+    return {"source_path": str(source), "artifact_path": str(tmp_path / "compiled.json"),
+            "mined_path": str(tmp_path / "mined.json")}
+
+
+def test_current_artifact_is_used_as_is(paths, monkeypatch):
+    artifact = build(paths["source_path"], paths["mined_path"])
+    write_artifact(artifact, paths["artifact_path"])
+
+    def no_compile(*args, **kwargs):
+        raise AssertionError("recompiled")
+
+    monkeypatch.setattr(thesaurus, "build", no_compile)
+    monkeypatch.setattr(AhoCorasick, "_insert", no_compile)  # Matcher restored from its tables
+    loaded = load(**paths)
+    assert loaded.built_at == artifact["built_at"]
+    assert loaded.expand_query("ecs pricing") == "ecs pricing elastic cloud server vm"
+    assert loaded.expand_query("OBS?") == "OBS? object storage bucket"
+
+
+def test_query_boosts():
+    loaded = thesaurus.Thesaurus(compile_source(SOURCE))
+    boosts = loaded.query_boosts("how do I set up an ecs server with an error")
+    assert boosts.service_boost("ecs") == pytest.approx(2.4) and boosts.service_boost("bms") == 1.1
+    assert boosts.doc_type_boost("User Guide") == 1.3  # The first listed intent wins
+    assert boosts.doc_type_boost("faq") == 1.5
+    assert boosts.doc_type_boost(None) == 1.0 and boosts.service_boost("vpc") == 1.0
+    assert loaded.query_boosts("bucket error").doc_type_boost("guide") == 1.0
+
+
+def test_shipped_source_compiles():
+    artifact = build(thesaurus.SOURCE_PATH, None)
+    assert artifact["terms"] and artifact["service_keyword_boosts"]
+    assert not [c for c in artifact["report"]["conflicts"] if c["severity"] == "error"]
+
+
+def test_stale_artifact_is_recompiled(paths):
+    write_artifact(build(paths["source_path"], paths["mined_path"]), paths["artifact_path"])
+    edited = json.loads(json.dumps(SOURCE))
+    edited["terms"]["Compute"]["cce"] = ["kubernetes"]
+    with open(paths["source_path"], "w", encoding="utf-8") as f:
+        json.dump(edited, f)
+
+    loaded = load(**paths)
+    assert loaded.expand_query("cce") == "cce kubernetes"
+    assert loaded.source_hash == thesaurus.sources_hash(paths["source_path"], paths["mined_path"])
+
+
+def test_mined_entries_change_the_hash_and_fill_gaps(paths):
+    write_artifact(build(paths["source_path"], paths["mined_path"]), paths["artifact_path"])
+    with open(paths["mined_path"], "w", encoding="utf-8") as f:
+        json.dump({"terms": {"mined": {"ecs": ["overridden"], "evs": ["block storage"]}}}, f)
+
+    loaded = load(**paths)
+    assert loaded.terms["ecs"] == ["elastic cloud server", "vm"]  # The source wins
+    assert loaded.terms["evs"] == ["block storage"]
+    assert {"section": "terms", "added": 1, "overridden": 1} in loaded.report["mined"]
+
+
+def test_other_artifact_version_is_recompiled(paths):
+    artifact = build(paths["source_path"], paths["mined_path"])
+    write_artifact(dict(artifact, version=thesaurus.ARTIFACT_VERSION + 1, terms={}), paths["artifact_path"])
+    assert load(**paths).expand_query("bms") == "bms bare metal server"
+
+
+def test_missing_everything(tmp_path):
+    with pytest.raises(ThesaurusError):
+        load(str(tmp_path / "a.json"), str(tmp_path / "s.json"), str(tmp_path / "m.json"))
+
+
+def test_duplicates_are_reported_and_later_value_wins():
+    source = json.loads(json.dumps(SOURCE))
+    source["terms"]["Storage"]["ECS "] = ["later"]
+    artifact = compile_source(source)
+    assert artifact["terms"]["ecs"]["expansions"] == ["later"]
+    assert artifact["report"]["duplicates"][0]["groups"] == ["Compute", "Storage"]
+
+    raw = '{"terms": {"g": {"a": ["x"], "a": ["y"]}}, "document_type_boosts": {}, "service_keyword_boosts": {}}'
+    artifact = compile_source(json.loads(raw, object_pairs_hook=thesaurus._Object))
+    assert artifact["terms"]["a"]["expansions"] == ["y"] and len(artifact["report"]["duplicates"]) == 1
+
+
+@pytest.mark.parametrize("section, group, value", [
+    ("document_type_boosts", "Guides", {"guide": 0}),
+    ("service_keyword_boosts", "Storage", {"bucket": {"obs": "high"}}),
+    ("terms", "Storage", {"obs": "object storage"})
+])
+def test_invalid_values_are_rejected(section, group, value):
+    source = json.loads(json.dumps(SOURCE))
+    source[section][group] = value
+    with pytest.raises(ThesaurusError):
+        compile_source(source)
+
+
+def test_reload_keeps_active_version_on_bad_edit(paths, monkeypatch):
+    monkeypatch.setattr(thesaurus, "ARTIFACT_PATH", paths["artifact_path"])
+    monkeypatch.setattr(thesaurus, "SOURCE_PATH", paths["source_path"])
+    monkeypatch.setattr(thesaurus, "MINED_PATH", paths["mined_path"])
+    monkeypatch.setattr(thesaurus, "_current", None)
+    monkeypatch.setattr(thesaurus, "_rejected_stamp", None)
+    active = thesaurus.current()
+
+    broken = json.loads(json.dumps(SOURCE))
+    broken["document_type_boosts"]["Guides"]["guide"] = -1
+    with open(paths["source_path"], "w", encoding="utf-8") as f:
+        json.dump(broken, f)
+    os.utime(paths["source_path"], ns=(1, 1))
+    with pytest.raises(ThesaurusError):
+        thesaurus.reload_if_changed()
+    assert thesaurus.current() is active
+    assert not thesaurus.reload_if_changed()  # The broken edit is not retried until the files change again
+
+    with open(paths["source_path"], "w", encoding="utf-8") as f:
+        json.dump(SOURCE, f)
+    os.utime(paths["source_path"], ns=(2, 2))
+    assert thesaurus.reload_if_changed()
+    assert thesaurus.current() is not active
@@ -0,0 +1,127 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+from scripts import vector_store
+from scripts.ingest_manifest import corpus_fingerprint
+from scripts.vector_store import VectorStore, VectorStoreWriter, quantize_int8
+
+
+def unit_rows(count: int, dim: int = 8, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def write_store(path, vectors, dtype="float32", batch=3, **kwargs):
+    ids = [f"chunk_{i}" for i in range(len(vectors))]
+    texts = [f"text {i} ü" for i in range(len(vectors))]
+    metadatas = [{"service": "ecs" if i % 2 else "obs", "position": i} for i in range(len(vectors))]
+    writer = VectorStoreWriter(str(path), dtype=dtype, **kwargs)
+    for start in range(0, len(vectors), batch):
+        end = start + batch
+        writer.add(ids[start:end], vectors[start:end], texts[start:end], metadatas[start:end])
+    header = writer.close({"collection": "huawei_docs"})
+    return header, ids, texts, metadatas
+
+
+def test_int8_scales_are_per_row(tmp_path):
+    # Rows far apart in magnitude: a shared scale would flatten the small one to zeros
+    vectors = unit_rows(3) * np.array([[1000.0], [1.0], [0.001]], dtype=np.float32)
+    codes, scales = quantize_int8(vectors)
+    np.testing.assert_allclose(scales, np.abs(vectors).max(axis=1) / 127, rtol=1e-6)
+    assert (np.abs(codes).max(axis=1) == 127).all()
+
+    write_store(tmp_path / "store", vectors, "int8")
+    store = VectorStore(str(tmp_path / "store"))
+    assert store.nbytes() == 3 * 8 + 3 * 4  # int8 codes plus one f32 scale per row
+    rows = store.get_rows([0, 1, 2])
+    for row, original in zip(rows, vectors):
+        np.testing.assert_allclose(row, original, atol=np.abs(original).max() / 127)
+    np.testing.assert_allclose(store.scores(vectors[1:2])[0], rows @ vectors[1], rtol=1e-5)
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 0), ("float16", 1e-3), ("int8", 1e-2)])
+def test_blocked_scores_and_sidecars(tmp_path, monkeypatch, dtype, tolerance):
+    monkeypatch.setattr(vector_store, "SCORE_BLOCK_ROWS", 4)
+    vectors = unit_rows(10)
+    header, ids, texts, metadatas = write_store(tmp_path / "store", vectors, dtype)
+
+    store = VectorStore(str(tmp_path / "store"))
+    assert (store.count, store.dim, store.dtype) == (10, 8, dtype)
+    assert store.header == header and header["collection"] == "huawei_docs"
+    assert store.ids(range(10)) == ids
+    assert store.row_of("chunk_7") == 7 and store.row_of("missing") is None
+    assert store.record(9) == {"document": texts[9], "metadata": metadatas[9]}
+    expected = store.get_rows(range(10))
+    np.testing.assert_allclose(expected, vectors, atol=tolerance)
+    queries = unit_rows(2, seed=5)
+    np.testing.assert_allclose(store.scores(queries), queries @ expected.T, atol=1e-5)
+    np.testing.assert_allclose(store.scores(queries, 3, 9), queries @ expected[3:9].T, atol=1e-5)
+    assert header["corpus_fingerprint"] == corpus_fingerprint(ids, texts)
+
+
+def test_zero_vector_int8(tmp_path):
+    vectors = np.vstack([np.zeros((1, 8), dtype=np.float32), unit_rows(2)])
+    codes, scales = quantize_int8(vectors)
+    assert scales[0] == 1.0 and not codes[0].any()
+
+    write_store(tmp_path / "store", vectors, "int8")
+    store = VectorStore(str(tmp_path / "store"))
+    rows = store.get_rows([0, 1, 2])
+    assert np.isfinite(rows).all()
+    np.testing.assert_array_equal(rows[0], 0)
+    np.testing.assert_array_equal(store.scores(unit_rows(1, seed=1))[:, 0], 0)
+
+
+def test_without_documents(tmp_path):
+    write_store(tmp_path / "store", unit_rows(4), store_documents=False)
+    store = VectorStore(str(tmp_path / "store"))
+    assert not store.has_documents and "corpus_fingerprint" not in store.header
+    assert store.record(0) == {"document": "", "metadata": {}}
+    assert not os.path.exists(tmp_path / "store" / "docs.jsonl")
+
+
+def test_rewrite_replaces_store_and_leftovers(tmp_path):
+    path = tmp_path / "store"
+    write_store(path, unit_rows(4))
+
+    # Staging and swap directories left by writers that died before close() finished
+    VectorStoreWriter(str(path)).add(["new"], unit_rows(1), ["new text"])
+    os.makedirs(str(path) + ".old")
+    assert VectorStore(str(path)).count == 4  # Readers only ever see the previous store
+
+    write_store(path, unit_rows(6, seed=2))
+    assert VectorStore(str(path)).count == 6
+    assert sorted(os.listdir(tmp_path)) == ["store"]
+
+
+def test_abort_removes_staging(tmp_path):
+    path = tmp_path / "store"
+    writer = VectorStoreWriter(str(path))
+    writer.add(["a"], unit_rows(1))
+    writer.abort()
+    assert os.listdir(tmp_path) == []
+
+
+def test_rejects_bad_batches(tmp_path):
+    writer = VectorStoreWriter(str(tmp_path / "store"))
+    with pytest.raises(ValueError):
+        writer.add(["a", "b"], unit_rows(1))
+    writer.add(["a"], unit_rows(1))
+    with pytest.raises(ValueError):
+        writer.add(["b"], unit_rows(1, dim=4))
+    writer.abort()
+    with pytest.raises(ValueError):
+        VectorStoreWriter(str(tmp_path / "store"), dtype="bfloat16")
+
+
+def test_unknown_version_is_rejected(tmp_path):
+    path = tmp_path / "store"
+    write_store(path, unit_rows(2))
+    header_path = path / "header.json"
+    header = json.loads(header_path.read_text())
+    header_path.write_text(json.dumps(dict(header, version=99)))
+    with pytest.raises(ValueError):
+        VectorStore(str(path))